@@ -1,10 +1,7 @@
 # app.py
 import pandas as pd
 import streamlit as st
-from sqlalchemy.orm import sessionmaker
-from streamlit_condition_tree import condition_tree, config_from_dataframe, JsCode
-import re
-from datetime import datetime
+from streamlit_condition_tree import condition_tree
 import math
 import plotly.express as px
 import functools
@@ -12,10 +9,29 @@ import functools
 
 # Asumsikan file-file ini sudah ada
 from database import engine
-from models import Base, FilterTersimpan
+from models import Base
+import filter_repository
+from filter_repository import (count_filters, get_filter_config_by_id, get_filter_config_by_name, load_filter_page,
+                               load_segment_options)
+from fact_data import FactCache, MemoryCeilingExceeded
+from audience_jobs import (ACTIVE_STATUSES, RESUMABLE_STATUSES, AudienceJobRunner, cancel_job, export_audience,
+                           job_progress, list_jobs, load_audience_page)
+from fact_snapshot import SnapshotReader
+from rollup import plan_sales_estimate, plan_segment_reach
+from sample_preview import ExactEstimator, SampleCache
+from segment_membership import MembershipCache, references_segments
+from tree_config import FieldConfigCache, build_tree_config
+from database import pool_stats
+from tracing import begin_trace, end_trace, flatten, frame_bytes, instrument_engine, span, traced
+
+# Tracing per rerun: aktif lewat CDP_TRACE=1 atau query param ?trace=1 (menampilkan panel developer).
+instrument_engine(engine)
+show_dev_panel = st.query_params.get("trace") == "1"
+begin_trace("rerun", enabled=True if show_dev_panel else None)
 
 # Inisialisasi: Buat tabel di database jika belum ada.
-Base.metadata.create_all(bind=engine)
+with span("create_all"):
+    Base.metadata.create_all(bind=engine)
 
 # --- KONFIGURASI HALAMAN ---
 st.set_page_config(
@@ -50,120 +66,232 @@ st.markdown("""
 
 
 # --- FUNGSI-FUNGSI DATABASE ---
-Session = sessionmaker(bind=engine)
+# Query segmen ada di filter_repository.py; fungsi di sini hanya menambahkan umpan balik UI.
 
 def save_or_update_filter(name: str, tree_dict: dict, old_name: str = None):
-    session = Session()
     try:
-        # Jika old_name ada, berarti kita sedang mengedit
-        if old_name and old_name != name:
-            # Hapus yang lama jika nama berubah
-            session.query(FilterTersimpan).filter_by(nama_filter=old_name).delete()
-
-        # Buat atau update entri
-        existing_filter = session.query(FilterTersimpan).filter_by(nama_filter=name).first()
-        if existing_filter:
-            existing_filter.konfigurasi_json = tree_dict
-            existing_filter.dibuat_pada = datetime.now()
-        else:
-            new_filter = FilterTersimpan(nama_filter=name, konfigurasi_json=tree_dict, dibuat_oleh="user_dashboard")
-            session.add(new_filter)
-        
-        session.commit()
+        filter_repository.save_or_update_filter(name, tree_dict, old_name)
         st.toast(f"✅ Segment '{name}' berhasil disimpan!", icon="💾")
         return True
     except Exception as e:
-        session.rollback()
         st.error(f"Gagal menyimpan filter: {e}")
         return False
-    finally:
-        session.close()
-
-def load_all_filters(search_term: str = ""):
-    """Mengambil semua filter, dengan opsi pencarian pada nama segmen."""
-    session = Session()
-    try:
-        query = session.query(FilterTersimpan)
-        if search_term:
-            # Menggunakan ILIKE untuk pencarian case-insensitive
-            query = query.filter(FilterTersimpan.nama_filter.ilike(f"%{search_term}%"))
-        return query.order_by(FilterTersimpan.dibuat_pada.desc()).all()
-    finally:
-        session.close()
 
-def get_filter_config_by_name(name: str) -> dict | None:
-    session = Session()
+def delete_filters_by_name(names: list[str]):
+    """Menghapus satu atau beberapa segmen dalam satu transaksi."""
     try:
-        result = session.query(FilterTersimpan.konfigurasi_json).filter_by(nama_filter=name).first()
-        return result[0] if result else None
-    finally:
-        session.close()
-
-def delete_filter_by_name(name: str):
-    session = Session()
-    try:
-        session.query(FilterTersimpan).filter_by(nama_filter=name).delete()
-        session.commit()
-        st.toast(f"🗑️ Segment '{name}' berhasil dihapus.")
+        deleted = filter_repository.delete_filters_by_name(names)
+        if len(names) == 1:
+            st.toast(f"🗑️ Segment '{names[0]}' berhasil dihapus.")
+        else:
+            st.toast(f"🗑️ {deleted} segment berhasil dihapus.")
         return True
     except Exception as e:
-        session.rollback()
         st.error(f"Gagal menghapus filter: {e}")
         return False
-    finally:
-        session.close()
 
 # --- FUNGSI PEMUATAN DATA & PERSIAPAN ---
-@st.cache_data(ttl=600)
+@st.cache_resource
+def _fact_source():
+    # Sumber frame fakta aktif per proses; diganti oleh _load_fact_frame() saat snapshot dipublikasikan.
+    return {'cache': None}
+
+def get_fact_cache():
+    source = _fact_source()
+    if source['cache'] is None:
+        # Jika snapshot Arrow sudah dipublikasikan (`python fact_snapshot.py publish`), frame dibaca lewat
+        # memory map dan dibagi antar proses; selain itu dimuat langsung dari database.
+        # Kolom teks disimpan sebagai kategori (kode integer) agar hemat memori per proses Streamlit.
+        source['cache'] = SnapshotReader() if SnapshotReader.available() else FactCache(compact=True)
+    return source['cache']
+
 def load_data_from_db():
-    query = """
-    SELECT
-        t.id AS id_transaksi, t.waktu_transaksi, tk.nama_toko, tk.kota,
-        kr.nama_karyawan, kr.posisi AS posisi_karyawan, p.nama_produk,
-        p.kategori AS kategori_produk, p.harga_jual, dt.jumlah AS jumlah_item,
-        dt.harga_saat_transaksi, (dt.jumlah * dt.harga_saat_transaksi) AS total_harga_item,
-        m.nama_member, m.tanggal_bergabung AS tanggal_join_member
-    FROM transaksi t
-    JOIN detail_transaksi dt ON t.id = dt.id_transaksi
-    JOIN produk p ON dt.id_produk = p.id
-    JOIN toko tk ON t.id_toko = tk.id
-    JOIN karyawan kr ON t.id_karyawan = kr.id
-    LEFT JOIN member m ON t.id_member = m.id;
-    """
-    with engine.connect() as connection:
-        df = pd.read_sql(query, connection)
-    df['waktu_transaksi'] = pd.to_datetime(df['waktu_transaksi']).dt.tz_localize(None)
-    df['tanggal_join_member'] = pd.to_datetime(df['tanggal_join_member']).dt.tz_localize(None)
-    df.columns = [c.replace(' ', '_') for c in df.columns]
+    """Frame fakta bersama; setiap 10 menit hanya transaksi baru yang diambil dari database."""
+    with span("load_data_from_db") as s:
+        df = _load_fact_frame()
+        s.set(rows=len(df), bytes=frame_bytes(df))
     return df
 
-def get_tree_config():
-    """Mempersiapkan config untuk streamlit-condition-tree."""
+def _load_fact_frame():
+    cache = get_fact_cache()
+    if isinstance(cache, FactCache) and SnapshotReader.available():
+        # Snapshot dipublikasikan setelah proses dimulai: beralih ke snapshot dan lepaskan frame per proses.
+        cache = _fact_source()['cache'] = SnapshotReader()
+    if not cache.is_stale(ttl_seconds=600):
+        return cache.df
+    progress_bar = st.empty()
+
+    def show_progress(loaded: int, estimated: int | None):
+        fraction = min(loaded / estimated, 1.0) if estimated else 0.0
+        progress_bar.progress(fraction, text=f"Loading transactions... {loaded:,} rows")
+
+    try:
+        return cache.refresh_if_stale(ttl_seconds=600, progress=show_progress)
+    except MemoryCeilingExceeded as e:
+        # Data lama (jika ada) tetap dipakai daripada proses dimatikan karena kehabisan memori.
+        if cache.df is None:
+            raise
+        st.warning(f"Data refresh skipped: {e}")
+        return cache.df
+    finally:
+        progress_bar.empty()
+
+# Jeda polling fragment selama estimasi latar belakang masih berjalan (detik).
+ESTIMATE_POLL_SECONDS = 0.25
+REACH_POLL_SECONDS = 0.5
+
+@st.cache_resource
+def get_exact_estimator():
+    # Estimasi pasti per produk di PostgreSQL (dari rollup harian jika memungkinkan), di thread latar belakang.
+    # Watermark frame fakta ikut menjadi kunci, jadi hasil pasti tidak tertinggal dari pratinjau sampel.
+    return ExactEstimator(plan_sales_estimate, watermark=lambda: get_fact_cache().watermark_id)
+
+@st.cache_resource
+def get_sample_cache():
+    return SampleCache()
+
+@st.cache_resource
+def get_reach_estimator():
+    # Reach (member unik) dari gabungan sketsa HyperLogLog di rollup, di thread latar belakang.
+    return ExactEstimator(lambda tree: plan_segment_reach(tree)[0], watermark=lambda: get_fact_cache().watermark_id)
+
+def segment_reach_by_id(segment_id: int, version: str) -> int:
+    # `version` (waktu perubahan segmen) hanya dipakai sebagai bagian kunci cache estimator.
+    return plan_segment_reach(get_filter_config_by_id(segment_id))[0]
+
+@st.cache_resource
+def get_directory_reach_estimator():
+    return ExactEstimator(segment_reach_by_id, watermark=lambda: get_fact_cache().watermark_id)
+
+def reach_label(future) -> str:
+    if not future.done():
+        return "…"
+    if future.exception() is not None:
+        return "—"
+    return f"≈ {future.result():,}"
+
+def render_segment_reach(segment_id: int, version: str):
+    """Sel reach di Segment Directory; mengembalikan future estimasinya untuk `wait_for_reach()`."""
+    reach = get_directory_reach_estimator().submit(segment_id, version)
+    st.write(reach_label(reach))
+    return reach
+
+def wait_for_reach(futures: list):
+    """Satu fragment untuk seluruh halaman direktori: poll semua reach yang tertunda, lalu rerun sekali."""
+    pending = [future for future in futures if not future.done()]
+    if pending:
+        st.fragment(_rerun_when_done, run_every=REACH_POLL_SECONDS)(pending)
+
+def _rerun_when_done(futures: list):
+    if all(future.done() for future in futures):
+        st.rerun()
+
+@st.cache_resource
+def get_membership_cache():
+    return MembershipCache()
+
+@traced("estimate_sales_from_segments")
+def estimate_sales_from_segments(tree: dict):
+    """Estimasi untuk segmen yang mereferensikan segmen tersimpan, lewat operasi bitmap di memori."""
     df = load_data_from_db()
-    config = config_from_dataframe(df)
-    config['operators'] = {
-        **config.get('operators', {}),
-        'is_null': {'label': 'is null', 'cardinality': 0, 'sqlFormatFunc': JsCode("function(f) { return `${f}.isnull()`; }")},
-        'is_not_null': {'label': 'is not null', 'cardinality': 0, 'sqlFormatFunc': JsCode("function(f) { return `${f}.notnull()`; }")}
-    }
-    for f_type in config.get('types', {}):
-        if 'operators' not in config['types'][f_type]: config['types'][f_type]['operators'] = []
-        config['types'][f_type]['operators'].extend(['is_null', 'is_not_null'])
-    select_fields = {'nama_toko': 'select', 'kota': 'select', 'posisi_karyawan': 'select', 'kategori_produk': 'select'}
-    for field, f_type in select_fields.items():
-        if field in config['fields']:
-            config['fields'][field]['type'] = f_type
-            unique_values = df[field].dropna().unique().tolist()
-            config['fields'][field]['fieldSettings'] = {'listValues': unique_values}
-    return config
-
-def fix_query_for_pandas(query_string: str) -> str:
-    pattern_eq = re.compile(r"([\w`_]+)\s*==\s*null")
-    pattern_ne = re.compile(r"([\w`_]+)\s*!=\s*null")
-    fixed_query = pattern_eq.sub(r"\1.isnull()", query_string)
-    fixed_query = pattern_ne.sub(r"\1.notnull()", fixed_query)
-    return fixed_query
+    mask = get_membership_cache().evaluate_mask(tree, df, get_fact_cache().watermark_id)
+    product_sales = df[mask].groupby('nama_produk', observed=True)['jumlah_item'].sum().reset_index()
+    return product_sales[product_sales['jumlah_item'] > 0], 'bitmap'
+
+@st.cache_resource
+def get_audience_runner():
+    # Satu thread pool per proses Streamlit; job yang terputus saat proses berhenti dilanjutkan.
+    runner = AudienceJobRunner()
+    runner.resume_interrupted()
+    return runner
+
+def render_sales_estimate(active_tree: dict | None):
+    """Panel estimasi: pratinjau dari sampel berstrata lebih dulu, lalu diganti hasil pasti dari latar belakang.
+
+    Selama hasil pasti atau reach belum siap, hanya panel ini yang dijalankan ulang setiap
+    `ESTIMATE_POLL_SECONDS` (fragment `run_every`); tanpa estimasi tertunda panel tidak di-poll.
+    """
+    polling = not get_reach_estimator().submit(active_tree).done() or (
+        not references_segments(active_tree) and not get_exact_estimator().submit(active_tree).done())
+    st.fragment(_sales_estimate_panel, run_every=ESTIMATE_POLL_SECONDS if polling else None)(active_tree, polling)
 
+def _sales_estimate_panel(active_tree: dict | None, polling: bool):
+    refining = False
+    reach = get_reach_estimator().submit(active_tree)
+    try:
+        interval = None
+        if references_segments(active_tree):
+            product_sales, estimate_source = estimate_sales_from_segments(active_tree)
+        else:
+            exact = get_exact_estimator().submit(active_tree)
+            # Sampel hanya dipakai jika frame fakta sudah dimuat; pratinjau tidak memicu pemuatan frame.
+            fact_df = get_fact_cache().df
+            sample = get_sample_cache().get(fact_df) if fact_df is not None else None
+            if exact.done() or sample is None or not sample.supports(active_tree):
+                with span("exact_estimate"):
+                    # Filter dan agregasi dijalankan di database, hanya hasil per produk yang diambil
+                    product_sales, estimate_source = exact.result()
+            else:
+                with span("sample_estimate", rows=len(sample)):
+                    product_sales, _, interval = sample.estimate(active_tree)
+                estimate_source, refining = 'sample', True
+        total_sales = product_sales['jumlah_item'].sum()
+        approx = "≈ " if refining else ""
+
+        if not product_sales.empty:
+            with span("plotly_chart", rows=len(product_sales)):
+                fig = px.pie(
+                    product_sales,
+                    values='jumlah_item',
+                    names='nama_produk',
+                    hole=0.4,
+                    title=f"Total Sales: {approx}{total_sales} items"
+                )
+                fig.update_traces(
+                    textposition='inside',
+                    textinfo='percent+label',
+                    hovertemplate="<b>%{label}</b><br>Quantity: %{value} (%{percent})"
+                )
+                fig.update_layout(
+                    margin=dict(l=20, r=20, t=40, b=20),
+                    showlegend=False
+                )
+                st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.warning("No data matches your current segment criteria.")
+
+        # Tampilkan metrik ringkasan
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Total Products", f"{approx}{len(product_sales)}")
+        col3.metric("Reach", reach_label(reach), help="Distinct members, estimated with HyperLogLog sketches")
+        if interval is not None:
+            col2.metric("Total Quantity", f"≈ {total_sales:,}", help=f"95% confidence interval: ± {interval:,.0f} items")
+            st.caption(f"Sumber: sampel berstrata {len(sample):,} dari {sample.source_rows:,} baris "
+                       f"(IK 95% ± {interval:,.0f}) — menghitung hasil pasti...")
+        else:
+            col2.metric("Total Quantity", total_sales)
+            source_labels = {'rollup': "rollup harian", 'detail': "detail transaksi", 'bitmap': "bitmap segmen tersimpan"}
+            st.caption(f"Sumber: {source_labels[estimate_source]}")
+
+    except Exception as e:
+        refining = False
+        st.error(f"Error generating sales estimation: {str(e)}")
+        st.warning("Please check your segment criteria.")
+    if polling != (refining or not reach.done()):
+        # Status estimasi berubah: satu rerun penuh mendaftarkan ulang panel dengan (atau tanpa) run_every.
+        st.rerun()
+
+@st.cache_resource
+def get_field_config_cache():
+    return FieldConfigCache()
+
+@traced("get_tree_config")
+def get_tree_config():
+    """Mempersiapkan config untuk streamlit-condition-tree dari metadata model dan tabel dimensi (di-cache)."""
+    return build_tree_config(
+        get_field_config_cache().fields(),
+        load_segment_options(exclude_name=st.session_state.get('editing_segment_name')),
+    )
 
 # --- MANAJEMEN STATE APLIKASI ---
 # Mengontrol tab mana yang aktif
@@ -184,8 +312,13 @@ if 'current_page' not in st.session_state:
     st.session_state.current_page = 1
 if "selected_segments" not in st.session_state:
     st.session_state.selected_segments = set()
-if "current_page" not in st.session_state:
-    st.session_state.current_page = 1
+if "page_cursors" not in st.session_state:
+    st.session_state.page_cursors = [None]
+    st.session_state.page_cursors_search = ""
+# State Campaign Builder: job yang sedang dilihat dan kursor keyset halaman anggotanya
+if "audience_preview_job" not in st.session_state:
+    st.session_state.audience_preview_job = None
+    st.session_state.audience_page_cursors = [None]
 
 
 # --- HEADER UTAMA ---
@@ -224,20 +357,29 @@ with tab1:
     st.header("Saved Segments")
     st.markdown("---")
 
-    # Load data
-    all_filters = load_all_filters(st.session_state.search_query)
-
-    # Pagination setup
+    # Pagination setup (keyset): kunci (dibuat_pada, id) awal setiap halaman yang sudah dikunjungi
+    # disimpan di session state, jadi hanya satu halaman yang diambil dari database.
     ITEMS_PER_PAGE = 10
-    total_items = len(all_filters)
+    if st.session_state.page_cursors_search != st.session_state.search_query:
+        st.session_state.page_cursors = [None]
+        st.session_state.page_cursors_search = st.session_state.search_query
+        st.session_state.current_page = 1
+    with span("segment_directory_query") as directory_span:
+        total_items = count_filters(st.session_state.search_query)
+        filters_to_display = load_filter_page(
+            st.session_state.search_query,
+            after=st.session_state.page_cursors[st.session_state.current_page - 1],
+            limit=ITEMS_PER_PAGE,
+        )
+        directory_span.set(rows=len(filters_to_display))
     total_pages = math.ceil(total_items / ITEMS_PER_PAGE)
-    if st.session_state.current_page > total_pages and total_pages > 0:
-        st.session_state.current_page = total_pages
-    elif total_pages == 0:
+    if not filters_to_display and st.session_state.current_page > 1:
+        # Halaman ini kosong setelah penghapusan; kembali ke halaman pertama.
+        st.session_state.page_cursors = [None]
         st.session_state.current_page = 1
+        filters_to_display = load_filter_page(st.session_state.search_query, limit=ITEMS_PER_PAGE)
     start_index = (st.session_state.current_page - 1) * ITEMS_PER_PAGE
-    end_index = start_index + ITEMS_PER_PAGE
-    filters_to_display = all_filters[start_index:end_index]
+    end_index = start_index + len(filters_to_display)
 
     # Toggle all checkboxes helper
     def are_all_displayed_selected(displayed_filters):
@@ -262,7 +404,7 @@ with tab1:
         st.session_state.selected_segments = s
 
     # Header table
-    col_h1, col_h2, col_h3, col_h4, col_h5 = st.columns([0.5, 0.5, 4, 2, 1])
+    col_h1, col_h2, col_h3, col_h_reach, col_h4, col_h5 = st.columns([0.5, 0.5, 3, 1.5, 1.5, 1])
     with col_h1:
         st.write("**#**")
     with col_h2:
@@ -275,6 +417,8 @@ with tab1:
         )
     with col_h3:
         st.write("**Segment Name**")
+    with col_h_reach:
+        st.write("**Reach**")
     with col_h4:
         st.write("**Last Modified**")
     with col_h5:
@@ -292,7 +436,7 @@ with tab1:
                 st.rerun()
         with col_confirm:
             if st.button("Delete", type="primary", use_container_width=True):
-                if delete_filter_by_name(segment_name):
+                if delete_filters_by_name([segment_name]):
                     st.session_state.show_confirm_dialog = False
                     st.session_state.segment_to_delete = None
                     st.rerun()
@@ -309,8 +453,7 @@ with tab1:
                 st.rerun()
         with col_confirm:
             if st.button("Delete", type="primary", use_container_width=True):
-                for name in list(st.session_state.selected_segments):
-                    delete_filter_by_name(name)
+                delete_filters_by_name(sorted(st.session_state.selected_segments))
                 st.session_state.selected_segments.clear()
                 st.session_state.show_bulk_delete_dialog = False
                 st.rerun()
@@ -323,11 +466,12 @@ with tab1:
     if "show_bulk_delete_dialog" not in st.session_state:
         st.session_state.show_bulk_delete_dialog = False
 
-    if not all_filters:
+    if not filters_to_display:
         st.info("No segments found. Try clearing the search or create a new segment.")
     else:
+        reach_futures = []
         for i, f in enumerate(filters_to_display):
-            col_d1, col_d2, col_d3, col_d4, col_d5 = st.columns([0.5, 0.5, 4, 2, 1])
+            col_d1, col_d2, col_d3, col_d_reach, col_d4, col_d5 = st.columns([0.5, 0.5, 3, 1.5, 1.5, 1])
             col_d1.write(f"**{start_index + i + 1}**")
 
             checked = f.nama_filter in st.session_state.selected_segments
@@ -339,6 +483,8 @@ with tab1:
             )
 
             col_d3.write(f.nama_filter)
+            with col_d_reach:
+                reach_futures.append(render_segment_reach(f.id, f.dibuat_pada.isoformat()))
             col_d4.write(f.dibuat_pada.strftime("%d-%m-%Y"))
 
             action_cols = col_d5.columns([1, 1])
@@ -352,6 +498,7 @@ with tab1:
                 st.session_state.show_confirm_dialog = True
                 st.session_state.segment_to_delete = f.nama_filter
                 confirm_delete_dialog(f.nama_filter)
+        wait_for_reach(reach_futures)
 
     # Tombol bulk delete
     if st.session_state.selected_segments:
@@ -376,9 +523,12 @@ with tab1:
         nav_cols = st.columns(3)
         if nav_cols[0].button("◀", use_container_width=True, disabled=(st.session_state.current_page <= 1)):
             st.session_state.current_page -= 1
+            st.session_state.page_cursors = st.session_state.page_cursors[:st.session_state.current_page]
             st.rerun()
         nav_cols[1].write(f"<div style='text-align:center;'>{st.session_state.current_page}</div>", unsafe_allow_html=True)
         if nav_cols[2].button("▶", use_container_width=True, disabled=(st.session_state.current_page >= total_pages)):
+            last = filters_to_display[-1]
+            st.session_state.page_cursors = st.session_state.page_cursors[:st.session_state.current_page] + [(last.dibuat_pada, last.id)]
             st.session_state.current_page += 1
             st.rerun()
 
@@ -390,8 +540,7 @@ with tab2:
     if st.session_state.active_tab != "Segment Builder":
         st.info("Pilih 'Create New Segment' atau klik ikon edit ✏️ dari 'Segment Directory' untuk memulai.")
     else:
-        # Menyiapkan data dan config
-        df = load_data_from_db()
+        # Menyiapkan config
         tree_config = get_tree_config()
 
         # Header dinamis
@@ -444,48 +593,7 @@ with tab2:
         with builder_cols[1]:
             st.subheader("ESTIMATED TOTAL SALES")
             
-            try:
-                # Filter data berdasarkan query yang dibuat
-                if query_string:
-                    fixed_query = fix_query_for_pandas(query_string)
-                    filtered_df = df.query(fixed_query)
-                else:
-                    filtered_df = df.copy()
-                
-                # Hitung jumlah produk terjual per kategori
-                product_sales = filtered_df.groupby('nama_produk')['jumlah_item'].sum().reset_index()
-                total_sales = product_sales['jumlah_item'].sum()
-
-                
-                if not product_sales.empty:
-                    fig = px.pie(
-                        product_sales,
-                        values='jumlah_item',
-                        names='nama_produk',
-                        hole=0.4,
-                        title=f"Total Sales: {total_sales} items"
-                    )
-                    fig.update_traces(
-                        textposition='inside',
-                        textinfo='percent+label',
-                        hovertemplate="<b>%{label}</b><br>Quantity: %{value} (%{percent})"
-                    )
-                    fig.update_layout(
-                        margin=dict(l=20, r=20, t=40, b=20),
-                        showlegend=False
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.warning("No data matches your current segment criteria.")
-                    
-                # Tampilkan metrik ringkasan
-                col1, col2 = st.columns(2)
-                col1.metric("Total Products", len(product_sales))
-                col2.metric("Total Quantity", total_sales)
-                
-            except Exception as e:
-                st.error(f"Error generating sales estimation: {str(e)}")
-                st.warning("Please check your segment criteria.")
+            render_sales_estimate(st.session_state.active_tree_config)
             # st.image("https://i.imgur.com/4s2Z5z4.png") # Menggunakan gambar placeholder
 
 # ======================================================================================
@@ -493,11 +601,96 @@ with tab2:
 # ======================================================================================
 with tab3:
     st.header("Campaign Builder")
-    st.info("Fitur ini sedang dalam pengembangan.")
+    audience_runner = get_audience_runner()
+    job_status_labels = {
+        'antri': "⏳ Queued", 'berjalan': "⚙️ Running", 'selesai': "✅ Done",
+        'dibatalkan': "⛔ Cancelled", 'gagal': "❌ Failed",
+    }
+
+    # Membuat audiens: job dijalankan di thread pool, jadi rerun tidak menunggu hasilnya.
+    build_cols = st.columns([3, 1])
+    with build_cols[0]:
+        audience_segment = st.selectbox(
+            "Audience segment",
+            load_segment_options(),
+            format_func=lambda option: option[1],
+            index=None,
+            placeholder="Choose a saved segment...",
+            label_visibility="collapsed",
+        )
+    with build_cols[1]:
+        if st.button("Build Audience", type="primary", use_container_width=True, disabled=audience_segment is None):
+            job_id = audience_runner.submit(audience_segment[0])
+            st.toast(f"Audience job #{job_id} for '{audience_segment[1]}' started.")
+
+    header_cols = st.columns([6, 1])
+    header_cols[0].subheader("Audience Jobs")
+    if header_cols[1].button("🔄 Refresh", use_container_width=True):
+        st.rerun()
+    st.markdown("---")
+
+    audience_jobs = list_jobs()
+    if not audience_jobs:
+        st.info("No audience has been built yet.")
+    for job in audience_jobs:
+        job_cols = st.columns([3, 1.5, 3, 1, 1])
+        job_cols[0].write(f"**{job.nama_filter}** (#{job.id})")
+        job_cols[1].write(job_status_labels.get(job.status, job.status))
+        job_cols[2].progress(job_progress(job), text=f"{job.jumlah_anggota:,} members")
+        if job.status in ACTIVE_STATUSES:
+            if job_cols[3].button("Cancel", key=f"cancel_job_{job.id}", use_container_width=True):
+                cancel_job(job.id)
+                st.rerun()
+        elif job.status in RESUMABLE_STATUSES:
+            if job_cols[3].button("Resume", key=f"resume_job_{job.id}", use_container_width=True):
+                audience_runner.resume(job.id)
+                st.rerun()
+        if job.jumlah_anggota:
+            if job_cols[4].button("View", key=f"view_job_{job.id}", use_container_width=True):
+                st.session_state.audience_preview_job = job.id
+                st.session_state.audience_page_cursors = [None]
+                st.rerun()
+        if job.status == 'gagal' and job.pesan_error:
+            st.caption(f"Error: {job.pesan_error}")
+
+    # Anggota audiens: paginasi keyset pada id_member, hanya satu halaman yang diambil.
+    preview_job = st.session_state.audience_preview_job
+    if preview_job is not None:
+        st.subheader(f"Audience #{preview_job}")
+        AUDIENCE_PAGE_SIZE = 50
+        cursors = st.session_state.audience_page_cursors
+        members_page = load_audience_page(preview_job, after_member=cursors[-1], limit=AUDIENCE_PAGE_SIZE)
+        st.dataframe(pd.DataFrame(members_page, columns=['id_member', 'kode_member']),
+                     use_container_width=True, hide_index=True)
+        page_cols = st.columns([1, 1, 2, 2])
+        if page_cols[0].button("◀", key="audience_prev", disabled=len(cursors) == 1, use_container_width=True):
+            cursors.pop()
+            st.rerun()
+        if page_cols[1].button("▶", key="audience_next", disabled=len(members_page) < AUDIENCE_PAGE_SIZE,
+                               use_container_width=True):
+            cursors.append(members_page[-1].id_member)
+            st.rerun()
+        export_format = page_cols[2].selectbox("Format", ['csv', 'parquet'], label_visibility="collapsed")
+        if page_cols[3].button("Export", key="audience_export", use_container_width=True):
+            # Ditulis per batch ke file di server; audiens besar tidak pernah ditampung utuh di memori.
+            with st.spinner("Exporting audience..."):
+                export_path = export_audience(preview_job, export_format)
+            st.success(f"Audience exported to `{export_path}`.")
 
 # ======================================================================================
 # --- TAB 4: CAMPAIGN DIRECTORY ---
 # ======================================================================================
 with tab4:
     st.header("Campaign Directory")
-    st.info("Fitur ini sedang dalam pengembangan.")
\ No newline at end of file
+    st.info("Fitur ini sedang dalam pengembangan.")
+# ======================================================================================
+# --- PANEL DEVELOPER (TRACING) ---
+# ======================================================================================
+rerun_trace = end_trace()
+if show_dev_panel:
+    with st.expander("🛠️ Developer: rerun trace", expanded=False):
+        if rerun_trace is not None:
+            st.caption(f"Total rerun: {1000 * rerun_trace.duration:.1f} ms")
+            st.dataframe(pd.DataFrame(flatten(rerun_trace)), use_container_width=True, hide_index=True)
+        st.subheader("Database pool")
+        st.json(pool_stats())
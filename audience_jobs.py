@@ -0,0 +1,245 @@
+# audience_jobs.py
+"""Materialisasi audiens campaign (member unik dari segmen tersimpan) di latar belakang.
+
+`AudienceJobRunner.submit()` hanya membuat baris `audiens_job` lalu langsung kembali,
+jadi rerun Streamlit tidak menunggu. Worker di thread pool memproses rentang
+`member.id` per potongan (`CHUNK_MEMBERS`) dengan satu `INSERT ... SELECT DISTINCT`
+ke `audiens_member`. Kemajuan (rentang terakhir yang selesai dan jumlah anggota)
+di-commit bersama potongannya, sehingga job yang dibatalkan, gagal, atau terputus
+karena proses berhenti dapat dilanjutkan dari potongan berikutnya. Pembatalan
+diperiksa di antara potongan.
+
+Pohon aturan dievaluasi di PostgreSQL lewat `segment_query.py` (rule
+`segmen_tersimpan` diganti pohon segmen acuannya), hanya pada transaksi hingga
+watermark yang dicatat saat job dibuat. Hasil dibaca per halaman (keyset pada
+`id_member`) atau diekspor ke CSV/Parquet secara streaming.
+"""
+import csv
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import func, literal, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from database import engine, session_scope
+from models import AudiensJob, AudiensMember, FilterTersimpan, Member, Transaksi
+from segment_membership import inline_segments
+from segment_query import compile_condition, fact_join, required_models
+
+CHUNK_MEMBERS = int(os.getenv('AUDIENCE_CHUNK_MEMBERS', '5000'))
+AUDIENCE_WORKERS = int(os.getenv('AUDIENCE_WORKERS', '2'))
+EXPORT_DIR = os.getenv('AUDIENCE_EXPORT_DIR', 'exports')
+EXPORT_BATCH_ROWS = 50000
+
+ACTIVE_STATUSES = ('antri', 'berjalan')
+RESUMABLE_STATUSES = ('dibatalkan', 'gagal')
+
+
+# --- JOB ---
+
+def create_job(id_filter: int) -> int:
+    """Mencatat job baru dengan watermark transaksi dan batas member.id saat ini."""
+    with engine.begin() as connection:
+        watermark = connection.execute(select(func.coalesce(func.max(Transaksi.id), 0))).scalar()
+        max_member = connection.execute(select(func.coalesce(func.max(Member.id), 0))).scalar()
+        return connection.execute(
+            insert(AudiensJob).values(id_filter=id_filter, status='antri', watermark=watermark,
+                                      id_member_maks=max_member, id_member_terakhir=0, jumlah_anggota=0)
+            .returning(AudiensJob.id)
+        ).scalar()
+
+
+def cancel_job(job_id: int) -> bool:
+    """Menandai job aktif sebagai dibatalkan; worker berhenti setelah potongan yang sedang berjalan."""
+    with engine.begin() as connection:
+        return connection.execute(
+            update(AudiensJob).where(AudiensJob.id == job_id, AudiensJob.status.in_(ACTIVE_STATUSES))
+            .values(status='dibatalkan', diperbarui_pada=datetime.now())
+        ).rowcount > 0
+
+
+def job_progress(job) -> float:
+    if job.status == 'selesai' or not job.id_member_maks:
+        return 1.0 if job.status == 'selesai' else 0.0
+    return min(job.id_member_terakhir / job.id_member_maks, 1.0)
+
+
+def list_jobs(limit: int = 20) -> list:
+    """Job terbaru beserta nama segmennya."""
+    with session_scope() as session:
+        return session.execute(
+            select(AudiensJob.id, AudiensJob.status, AudiensJob.id_member_maks, AudiensJob.id_member_terakhir,
+                   AudiensJob.jumlah_anggota, AudiensJob.pesan_error, AudiensJob.dibuat_pada,
+                   FilterTersimpan.nama_filter)
+            .join(FilterTersimpan, FilterTersimpan.id == AudiensJob.id_filter)
+            .order_by(AudiensJob.id.desc()).limit(limit)
+        ).all()
+
+
+def _load_tree(connection, segment_id: int) -> dict | None:
+    return connection.execute(
+        select(FilterTersimpan.konfigurasi_json).where(FilterTersimpan.id == segment_id)
+    ).scalar()
+
+
+def build_chunk_insert(job_id: int, tree: dict | None, watermark: int, after_member: int, upto_member: int):
+    """`INSERT ... SELECT DISTINCT` member yang cocok dengan segmen pada satu rentang member.id."""
+    audience = (
+        select(literal(job_id), Member.id, Member.kode_member).distinct()
+        .select_from(fact_join(required_models(tree) | {Member}))
+        .where(Transaksi.id <= watermark)
+        .where(Transaksi.id_member > after_member, Transaksi.id_member <= upto_member)
+        .where(compile_condition(tree))
+    )
+    return (
+        insert(AudiensMember).from_select(['id_job', 'id_member', 'kode_member'], audience)
+        .on_conflict_do_nothing()
+    )
+
+
+def run_job(job_id: int, chunk_members: int = CHUNK_MEMBERS) -> str | None:
+    """Menjalankan (atau melanjutkan) satu job hingga selesai, dibatalkan, atau gagal.
+
+    Mengembalikan status akhir, atau None jika job sudah tidak aktif saat akan dimulai.
+    """
+    with engine.begin() as connection:
+        job = connection.execute(
+            update(AudiensJob).where(AudiensJob.id == job_id, AudiensJob.status.in_(ACTIVE_STATUSES))
+            .values(status='berjalan', pesan_error=None, diperbarui_pada=datetime.now())
+            .returning(AudiensJob.id_filter, AudiensJob.watermark, AudiensJob.id_member_maks,
+                       AudiensJob.id_member_terakhir)
+        ).first()
+    if job is None:
+        return None
+    try:
+        with engine.connect() as connection:
+            tree = inline_segments(_load_tree(connection, job.id_filter),
+                                   lambda segment_id: _load_tree(connection, segment_id))
+        after = job.id_member_terakhir
+        while after < job.id_member_maks:
+            upto = min(after + chunk_members, job.id_member_maks)
+            with engine.begin() as connection:
+                status = connection.execute(select(AudiensJob.status).where(AudiensJob.id == job_id)).scalar()
+                # 'antri' berarti job dilanjutkan lagi selagi potongan sebelumnya masih berjalan.
+                if status not in ACTIVE_STATUSES:
+                    return status
+                inserted = connection.execute(build_chunk_insert(job_id, tree, job.watermark, after, upto)).rowcount
+                # Kemajuan di-commit bersama potongannya; potongan yang diulang tidak menambah anggota ganda.
+                connection.execute(
+                    update(AudiensJob).where(AudiensJob.id == job_id)
+                    .values(id_member_terakhir=upto, jumlah_anggota=AudiensJob.jumlah_anggota + inserted,
+                            diperbarui_pada=datetime.now())
+                )
+            after = upto
+        with engine.begin() as connection:
+            connection.execute(
+                update(AudiensJob).where(AudiensJob.id == job_id, AudiensJob.status.in_(ACTIVE_STATUSES))
+                .values(status='selesai', diperbarui_pada=datetime.now())
+            )
+        return 'selesai'
+    except Exception as e:
+        with engine.begin() as connection:
+            connection.execute(
+                update(AudiensJob).where(AudiensJob.id == job_id)
+                .values(status='gagal', pesan_error=str(e)[:1000], diperbarui_pada=datetime.now())
+            )
+        return 'gagal'
+
+
+class AudienceJobRunner:
+    """Thread pool yang menjalankan job audiens di latar belakang proses aplikasi."""
+
+    def __init__(self, max_workers: int = AUDIENCE_WORKERS, chunk_members: int = CHUNK_MEMBERS):
+        self.chunk_members = chunk_members
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='audiens')
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def _dispatch(self, job_id: int):
+        with self._lock:
+            if job_id in self._running:
+                return
+            self._running.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id: int):
+        try:
+            run_job(job_id, self.chunk_members)
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+
+    def submit(self, id_filter: int) -> int:
+        job_id = create_job(id_filter)
+        self._dispatch(job_id)
+        return job_id
+
+    def resume(self, job_id: int) -> bool:
+        """Melanjutkan job yang dibatalkan atau gagal dari potongan terakhir yang selesai."""
+        with engine.begin() as connection:
+            resumed = connection.execute(
+                update(AudiensJob).where(AudiensJob.id == job_id, AudiensJob.status.in_(RESUMABLE_STATUSES))
+                .values(status='antri', pesan_error=None, diperbarui_pada=datetime.now())
+            ).rowcount > 0
+        if resumed:
+            self._dispatch(job_id)
+        return resumed
+
+    def resume_interrupted(self) -> int:
+        """Menjadwalkan ulang job yang masih aktif di database, mis. setelah proses aplikasi dimulai ulang."""
+        with engine.connect() as connection:
+            job_ids = connection.execute(
+                select(AudiensJob.id).where(AudiensJob.status.in_(ACTIVE_STATUSES)).order_by(AudiensJob.id)
+            ).scalars().all()
+        for job_id in job_ids:
+            self._dispatch(job_id)
+        return len(job_ids)
+
+
+# --- HASIL ---
+
+def load_audience_page(job_id: int, after_member: int | None = None, limit: int = 50) -> list:
+    """Satu halaman anggota audiens dengan paginasi keyset pada id_member."""
+    query = select(AudiensMember.id_member, AudiensMember.kode_member).where(AudiensMember.id_job == job_id)
+    if after_member is not None:
+        query = query.where(AudiensMember.id_member > after_member)
+    with session_scope() as session:
+        return session.execute(query.order_by(AudiensMember.id_member).limit(limit)).all()
+
+
+def export_audience(job_id: int, fmt: str = 'csv', directory: str = EXPORT_DIR,
+                    batch_rows: int = EXPORT_BATCH_ROWS) -> str:
+    """Mengekspor audiens ke CSV atau Parquet per batch lewat server-side cursor; mengembalikan path file.
+
+    File ditulis ke nama sementara lalu diganti secara atomik, jadi file yang terlihat selalu lengkap.
+    """
+    if fmt not in ('csv', 'parquet'):
+        raise ValueError(f"Format ekspor '{fmt}' tidak didukung.")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"audiens_{job_id}.{fmt}")
+    tmp_path = path + '.tmp'
+    schema = pa.schema([('id_member', pa.int32()), ('kode_member', pa.string())])
+    query = (
+        select(AudiensMember.id_member, AudiensMember.kode_member)
+        .where(AudiensMember.id_job == job_id).order_by(AudiensMember.id_member)
+    )
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, max_row_buffer=batch_rows).execute(query)
+        if fmt == 'csv':
+            with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(schema.names)
+                for rows in result.partitions(batch_rows):
+                    writer.writerows(rows)
+        else:
+            with pq.ParquetWriter(tmp_path, schema) as writer:
+                for rows in result.partitions(batch_rows):
+                    ids, codes = zip(*rows)
+                    writer.write_table(pa.table([pa.array(ids, pa.int32()), pa.array(codes, pa.string())],
+                                                schema=schema))
+    os.replace(tmp_path, path)
+    return path
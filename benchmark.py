@@ -0,0 +1,296 @@
+# benchmark.py
+"""Benchmark evaluasi segmen yang dapat direproduksi, tanpa PostgreSQL.
+
+Frame fakta sintetis dibuat dengan distribusi `data_generator.py` (toko, karyawan,
+produk berbobot popularitas, member, jam sibuk, ukuran keranjang) pada beberapa
+skala, lalu operasi inti diukur:
+
+- `fact_load`      : normalisasi + konversi ringkas frame hasil query (`fact_data.py`)
+- `snapshot_open`  : membuka snapshot Arrow lewat memory map (`fact_snapshot.py`)
+- `tree_config`    : config condition tree dari definisi field (`tree_config.py`, jika streamlit-condition-tree terpasang)
+- `evaluate`       : evaluasi pohon aturan (`predicate_eval.py`) pada frame ringkas dan biasa
+- `aggregate`      : agregasi per produk untuk pie chart Segment Builder
+- `sample_estimate`: pratinjau dari sampel berstrata beserta interval kepercayaan (`sample_preview.py`)
+
+    python benchmark.py --scales 100000 1000000 10000000 --output hasil.json
+    python benchmark.py --compare hasil_lama.json --output hasil_baru.json
+
+Hasil ditulis sebagai JSON (satu entri per skala/operasi/pohon/frame) sehingga bisa
+dibandingkan antar commit dengan `--compare`. Tanpa `--output`, hasil ditulis ke folder
+`benchmarks/` (di-ignore git).
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data_generator import build_master_data, generate_transaction_batches
+from fact_data import compact_fact_frame, prepare_fact_frame
+from predicate_eval import evaluate_tree
+from sample_preview import StratifiedSample
+
+DEFAULT_SCALES = [100_000, 1_000_000, 10_000_000]
+BENCH_START_DATE = '2024-01-01'
+BENCH_DIR = os.getenv('BENCHMARK_DIR', 'benchmarks')
+# Rata-rata item per hari pada skala transaksi 1 (±33 transaksi x ±2,3 item).
+_ITEMS_PER_DAY = 75
+
+
+# --- PUSTAKA POHON ATURAN ---
+
+def _rule(field: str, operator: str, *values) -> dict:
+    return {'type': 'rule', 'properties': {'field': field, 'operator': operator, 'value': list(values)}}
+
+
+def _group(conjunction: str, *children, negate: bool = False) -> dict:
+    return {'type': 'group', 'properties': {'conjunction': conjunction, 'not': negate}, 'children1': list(children)}
+
+
+TREE_LIBRARY = {
+    'satu_kota': _group('AND', _rule('kota', 'select_equals', 'Bandung')),
+    'kategori_dan_periode': _group(
+        'AND',
+        _rule('kategori_produk', 'select_any_in', ['Minuman', 'Makanan']),
+        _rule('waktu_transaksi', 'between', '2024-03-01T00:00:00', '2024-05-31T23:59:59'),
+    ),
+    'member_belanja_besar': _group(
+        'AND',
+        _rule('nama_member', 'is_not_null'),
+        _rule('total_harga_item', 'greater_or_equal', 50000),
+    ),
+    'toko_atau_produk': _group(
+        'OR',
+        _rule('nama_toko', 'select_any_in', ['Alfamart Bandung 1', 'Alfamart Surabaya 2']),
+        _rule('nama_produk', 'like', 'Kopi'),
+    ),
+    'bersarang_dengan_not': _group(
+        'AND',
+        _rule('posisi_karyawan', 'select_equals', 'Kasir'),
+        _group('OR', _rule('kota', 'select_equals', 'Jakarta Selatan'), _rule('jumlah_item', 'greater', 2)),
+        _group('AND', _rule('kategori_produk', 'select_equals', 'Lainnya'), negate=True),
+    ),
+    'non_member_produk_susu': _group(
+        'AND',
+        _rule('nama_member', 'is_null'),
+        _rule('harga_jual', 'between', 2000, 15000),
+        _rule('nama_produk', 'starts_with', 'Susu'),
+    ),
+}
+
+
+# --- DATA SINTETIS ---
+
+def synthetic_fact_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Frame fakta sintetis dengan kolom yang sama seperti `FACT_QUERY`, dipotong tepat `rows` baris."""
+    df_toko, df_karyawan, df_produk, df_member, produk_weights = build_master_data(seed=seed)
+    days = 365
+    skala = max(1, math.ceil(rows / (days * _ITEMS_PER_DAY)))
+    rng = np.random.default_rng(seed)
+    transaksi_parts, detail_parts, total = [], [], 0
+    for df_transaksi, df_detail in generate_transaction_batches(
+            BENCH_START_DATE, days * 2, df_toko, df_karyawan, df_produk, df_member, produk_weights,
+            rng=rng, skala=skala):
+        transaksi_parts.append(df_transaksi)
+        detail_parts.append(df_detail)
+        total += len(df_detail)
+        if total >= rows:
+            break
+    transaksi = pd.concat(transaksi_parts, ignore_index=True)
+    detail = pd.concat(detail_parts, ignore_index=True).iloc[:rows]
+
+    # ID master berurutan mulai 1, jadi baris master bisa diambil langsung dengan indeks id - 1.
+    t_idx = detail['id_transaksi'].to_numpy() - transaksi['id'].iloc[0]
+    toko_idx = transaksi['id_toko'].to_numpy()[t_idx] - 1
+    karyawan_idx = transaksi['id_karyawan'].to_numpy()[t_idx] - 1
+    produk_idx = detail['id_produk'].to_numpy() - 1
+    member_ids = transaksi['id_member'].to_numpy(dtype='float64', na_value=np.nan)[t_idx]
+    has_member = ~np.isnan(member_ids)
+    member_idx = np.where(has_member, member_ids, 1).astype(int) - 1
+
+    def take(series: pd.Series, idx: np.ndarray, mask: np.ndarray | None = None) -> np.ndarray:
+        values = series.to_numpy(dtype=object)[idx]
+        if mask is not None:
+            values[~mask] = None
+        return values
+
+    harga = detail['harga_saat_transaksi'].to_numpy(dtype='float64')
+    return pd.DataFrame({
+        'id_detail': np.arange(1, len(detail) + 1),
+        'id_transaksi': detail['id_transaksi'].to_numpy(),
+        'waktu_transaksi': transaksi['waktu_transaksi'].to_numpy()[t_idx],
+        'nama_toko': take(df_toko['nama_toko'], toko_idx),
+        'kota': take(df_toko['kota'], toko_idx),
+        'nama_karyawan': take(df_karyawan['nama_karyawan'], karyawan_idx),
+        'posisi_karyawan': take(df_karyawan['posisi'], karyawan_idx),
+        'nama_produk': take(df_produk['nama_produk'], produk_idx),
+        'kategori_produk': take(df_produk['kategori'], produk_idx),
+        'harga_jual': df_produk['harga_jual'].to_numpy(dtype='float64')[produk_idx],
+        'jumlah_item': detail['jumlah'].to_numpy(),
+        'harga_saat_transaksi': harga,
+        'total_harga_item': detail['jumlah'].to_numpy() * harga,
+        'nama_member': take(df_member['nama_member'], member_idx, has_member),
+        'tanggal_join_member': take(df_member['tanggal_bergabung'], member_idx, has_member),
+    })
+
+
+# --- PENGUKURAN ---
+
+def _measure(func, repeat: int) -> tuple[dict, object]:
+    times, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - started)
+    return {
+        'repeat': repeat,
+        'seconds_min': min(times),
+        'seconds_median': statistics.median(times),
+        'seconds_mean': statistics.fmean(times),
+    }, result
+
+
+def _aggregate(df: pd.DataFrame, mask: np.ndarray) -> pd.DataFrame:
+    product_sales = df[mask].groupby('nama_produk', observed=True)['jumlah_item'].sum().reset_index()
+    return product_sales[product_sales['jumlah_item'] > 0]
+
+
+def run_scale(rows: int, repeat: int, seed: int, trees: dict) -> list[dict]:
+    results = []
+
+    def record(operation: str, timing: dict, **extra):
+        entry = {'scale': rows, 'operation': operation, **extra, **timing}
+        results.append(entry)
+        label = ' '.join(str(v) for v in extra.values())
+        print(f"   {rows:>11,} {operation:<14} {label:<32} median {1000 * timing['seconds_median']:10.2f} ms")
+
+    raw = synthetic_fact_frame(rows, seed)
+    timing, (compact, _) = _measure(lambda: compact_fact_frame(prepare_fact_frame(raw.copy())), repeat)
+    record('fact_load', timing, bytes_plain=int(raw.memory_usage(deep=True).sum()),
+           bytes_compact=int(compact.memory_usage(deep=True).sum()))
+    plain = prepare_fact_frame(raw)
+
+    try:
+        from fact_snapshot import open_snapshot, write_snapshot
+    except ImportError:
+        print("   (pyarrow tidak terpasang: snapshot_open dilewati)")
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, write_snapshot(compact, 0, directory))
+            timing, _ = _measure(lambda: open_snapshot(path), repeat)
+            record('snapshot_open', timing)
+
+    try:
+        from tree_config import SELECT_FIELDS, build_tree_config, describe_fields
+    except ImportError:
+        print("   (streamlit-condition-tree tidak terpasang: tree_config dilewati)")
+    else:
+        # Nilai dropdown dibaca dari tabel dimensi; di sini diambil dari frame ringkas sebagai penggantinya.
+        distinct_values = {field: compact[field].cat.categories.tolist() for field in SELECT_FIELDS if field in compact}
+        timing, _ = _measure(lambda: build_tree_config(describe_fields(distinct_values), []), repeat)
+        record('tree_config', timing)
+
+    for frame_name, frame in (('compact', compact), ('plain', plain)):
+        for tree_name, tree in trees.items():
+            evaluate_tree(frame, tree)  # plan dikompilasi sekali; yang diukur evaluasi dengan cache hangat
+            timing, mask = _measure(lambda: evaluate_tree(frame, tree), repeat)
+            record('evaluate', timing, tree=tree_name, frame=frame_name, matched_rows=int(mask.sum()))
+            timing, _ = _measure(lambda: _aggregate(frame, mask), repeat)
+            record('aggregate', timing, tree=tree_name, frame=frame_name)
+
+    sample = StratifiedSample(compact, seed=seed)
+    for tree_name, tree in trees.items():
+        sample.estimate(tree)
+        timing, (_, total, interval) = _measure(lambda: sample.estimate(tree), repeat)
+        record('sample_estimate', timing, tree=tree_name, frame='compact', sample_rows=len(sample),
+               estimated_total=round(total), ci=round(interval))
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(scales: list[int], repeat: int = 5, seed: int = 42, trees: dict | None = None) -> dict:
+    trees = trees or TREE_LIBRARY
+    meta = {
+        'dibuat_pada': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'repeat': repeat,
+    }
+    results = []
+    for rows in scales:
+        print(f"Skala {rows:,} baris...")
+        results.extend(run_scale(rows, repeat, seed, trees))
+    return {'meta': meta, 'results': results}
+
+
+# --- PERBANDINGAN ---
+
+def _result_key(entry: dict) -> tuple:
+    return entry['scale'], entry['operation'], entry.get('tree'), entry.get('frame')
+
+
+def compare(baseline: dict, current: dict, max_ratio: float) -> list[dict]:
+    """Membandingkan median waktu per entri; mengembalikan entri yang melambat lebih dari `max_ratio`."""
+    before = {_result_key(e): e for e in baseline['results']}
+    regressions = []
+    for entry in current['results']:
+        old = before.get(_result_key(entry))
+        if old is None or old['seconds_median'] <= 0:
+            continue
+        ratio = entry['seconds_median'] / old['seconds_median']
+        flag = '  <-- REGRESI' if ratio > max_ratio else ''
+        print(f"   {' / '.join(str(k) for k in _result_key(entry) if k is not None):<60} x{ratio:5.2f}{flag}")
+        if ratio > max_ratio:
+            regressions.append({**entry, 'ratio': ratio})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark evaluasi segmen pada frame fakta sintetis.")
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES, help="Jumlah baris detail per skala")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--tree', action='append', choices=sorted(TREE_LIBRARY), help="Batasi ke pohon tertentu")
+    parser.add_argument('--output', default=None, help="File hasil JSON (default: benchmarks/benchmark_<commit>.json)")
+    parser.add_argument('--compare', default=None, help="File hasil JSON pembanding (baseline)")
+    parser.add_argument('--max-regression', type=float, default=1.25,
+                        help="Rasio median maksimum terhadap baseline sebelum dianggap regresi")
+    args = parser.parse_args()
+
+    trees = {name: TREE_LIBRARY[name] for name in args.tree} if args.tree else TREE_LIBRARY
+    report = run_benchmark(args.scales, args.repeat, args.seed, trees)
+    output = args.output
+    if output is None:
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        output = os.path.join(BENCH_DIR, f"benchmark_{report['meta']['commit'] or 'lokal'}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Hasil benchmark ditulis ke {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.max_regression)
+        if regressions:
+            print(f"❌ {len(regressions)} operasi melambat lebih dari x{args.max_regression}.")
+            sys.exit(1)
@@ -0,0 +1,175 @@
+# bulk_load.py
+"""Bulk load ke PostgreSQL lewat `COPY ... FROM STDIN` (psycopg2 `copy_expert`).
+
+Dipakai oleh `data_generator.py` dan untuk backfill produksi dari file CSV:
+
+    python bulk_load.py transaksi transaksi.csv --drop-indexes
+
+Baris dikirim sebagai aliran CSV per potongan (chunk), jadi DataFrame besar atau
+generator DataFrame tidak perlu diubah menjadi satu string raksasa di memori.
+"""
+import argparse
+import io
+import time
+from collections import namedtuple
+from typing import Iterable
+
+import pandas as pd
+
+from database import engine
+
+LoadStats = namedtuple('LoadStats', ['table', 'rows', 'seconds', 'rows_per_second'])
+
+
+def _prepare_for_copy(df: pd.DataFrame) -> pd.DataFrame:
+    """Kolom float yang isinya bilangan bulat (mis. id_member dengan NULL) ditulis sebagai integer."""
+    df = df.copy()
+    for col in df.select_dtypes('float').columns:
+        values = df[col].dropna()
+        if len(values) and (values == values.round()).all():
+            df[col] = df[col].astype('Int64')
+    return df
+
+
+class _CsvStream(io.RawIOBase):
+    """Objek file yang menghasilkan CSV secara bertahap dari rangkaian DataFrame."""
+
+    def __init__(self, frames: Iterable[pd.DataFrame], columns: list[str]):
+        self._frames = iter(frames)
+        self._columns = columns
+        self._buffer = b''
+        self.rows = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill(self, size: int):
+        while size < 0 or len(self._buffer) < size:
+            frame = next(self._frames, None)
+            if frame is None:
+                return
+            if frame.empty:
+                continue
+            self.rows += len(frame)
+            csv = _prepare_for_copy(frame[self._columns]).to_csv(header=False, index=False)
+            self._buffer += csv.encode('utf-8')
+
+    def read(self, size: int = -1) -> bytes:
+        self._fill(size)
+        if size < 0:
+            chunk, self._buffer = self._buffer, b''
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def _chunks(df: pd.DataFrame, chunk_rows: int):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _droppable_indexes(cursor, table: str) -> list[tuple[str, str]]:
+    """Index sekunder pada tabel (index milik PRIMARY KEY/UNIQUE constraint tidak disentuh)."""
+    cursor.execute("""
+        SELECT i.indexname, i.indexdef
+        FROM pg_indexes i
+        WHERE i.schemaname = current_schema() AND i.tablename = %s
+          AND NOT EXISTS (
+              SELECT 1 FROM pg_constraint c
+              WHERE c.conrelid = %s::regclass AND c.conname = i.indexname
+          )
+    """, (table, table))
+    return cursor.fetchall()
+
+
+def drop_secondary_indexes(connection, table: str) -> list[str]:
+    """Drop index sekunder pada `table`; mengembalikan definisinya untuk `create_indexes()`."""
+    cursor = connection.connection.cursor()
+    try:
+        indexes = _droppable_indexes(cursor, table)
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX "{name}"')
+    finally:
+        cursor.close()
+    # Definisi index tabel berpartisi berbentuk "ON ONLY <tabel>"; dibuat ulang tanpa ONLY
+    # agar index langsung diturunkan ke semua partisi.
+    return [definition.replace(' ON ONLY ', ' ON ', 1) for _, definition in indexes]
+
+
+def create_indexes(connection, definitions: list[str]):
+    cursor = connection.connection.cursor()
+    try:
+        for definition in definitions:
+            cursor.execute(definition)
+    finally:
+        cursor.close()
+
+
+def copy_frames(connection, table: str, frames: Iterable[pd.DataFrame], columns: list[str],
+                drop_indexes: bool = False) -> LoadStats:
+    """Mengalirkan rangkaian DataFrame ke `table` dengan satu perintah COPY.
+
+    `connection` adalah Connection SQLAlchemy; commit/rollback diatur oleh pemanggil
+    (mis. `with engine.begin() as conn:`). Jika `drop_indexes=True`, index sekunder
+    di-drop sebelum COPY dan dibuat ulang sesudahnya di transaksi yang sama.
+    """
+    started = time.perf_counter()
+    indexes = drop_secondary_indexes(connection, table) if drop_indexes else []
+    cursor = connection.connection.cursor()
+    try:
+        stream = _CsvStream(frames, columns)
+        column_list = ', '.join(f'"{c}"' for c in columns)
+        cursor.copy_expert(f'COPY "{table}" ({column_list}) FROM STDIN WITH (FORMAT csv)', stream)
+    finally:
+        cursor.close()
+    create_indexes(connection, indexes)
+    seconds = time.perf_counter() - started
+    return LoadStats(table, stream.rows, seconds, stream.rows / seconds if seconds > 0 else float('inf'))
+
+
+def copy_dataframe(connection, table: str, df: pd.DataFrame, drop_indexes: bool = False,
+                   chunk_rows: int = 100_000) -> LoadStats:
+    """Memuat satu DataFrame ke `table` lewat COPY, dikirim per `chunk_rows` baris."""
+    return copy_frames(connection, table, _chunks(df, chunk_rows), list(df.columns), drop_indexes)
+
+
+def sync_sequence(connection, table: str, column: str = 'id'):
+    """Menyamakan sequence SERIAL dengan nilai maksimum kolom setelah memuat ID eksplisit."""
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(
+            f'SELECT setval(pg_get_serial_sequence(%s, %s), coalesce(max("{column}"), 1), max("{column}") IS NOT NULL) '
+            f'FROM "{table}"',
+            (table, column),
+        )
+    finally:
+        cursor.close()
+
+
+def combine_stats(table: str, stats: list[LoadStats]) -> LoadStats:
+    """Menjumlahkan statistik beberapa COPY ke tabel yang sama."""
+    rows = sum(s.rows for s in stats)
+    seconds = sum(s.seconds for s in stats)
+    return LoadStats(table, rows, seconds, rows / seconds if seconds > 0 else float('inf'))
+
+
+def report(stats: LoadStats):
+    print(f"   {stats.table}: {stats.rows:,} baris dalam {stats.seconds:.2f} dtk ({stats.rows_per_second:,.0f} baris/dtk)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill tabel PostgreSQL dari file CSV lewat COPY.")
+    parser.add_argument('table', help="Nama tabel tujuan")
+    parser.add_argument('csv_path', help="File CSV dengan baris header berisi nama kolom")
+    parser.add_argument('--drop-indexes', action='store_true', help="Drop index sekunder selama load lalu buat ulang")
+    parser.add_argument('--chunk-rows', type=int, default=100_000)
+    parser.add_argument('--sync-sequence', action='store_true', help="Samakan sequence kolom id setelah load")
+    args = parser.parse_args()
+
+    columns = list(pd.read_csv(args.csv_path, nrows=0).columns)
+    with engine.begin() as conn:
+        stats = copy_frames(conn, args.table, pd.read_csv(args.csv_path, chunksize=args.chunk_rows),
+                            columns, drop_indexes=args.drop_indexes)
+        if args.sync_sequence:
+            sync_sequence(conn, args.table)
+    report(stats)
@@ -1,12 +1,19 @@
 # data_generator.py
+import argparse
+import os
 import pandas as pd
 import random
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from faker import Faker
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import text
 from database import engine
-from datetime import datetime, time, timedelta
+from inventory_ledger import mark_baseline
+from bulk_load import combine_stats, copy_dataframe, create_indexes, drop_secondary_indexes, report, sync_sequence
+from partition_maintenance import ensure_partitions, is_partitioned
+from rollup import refresh_rollup
+from datetime import datetime, timedelta
 
 # Inisialisasi Faker untuk data Indonesia
 fake = Faker('id_ID')
@@ -17,6 +24,13 @@ def clear_all_data():
     print("Membersihkan data lama dari database...")
     with engine.connect() as connection:
         with connection.begin():
+            connection.execute(text('TRUNCATE TABLE rollup_penjualan_harian;'))
+            # Bitmap keanggotaan berisi id_detail dataset lama; id baru dimulai ulang dari 1.
+            connection.execute(text('TRUNCATE TABLE keanggotaan_segmen;'))
+            # anggota_segmen ikut kosong lewat CASCADE member; status harus ikut agar segmen dibangun ulang.
+            connection.execute(text('TRUNCATE TABLE status_anggota_segmen;'))
+            # Watermark proses inkremental (fitur_member, rollup, ledger stok) tidak berlaku untuk data baru.
+            connection.execute(text('TRUNCATE TABLE watermark_proses;'))
             connection.execute(text('TRUNCATE TABLE detail_transaksi, stok_gudang RESTART IDENTITY CASCADE;'))
             connection.execute(text('TRUNCATE TABLE transaksi RESTART IDENTITY CASCADE;'))
             connection.execute(text('TRUNCATE TABLE karyawan RESTART IDENTITY CASCADE;'))
@@ -26,15 +40,20 @@ def clear_all_data():
     print("Data lama berhasil dibersihkan.")
 
 
-def generate_master_data():
-    """Membuat dan menyimpan data master (Toko, Karyawan, Produk, Member)."""
-    print("Membuat data master...")
-    
+def build_master_data(toko_per_kota=3, jumlah_member=200, jumlah_produk_acak=200, seed=None):
+    """Membuat data master (Toko, Karyawan, Produk, Member) di memori tanpa menulis ke database.
+
+    Jika `seed` diberikan, `random` dan Faker di-seed sehingga hasilnya selalu sama.
+    """
+    if seed is not None:
+        random.seed(seed)
+        fake.seed_instance(seed)
+
     # 1. Toko
     toko_data = []
     kota_cabang = ['Bandung', 'Jakarta Selatan', 'Surabaya', 'Yogyakarta', 'Semarang']
     for i, kota in enumerate(kota_cabang):
-        for j in range(1, 4): # 3 toko per kota
+        for j in range(1, toko_per_kota + 1):
             toko_data.append({
                 'id': len(toko_data) + 1,
                 'nama_toko': f'Alfamart {kota.split()[0]} {j}',
@@ -195,7 +214,7 @@ def generate_master_data():
     nama_produk = ['Snack', 'Drink', 'Soap', 'Shampoo', 'Juice', 'Tea', 'Coffee', 'Biscuit', 'Candy', 'Powder', 'Spray', 'Bar', 'Bottle', 'Pack', 'Box', 'Roll', 'Cream', 'Paste', 'Oil', 'Milk']
     satuan = ['100g', '200g', '250ml', '500ml', '1L', '2L', '3pcs', '5pcs', '10pcs', '1kg']
 
-    for i in range(200):
+    for i in range(jumlah_produk_acak):
         kat = random.choice(kategori_list)
         nama = f"{random.choice(nama_awal)} {random.choice(nama_produk)} {random.choice(satuan)}"
         harga = random.randint(2000, 100000)
@@ -218,103 +237,297 @@ def generate_master_data():
         'kode_member': f'M{i+1:05d}',
         'nama_member': fake.name(),
         'tanggal_bergabung': fake.date_between(start_date='-3y', end_date='-1M'),
-    } for i in range(200)]
+    } for i in range(jumlah_member)]
     df_member = pd.DataFrame(member_data)
+    return df_toko, df_karyawan, df_produk, df_member, produk_weights
+
 
-    with engine.connect() as conn:
-        with conn.begin():
-            df_toko.to_sql('toko', con=conn, if_exists='append', index=False)
-            df_produk.to_sql('produk', con=conn, if_exists='append', index=False)
-            df_karyawan.to_sql('karyawan', con=conn, if_exists='append', index=False)
-            df_member.to_sql('member', con=conn, if_exists='append', index=False)
+def generate_master_data(toko_per_kota=3, jumlah_member=200, jumlah_produk_acak=200, seed=None):
+    """Membuat dan menyimpan data master (Toko, Karyawan, Produk, Member)."""
+    print("Membuat data master...")
+    df_toko, df_karyawan, df_produk, df_member, produk_weights = build_master_data(
+        toko_per_kota, jumlah_member, jumlah_produk_acak, seed)
+
+    with engine.begin() as conn:
+        for table, df in [('toko', df_toko), ('produk', df_produk), ('karyawan', df_karyawan), ('member', df_member)]:
+            report(copy_dataframe(conn, table, df))
+            # ID ditulis eksplisit, jadi sequence SERIAL perlu disamakan agar insert berikutnya tidak bentrok.
+            sync_sequence(conn, table)
     
     print("✅ Data master berhasil disimpan.")
     return df_toko, df_karyawan, df_produk, df_member, produk_weights
 
 
+def build_stok(df_toko, df_produk):
+    # Satu baris per (toko, produk); jumlah stok diambil dari `random` agar ikut seed master data.
+    rng = np.random.default_rng(random.getrandbits(32))
+    id_toko, id_produk = np.meshgrid(df_toko['id'].to_numpy(), df_produk['id'].to_numpy(), indexing='ij')
+    return pd.DataFrame({
+        'id_produk': id_produk.ravel(),
+        'id_toko': id_toko.ravel(),
+        'jumlah_stok': rng.integers(20, 201, id_toko.size),
+        'last_updated': datetime.now(),
+    })
+
+
 def generate_stok(df_toko, df_produk):
     print("Membuat data stok awal...")
-    stok_data = []
-    for _, toko in df_toko.iterrows():
-        for _, produk in df_produk.iterrows():
-            stok_data.append({
-                'id_produk': produk['id'],
-                'id_toko': toko['id'],
-                'jumlah_stok': random.randint(20, 200),
-                'last_updated': datetime.now()
-            })
-    df_stok = pd.DataFrame(stok_data)
-    with engine.connect() as conn:
-        with conn.begin():
-            df_stok.to_sql('stok_gudang', con=conn, if_exists='append', index=False)
+    df_stok = build_stok(df_toko, df_produk)
+    with engine.begin() as conn:
+        report(copy_dataframe(conn, 'stok_gudang', df_stok))
     print("✅ Data stok berhasil disimpan.")
 
 
-def generate_transactions(days, df_toko, df_karyawan, df_produk, df_member, produk_weights):
+# Distribusi transaksi: 60% di jam sibuk, ukuran keranjang 1-5 item.
+PEAK_HOURS = np.array([8, 9, 12, 13, 18, 19])
+BASKET_SIZES = np.array([1, 2, 3, 4, 5])
+BASKET_WEIGHTS = np.array([0.2, 0.4, 0.3, 0.05, 0.05])
+# Batas atas transaksi per hari pada skala 1; dipakai untuk membagi rentang transaksi.id antar shard.
+MAX_TRANSAKSI_PER_HARI = 60
+
+
+def generate_transaction_batches(start_date, days, df_toko, df_karyawan, df_produk, df_member, produk_weights,
+                                 rng=None, first_id=1, first_detail_id=1, block_days=31, skala=1):
+    """Membuat transaksi secara tervektorisasi dengan NumPy, satu blok (default ±1 bulan) per iterasi.
+
+    Distribusinya sama dengan versi per-transaksi: 40-60 transaksi/hari di akhir pekan
+    dan 20-30 di hari kerja, 60% di jam sibuk, 60% oleh member, ukuran keranjang
+    berbobot, dan produk dipilih sesuai bobot popularitas (produk duplikat dalam satu
+    keranjang dilewati). `skala` mengalikan jumlah transaksi per hari. ID transaksi dan
+    detail diberikan berurutan mulai `first_id` dan `first_detail_id`. Menghasilkan
+    (df_transaksi, df_detail) per blok.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    toko_ids = df_toko['id'].to_numpy()
+    karyawan_sorted = df_karyawan.sort_values(['id_toko', 'id'])
+    karyawan_ids = karyawan_sorted['id'].to_numpy()
+    # Posisi awal dan jumlah karyawan per toko, sehingga karyawan bisa dipilih tanpa filter per transaksi.
+    karyawan_start = np.searchsorted(karyawan_sorted['id_toko'].to_numpy(), toko_ids)
+    karyawan_count = np.searchsorted(karyawan_sorted['id_toko'].to_numpy(), toko_ids, side='right') - karyawan_start
+    member_ids = df_member['id'].to_numpy()
+    produk_ids = df_produk['id'].to_numpy()
+    produk_harga = df_produk['harga_jual'].to_numpy()
+    produk_p = np.asarray(produk_weights, dtype=float) / np.sum(produk_weights)
+
+    start_day = np.datetime64(pd.Timestamp(start_date).normalize().to_datetime64(), 'D')
+    next_id, next_detail_id = first_id, first_detail_id
+    for block_start in range(0, days, block_days):
+        day_dates = start_day + np.arange(block_start, min(block_start + block_days, days))
+        weekend = ((day_dates.astype('datetime64[D]').view('int64') - 4) % 7) >= 5  # 1970-01-01 adalah Kamis
+        per_day = np.where(weekend, rng.integers(40, 61, len(day_dates)), rng.integers(20, 31, len(day_dates))) * skala
+        n = int(per_day.sum())
+
+        # Waktu: 40% tersebar merata sepanjang hari, 60% di jam sibuk + menit acak.
+        peak = rng.random(n) < 0.6
+        seconds = np.where(
+            peak,
+            PEAK_HOURS[rng.integers(0, len(PEAK_HOURS), n)] * 3600 + rng.integers(0, 60, n) * 60,
+            rng.integers(0, 86400, n),
+        )
+        waktu = np.repeat(day_dates, per_day).astype('datetime64[s]') + seconds.astype('timedelta64[s]')
+        # Diurutkan agar urutan id transaksi mengikuti urutan waktu (atribut lain diacak independen).
+        waktu = np.sort(waktu)
+
+        toko_idx = rng.integers(0, len(toko_ids), n)
+        karyawan_idx = karyawan_start[toko_idx] + (rng.random(n) * karyawan_count[toko_idx]).astype(int)
+        member = np.where(rng.random(n) < 0.6, member_ids[rng.integers(0, len(member_ids), n)], 0)
+        id_member = pd.array(member, dtype='Int64')
+        id_member[member == 0] = pd.NA
+        transaksi_ids = np.arange(next_id, next_id + n)
+        next_id += n
+
+        df_transaksi = pd.DataFrame({
+            'id': transaksi_ids,
+            'waktu_transaksi': waktu,
+            'id_toko': toko_ids[toko_idx],
+            'id_karyawan': karyawan_ids[karyawan_idx],
+            'id_member': id_member,
+        })
+
+        # Item: ukuran keranjang berbobot, produk berbobot popularitas, duplikat dalam keranjang dibuang.
+        basket = rng.choice(BASKET_SIZES, n, p=BASKET_WEIGHTS)
+        item_trans = np.repeat(np.arange(n), basket)
+        item_produk = rng.choice(len(produk_ids), len(item_trans), p=produk_p)
+        _, first = np.unique(item_trans * len(produk_ids) + item_produk, return_index=True)
+        keep = np.sort(first)
+        item_trans, item_produk = item_trans[keep], item_produk[keep]
+
+        detail_ids = np.arange(next_detail_id, next_detail_id + len(item_trans))
+        next_detail_id += len(item_trans)
+
+        df_detail = pd.DataFrame({
+            'id': detail_ids,
+            'id_transaksi': transaksi_ids[item_trans],
+            'id_produk': produk_ids[item_produk],
+            'jumlah': rng.integers(1, 4, len(item_trans)),
+            'harga_saat_transaksi': produk_harga[item_produk],
+        })
+        yield df_transaksi, df_detail
+
+
+def with_waktu_transaksi(df_detail, df_transaksi):
+    """Menyalin waktu_transaksi header ke detail; wajib untuk skema berpartisi (skema_partisi.sql)."""
+    waktu = df_transaksi.set_index('id')['waktu_transaksi']
+    return df_detail.assign(waktu_transaksi=df_detail['id_transaksi'].map(waktu).to_numpy())
+
+
+def generate_transactions(days, df_toko, df_karyawan, df_produk, df_member, produk_weights, seed=None):
     print(f"Membuat data transaksi untuk {days} hari terakhir...")
-    transaksi_data = []
-    detail_transaksi_data = []
-    
     start_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
-    
-    for day_offset in range(days):
-        current_date = start_date + timedelta(days=day_offset)
-        num_transactions = random.randint(40, 60) if current_date.weekday() >= 5 else random.randint(20, 30)
-        
-        for _ in range(num_transactions):
-            peak_hours = [time(8), time(9), time(12), time(13), time(18), time(19)]
-            trans_time = random.choices(
-                population=[fake.date_time_between(start_date=current_date, end_date=current_date + timedelta(days=1)-timedelta(seconds=1)),
-                            datetime.combine(current_date, random.choice(peak_hours)) + timedelta(minutes=random.randint(0,59))],
-                weights=[0.4, 0.6],
-                k=1)[0]
-            
-            toko_terpilih = df_toko.sample(1).iloc[0]
-            karyawan_toko = df_karyawan[df_karyawan['id_toko'] == toko_terpilih['id']]
-            
-            ## <-- PERBAIKAN DIMULAI DI SINI
-            # 1. Tentukan apakah transaksi ini oleh member (probabilitas 60%)
-            is_member_transaction = random.choices([True, False], weights=[0.6, 0.4], k=1)[0]
-            
-            # 2. Jika ya, pilih ID member acak. Jika tidak, gunakan None.
-            member_id = random.choice(df_member['id'].tolist()) if is_member_transaction else None
-            ## <-- PERBAIKAN SELESAI
-            
-            transaksi_id = len(transaksi_data) + 1
-            transaksi_data.append({
-                'id': transaksi_id,
-                'waktu_transaksi': trans_time,
-                'id_toko': toko_terpilih['id'],
-                'id_karyawan': random.choice(karyawan_toko['id'].tolist()),
-                'id_member': member_id # Gunakan variabel yang sudah kita buat
-            })
-            
-            produk_dibeli = set()
-            jumlah_item = random.choices([1,2,3,4,5], weights=[0.2,0.4,0.3,0.05,0.05], k=1)[0]
-            
-            for _ in range(jumlah_item):
-                produk_terpilih = df_produk.sample(1, weights=produk_weights).iloc[0]
-                if produk_terpilih['id'] in produk_dibeli:
-                    continue
-                produk_dibeli.add(produk_terpilih['id'])
-
-                detail_transaksi_data.append({
-                    'id_transaksi': transaksi_id,
-                    'id_produk': produk_terpilih['id'],
-                    'jumlah': random.randint(1, 3),
-                    'harga_saat_transaksi': produk_terpilih['harga_jual']
-                })
-
-    with engine.connect() as conn:
-        with conn.begin():
-            pd.DataFrame(transaksi_data).to_sql('transaksi', con=conn, if_exists='append', index=False)
-            pd.DataFrame(detail_transaksi_data).to_sql('detail_transaksi', con=conn, if_exists='append', index=False)
-    print(f"✅ {len(transaksi_data)} transaksi dan {len(detail_transaksi_data)} detail berhasil disimpan.")
+    batches = generate_transaction_batches(start_date, days, df_toko, df_karyawan, df_produk, df_member,
+                                           produk_weights, rng=np.random.default_rng(seed))
+
+    # Index sekunder di-drop selama load besar dan dibuat ulang sesudahnya.
+    transaksi_stats, detail_stats = [], []
+    with engine.begin() as conn:
+        partitioned = is_partitioned(conn)
+        if partitioned:
+            ensure_partitions(conn, start=start_date)
+        indexes = drop_secondary_indexes(conn, 'transaksi') + drop_secondary_indexes(conn, 'detail_transaksi')
+        for df_transaksi, df_detail in batches:
+            if partitioned:
+                df_detail = with_waktu_transaksi(df_detail, df_transaksi)
+            transaksi_stats.append(copy_dataframe(conn, 'transaksi', df_transaksi))
+            detail_stats.append(copy_dataframe(conn, 'detail_transaksi', df_detail))
+        create_indexes(conn, indexes)
+        sync_sequence(conn, 'transaksi')
+        sync_sequence(conn, 'detail_transaksi')
+    report(combine_stats('transaksi', transaksi_stats))
+    report(combine_stats('detail_transaksi', detail_stats))
+    print(f"✅ {sum(s.rows for s in transaksi_stats)} transaksi dan {sum(s.rows for s in detail_stats)} detail berhasil disimpan.")
+
+
+# --- GENERASI PARALEL PER SHARD ---
+# Rentang tanggal dibagi menjadi shard berukuran tetap. Seed setiap shard diturunkan dari
+# (seed, nomor shard) dan rentang transaksi.id serta detail_transaksi.id-nya ditentukan dari
+# hari pertamanya, sehingga hasilnya identik berapa pun jumlah worker yang dipakai.
+
+_worker_master = None
+
+
+def _init_worker(master):
+    global _worker_master
+    _worker_master = master
+    # Koneksi pool yang ikut tersalin saat fork tidak boleh dipakai bersama proses induk.
+    engine.dispose(close=False)
+
+
+def shard_first_id(day_offset, skala=1):
+    return day_offset * MAX_TRANSAKSI_PER_HARI * skala + 1
+
+
+def shard_first_detail_id(day_offset, skala=1):
+    # Setiap transaksi paling banyak punya BASKET_SIZES.max() item.
+    return day_offset * MAX_TRANSAKSI_PER_HARI * skala * int(BASKET_SIZES.max()) + 1
+
+
+def _generate_shard(task):
+    shard, start_date, day_offset, days, seed, skala, output_dir = task
+    df_toko, df_karyawan, df_produk, df_member, produk_weights = _worker_master
+    rng = np.random.default_rng(np.random.SeedSequence([seed, shard]))
+    batches = generate_transaction_batches(
+        pd.Timestamp(start_date) + pd.Timedelta(days=day_offset), days, df_toko, df_karyawan, df_produk,
+        df_member, produk_weights, rng=rng, first_id=shard_first_id(day_offset, skala),
+        first_detail_id=shard_first_detail_id(day_offset, skala), block_days=days, skala=skala)
+    df_transaksi, df_detail = next(batches)
+
+    if output_dir:
+        df_transaksi.to_csv(os.path.join(output_dir, f'transaksi_{shard:05d}.csv'), index=False)
+        df_detail.to_csv(os.path.join(output_dir, f'detail_transaksi_{shard:05d}.csv'), index=False)
+        return shard, len(df_transaksi), len(df_detail), []
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            df_detail = with_waktu_transaksi(df_detail, df_transaksi)
+        stats = [copy_dataframe(conn, 'transaksi', df_transaksi), copy_dataframe(conn, 'detail_transaksi', df_detail)]
+    return shard, len(df_transaksi), len(df_detail), stats
+
+
+def generate_transactions_sharded(days, master, seed, workers=None, shard_days=31, skala=1,
+                                  output_dir=None, end_date=None):
+    """Membuat transaksi `days` hari terakhir dengan pool proses, satu shard per `shard_days` hari.
+
+    Setiap shard ditulis sendiri oleh worker-nya: lewat COPY ke database, atau sebagai
+    file CSV per shard di `output_dir` (bisa dimuat nanti dengan `bulk_load.py`).
+    """
+    end_date = pd.Timestamp(end_date or datetime.now()).normalize()
+    start_date = end_date - pd.Timedelta(days=days)
+    tasks = [
+        (shard, start_date, day_offset, min(shard_days, days - day_offset), seed, skala, output_dir)
+        for shard, day_offset in enumerate(range(0, days, shard_days))
+    ]
+    print(f"Membuat data transaksi untuk {days} hari dalam {len(tasks)} shard (seed={seed})...")
+
+    indexes = []
+    if not output_dir:
+        # Index sekunder di-drop sekali oleh proses induk, lalu dibuat ulang setelah semua shard selesai.
+        with engine.begin() as conn:
+            if is_partitioned(conn):
+                ensure_partitions(conn, start=start_date, today=end_date.date())
+            indexes = drop_secondary_indexes(conn, 'transaksi') + drop_secondary_indexes(conn, 'detail_transaksi')
+
+    transaksi_rows = detail_rows = 0
+    transaksi_stats, detail_stats = [], []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(master,)) as pool:
+            for shard, n_transaksi, n_detail, stats in pool.map(_generate_shard, tasks):
+                transaksi_rows += n_transaksi
+                detail_rows += n_detail
+                if stats:
+                    transaksi_stats.append(stats[0])
+                    detail_stats.append(stats[1])
+                print(f"   shard {shard}: {n_transaksi:,} transaksi, {n_detail:,} detail")
+    finally:
+        # Tetap dijalankan jika ada shard yang gagal: index yang di-drop tidak boleh hilang,
+        # dan sequence harus melewati ID shard yang sudah ter-commit.
+        if not output_dir:
+            with engine.begin() as conn:
+                create_indexes(conn, indexes)
+                sync_sequence(conn, 'transaksi')
+                sync_sequence(conn, 'detail_transaksi')
+
+    if not output_dir:
+        report(combine_stats('transaksi', transaksi_stats))
+        report(combine_stats('detail_transaksi', detail_stats))
+    print(f"✅ {transaksi_rows} transaksi dan {detail_rows} detail berhasil dibuat.")
+
+
+def write_master_csv(output_dir, df_toko, df_karyawan, df_produk, df_member, df_stok):
+    for table, df in [('toko', df_toko), ('produk', df_produk), ('karyawan', df_karyawan),
+                      ('member', df_member), ('stok_gudang', df_stok)]:
+        df.to_csv(os.path.join(output_dir, f'{table}.csv'), index=False)
 
 
 if __name__ == "__main__":
-    clear_all_data()
-    df_toko, df_karyawan, df_produk, df_member, produk_weights = generate_master_data()
-    generate_stok(df_toko, df_produk)
-    generate_transactions(365, df_toko, df_karyawan, df_produk, df_member, produk_weights)
-    print("\n🎉 Proses pembuatan data dummy selesai!")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Membuat data dummy Customer Data Platform.")
+    parser.add_argument('--hari', type=int, default=365, help="Jumlah hari transaksi ke belakang")
+    parser.add_argument('--toko-per-kota', type=int, default=3)
+    parser.add_argument('--jumlah-member', type=int, default=200)
+    parser.add_argument('--jumlah-produk', type=int, default=200, help="Jumlah produk acak di luar daftar produk tetap")
+    parser.add_argument('--skala-transaksi', type=int, default=1, help="Pengali jumlah transaksi per hari")
+    parser.add_argument('--seed', type=int, default=None, help="Seed agar hasil dapat direproduksi")
+    parser.add_argument('--workers', type=int, default=None, help="Jumlah proses (default: jumlah CPU)")
+    parser.add_argument('--shard-hari', type=int, default=31, help="Jumlah hari per shard")
+    parser.add_argument('--tanggal-akhir', default=None, help="Tanggal akhir data (YYYY-MM-DD, default: hari ini)")
+    parser.add_argument('--output-dir', default=None,
+                        help="Tulis CSV per tabel/shard ke folder ini alih-alih ke database")
+    args = parser.parse_args()
+
+    # Tanpa --seed, seed acak tetap dicetak agar hasilnya bisa dibuat ulang.
+    seed = args.seed if args.seed is not None else int(np.random.SeedSequence().entropy % 2**32)
+    master_args = (args.toko_per_kota, args.jumlah_member, args.jumlah_produk, seed)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        master = build_master_data(*master_args)
+        write_master_csv(args.output_dir, *master[:4], build_stok(master[0], master[2]))
+    else:
+        clear_all_data()
+        master = generate_master_data(*master_args)
+        generate_stok(master[0], master[2])
+    generate_transactions_sharded(args.hari, master, seed, workers=args.workers, shard_days=args.shard_hari,
+                                  skala=args.skala_transaksi, output_dir=args.output_dir,
+                                  end_date=args.tanggal_akhir)
+    if not args.output_dir:
+        print(f"✅ {refresh_rollup()} baris rollup harian berhasil dibuat.")
+        # Stok awal adalah posisi saat ini, jadi penjualan dummy tidak dikurangkan lagi oleh ledger stok.
+        print(f"✅ Watermark ledger stok diset ke detail_transaksi.id {mark_baseline()}.")
+    print("\n🎉 Proses pembuatan data dummy selesai!")
@@ -0,0 +1,403 @@
+# fact_data.py
+"""Pemuatan tabel fakta penjualan (join transaksi, detail, produk, toko, karyawan, member).
+
+Mode `compact=True` menyimpan kolom teks yang berulang sebagai kolom kategorikal
+(dictionary-encoded: kode integer + kamus nilai) dan menyempitkan tipe numerik.
+Predikat dari pohon aturan dievaluasi pada kode tersebut oleh `predicate_eval.py`.
+
+Pemuatan dilakukan secara streaming: hasil query dibaca lewat server-side cursor
+per potongan (`chunk_rows` baris) dan langsung dikonversi ke array kolom akhir,
+sehingga hasil query tidak pernah di-buffer utuh di sisi klien. Batas memori
+(`max_bytes`) dan callback progres dapat diatur, mis. lewat environment variable
+`FACT_CHUNK_ROWS` dan `FACT_MEMORY_LIMIT_MB`.
+"""
+import os
+import sys
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sqlalchemy import text
+
+from database import engine
+from id_gaps import GapGuard
+from models import Transaksi
+
+FACT_SELECT = """
+    dt.id AS id_detail, t.id AS id_transaksi, t.waktu_transaksi, tk.nama_toko, tk.kota,
+    kr.nama_karyawan, kr.posisi AS posisi_karyawan, p.nama_produk,
+    p.kategori AS kategori_produk, p.harga_jual, dt.jumlah AS jumlah_item,
+    dt.harga_saat_transaksi, (dt.jumlah * dt.harga_saat_transaksi) AS total_harga_item,
+    m.nama_member, m.tanggal_bergabung AS tanggal_join_member"""
+
+FACT_FROM = """
+FROM transaksi t
+JOIN detail_transaksi dt ON t.id = dt.id_transaksi
+JOIN produk p ON dt.id_produk = p.id
+JOIN toko tk ON t.id_toko = tk.id
+JOIN karyawan kr ON t.id_karyawan = kr.id
+LEFT JOIN member m ON t.id_member = m.id
+"""
+
+
+def build_fact_query(extra_columns: tuple[str, ...] = (), where: str | None = None) -> str:
+    """Query fakta dengan kolom tambahan (ekspresi SQL beralias) dan kondisi WHERE opsional."""
+    columns = ''.join(f"\n    {column}," for column in extra_columns)
+    query = f"SELECT{columns}{FACT_SELECT}{FACT_FROM}"
+    return query + f"WHERE {where}\n" if where else query
+
+
+FACT_QUERY = build_fact_query()
+
+# Kolom teks yang nilainya berulang di setiap baris item.
+CATEGORICAL_COLUMNS = [
+    'nama_toko', 'kota', 'nama_karyawan', 'posisi_karyawan',
+    'nama_produk', 'kategori_produk', 'nama_member',
+]
+INTEGER_COLUMNS = ['id_detail', 'id_transaksi', 'jumlah_item']
+DECIMAL_COLUMNS = ['harga_jual', 'harga_saat_transaksi', 'total_harga_item']
+
+DEFAULT_CHUNK_ROWS = int(os.getenv('FACT_CHUNK_ROWS', '50000'))
+DEFAULT_MAX_BYTES = int(float(os.getenv('FACT_MEMORY_LIMIT_MB', '0')) * 1024 * 1024) or None
+
+# Callback progres: (baris yang sudah dimuat, estimasi total baris atau None).
+ProgressCallback = Callable[[int, int | None], None]
+
+
+class MemoryCeilingExceeded(MemoryError):
+    """Pemuatan frame fakta melebihi batas memori yang dikonfigurasi."""
+
+
+def prepare_fact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalisasi kolom waktu dan nama kolom hasil query fakta."""
+    df['waktu_transaksi'] = pd.to_datetime(df['waktu_transaksi']).dt.tz_localize(None)
+    df['tanggal_join_member'] = pd.to_datetime(df['tanggal_join_member']).dt.tz_localize(None)
+    df.columns = [c.replace(' ', '_') for c in df.columns]
+    return df
+
+
+def _narrow_float(series: pd.Series) -> pd.Series:
+    """Konversi NUMERIC (Decimal) ke float32 jika tidak ada presisi yang hilang, selain itu float64."""
+    values = pd.to_numeric(series, errors='coerce').astype('float64')
+    narrow = values.astype('float32')
+    if np.array_equal(narrow.to_numpy(dtype='float64'), values.to_numpy(), equal_nan=True):
+        return narrow
+    return values
+
+
+def compact_fact_frame(df: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Mengubah frame fakta ke representasi ringkas.
+
+    Mengembalikan (frame ringkas, laporan) dengan laporan berisi byte sebelum/sesudah
+    dan byte yang dihemat untuk setiap kolom.
+    """
+    before = df.memory_usage(deep=True, index=False)
+    compact = df.copy()
+    for col in CATEGORICAL_COLUMNS:
+        if col in compact:
+            compact[col] = compact[col].astype('category')
+    for col in INTEGER_COLUMNS:
+        if col in compact and compact[col].notna().all():
+            compact[col] = pd.to_numeric(compact[col], downcast='integer')
+    for col in DECIMAL_COLUMNS:
+        if col in compact:
+            compact[col] = _narrow_float(compact[col])
+    after = compact.memory_usage(deep=True, index=False)
+
+    report = pd.DataFrame({
+        'dtype_awal': df.dtypes.astype(str),
+        'dtype_ringkas': compact.dtypes.astype(str),
+        'byte_awal': before,
+        'byte_ringkas': after,
+    })
+    report['byte_dihemat'] = report['byte_awal'] - report['byte_ringkas']
+    return compact, report
+
+
+def _object_bytes(column: pd.Series) -> int:
+    """Byte kolom kategorikal jika disimpan sebagai object, dihitung dari kode tanpa membangun ulang string."""
+    codes = column.cat.codes.to_numpy()
+    sizes = np.array([sys.getsizeof(value) for value in column.cat.categories], dtype=np.int64)
+    counts = np.bincount(codes[codes >= 0], minlength=len(sizes))
+    # Nilai kosong pada kolom object berupa NaN (float).
+    return int(8 * len(codes) + counts @ sizes + (codes < 0).sum() * sys.getsizeof(np.nan))
+
+
+def compact_memory_report(df: pd.DataFrame) -> pd.DataFrame:
+    """Laporan penghematan memori frame ringkas, tanpa menyalin frame ke bentuk tidak ringkas."""
+    after = df.memory_usage(deep=True, index=False)
+    before, dtypes = {}, {}
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            dtypes[col], before[col] = 'object', _object_bytes(df[col])
+        elif col in INTEGER_COLUMNS + DECIMAL_COLUMNS and df[col].dtype.kind in 'iuf':
+            dtypes[col] = 'int64' if col in INTEGER_COLUMNS else 'float64'
+            before[col] = 8 * len(df)
+        else:
+            dtypes[col], before[col] = str(df[col].dtype), after[col]
+    report = pd.DataFrame({
+        'dtype_awal': pd.Series(dtypes),
+        'dtype_ringkas': df.dtypes.astype(str),
+        'byte_awal': pd.Series(before),
+        'byte_ringkas': after,
+    })
+    report['byte_dihemat'] = report['byte_awal'] - report['byte_ringkas']
+    return report
+
+
+# --- PEMUATAN STREAMING ---
+
+class _ColumnBuilder:
+    """Mengumpulkan satu kolom dari potongan-potongan hasil query.
+
+    Kolom kategorikal di-encode bertahap: kamus nilai global diperluas per potongan
+    dan hanya kode integer yang disimpan, jadi string berulang tidak pernah ditampung.
+    Pada mode ringkas, kolom integer dan desimal langsung dibangun dengan tipe akhir
+    yang disempitkan, jadi frame tidak perlu disalin lagi setelah dimuat.
+    """
+
+    def __init__(self, name: str, categorical: bool, narrow: bool = False):
+        self.name = name
+        self.categorical = categorical
+        self.narrow = narrow
+        self.parts = []
+        self.categories = pd.Index([], dtype=object)
+        self.nbytes = 0
+
+    def add(self, series: pd.Series):
+        if self.categorical:
+            values = series.to_numpy(dtype=object)
+            present = pd.notna(values)
+            distinct = pd.Index(pd.unique(values[present]), dtype=object)
+            unseen = distinct[self.categories.get_indexer(distinct) == -1]
+            if len(unseen):
+                self.categories = self.categories.append(unseen)
+            codes = np.full(len(values), -1, dtype=np.int32)
+            codes[present] = self.categories.get_indexer(values[present])
+            part = codes
+        else:
+            part = series.to_numpy()
+        self.parts.append(part)
+        self.nbytes += part.nbytes
+
+    def _narrow_dtype(self):
+        """Tipe akhir yang sama dengan `compact_fact_frame`, ditentukan dari semua potongan."""
+        kinds = {part.dtype.kind for part in self.parts}
+        if kinds <= {'i', 'u'} and self.name in INTEGER_COLUMNS:
+            low = min(int(part.min()) for part in self.parts if len(part))
+            high = max(int(part.max()) for part in self.parts if len(part))
+            for dtype in (np.int8, np.int16, np.int32, np.int64):
+                if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                    return dtype
+        if kinds <= {'f'} and self.name in DECIMAL_COLUMNS:
+            exact = all(np.array_equal(part.astype(np.float32).astype(np.float64), part, equal_nan=True)
+                        for part in self.parts)
+            return np.float32 if exact else np.float64
+        return None
+
+    def build(self) -> pd.Series:
+        if self.categorical:
+            codes = np.concatenate(self.parts) if self.parts else np.empty(0, dtype=np.int32)
+            return pd.Series(pd.Categorical.from_codes(codes, categories=self.categories),
+                             name=self.name)
+        dtype = self._narrow_dtype() if self.narrow and self.parts else None
+        if dtype is None:
+            return pd.Series(np.concatenate(self.parts) if self.parts else [], name=self.name)
+        # Diisi per potongan ke array bertipe akhir; potongan dilepas segera setelah disalin.
+        values = np.empty(sum(len(part) for part in self.parts), dtype=dtype)
+        offset = 0
+        while self.parts:
+            part = self.parts.pop(0)
+            values[offset:offset + len(part)] = part
+            offset += len(part)
+        return pd.Series(values, name=self.name)
+
+
+def _estimate_rows(connection) -> int | None:
+    """Estimasi jumlah baris fakta dari statistik planner (`pg_class.reltuples`), tanpa count(*).
+
+    Pada skema berpartisi, estimasi dijumlahkan dari semua partisi daun.
+    """
+    estimate = connection.execute(text(
+        "SELECT sum(greatest(c.reltuples, 0))::bigint FROM pg_partition_tree('detail_transaksi') pt "
+        "JOIN pg_class c ON c.oid = pt.relid WHERE pt.isleaf"
+    )).scalar()
+    return int(estimate) if estimate and estimate > 0 else None
+
+
+def stream_fact_frame(connection, query: str = FACT_QUERY, params: dict | None = None, compact: bool = False,
+                      chunk_rows: int = DEFAULT_CHUNK_ROWS, max_bytes: int | None = DEFAULT_MAX_BYTES,
+                      progress: ProgressCallback | None = None, estimated_rows: int | None = None) -> pd.DataFrame:
+    """Memuat hasil query fakta per potongan lewat server-side cursor.
+
+    Setiap potongan langsung dinormalisasi dan ditambahkan ke kolom akhir. Jika
+    total byte kolom melebihi `max_bytes`, `MemoryCeilingExceeded` dilempar sebelum
+    potongan berikutnya dibaca.
+    """
+    result = connection.execution_options(stream_results=True, max_row_buffer=chunk_rows).execute(
+        text(query), params or {})
+    columns = list(result.keys())
+    # Pada mode non-ringkas, kolom teks tetap dibangun bertahap lalu dikembalikan sebagai object.
+    builders = [_ColumnBuilder(col, col in CATEGORICAL_COLUMNS, narrow=compact) for col in columns]
+    loaded = 0
+    if progress:
+        progress(0, estimated_rows)
+    for rows in result.partitions(chunk_rows):
+        chunk = prepare_fact_frame(pd.DataFrame.from_records(rows, columns=columns))
+        for builder in builders:
+            if builder.name in DECIMAL_COLUMNS:
+                builder.add(pd.to_numeric(chunk[builder.name], errors='coerce').astype('float64'))
+            else:
+                builder.add(chunk[builder.name])
+        loaded += len(chunk)
+        used = sum(builder.nbytes for builder in builders)
+        if max_bytes is not None and used > max_bytes:
+            result.close()
+            raise MemoryCeilingExceeded(
+                f"Pemuatan data fakta dihentikan: {used:,} byte setelah {loaded:,} baris melebihi batas {max_bytes:,} byte.")
+        if progress:
+            progress(loaded, estimated_rows)
+
+    df = pd.DataFrame({builder.name: builder.build() for builder in builders}, copy=False)
+    if not compact:
+        for col in CATEGORICAL_COLUMNS:
+            if col in df:
+                df[col] = df[col].astype(object)
+    return df
+
+
+def load_fact_frame(compact: bool = False, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                    max_bytes: int | None = DEFAULT_MAX_BYTES, progress: ProgressCallback | None = None) -> pd.DataFrame:
+    """Memuat tabel fakta dari database secara streaming.
+
+    Jika `compact=True`, frame dikembalikan dalam bentuk ringkas dan laporan
+    penghematan memori per kolom disimpan di `df.attrs['laporan_memori']`.
+    """
+    with engine.connect() as connection:
+        df = stream_fact_frame(connection, compact=compact, chunk_rows=chunk_rows, max_bytes=max_bytes,
+                               progress=progress, estimated_rows=_estimate_rows(connection))
+    if compact:
+        df.attrs['laporan_memori'] = compact_memory_report(df)
+    return df
+
+
+def append_fact_frames(base: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Menggabungkan frame fakta tanpa kehilangan encoding kategorikal.
+
+    `pd.concat` pada kategori yang berbeda akan jatuh ke dtype object, jadi kamus
+    kategori digabung terlebih dahulu dengan `union_categoricals`.
+    """
+    if new.empty:
+        return base
+    if base is None or base.empty:
+        return new.reset_index(drop=True)
+    combined = pd.concat([base, new], ignore_index=True)
+    for col in base.columns:
+        if isinstance(base[col].dtype, pd.CategoricalDtype) and isinstance(new[col].dtype, pd.CategoricalDtype):
+            combined[col] = union_categoricals([base[col], new[col]], ignore_order=True)
+    return combined
+
+
+class FactCache:
+    """Cache frame fakta yang diperbarui secara inkremental berdasarkan watermark `transaksi.id`.
+
+    Tabel `transaksi` diasumsikan append-only: refresh hanya mengambil transaksi dengan
+    id di atas watermark, dan watermark berhenti sebelum celah id yang mungkin masih
+    berupa insert yang belum di-commit (`id_gaps.py`). DELETE/UPDATE dideteksi dari penghitung `n_tup_del` dan
+    `n_tup_upd` di `pg_stat_user_tables` (termasuk partisi), bukan `count(*)` atas
+    seluruh riwayat; jika penghitung berubah, cache dimuat ulang penuh. Partisi yang
+    dilepas atau di-drop (`partition_maintenance.py`) tidak menaikkan `n_tup_del`, jadi
+    jumlah partisi dan `min(transaksi.id)` juga dibandingkan. Penghitung
+    statistik diperbarui tertunda, jadi perubahan bisa baru terdeteksi pada refresh
+    berikutnya; `refresh(full=True)` memaksa pemuatan ulang penuh.
+    """
+
+    STATE_QUERY = text("""
+        SELECT
+            (SELECT coalesce(sum(n_tup_upd + n_tup_del), 0) FROM pg_stat_user_tables
+             WHERE relid IN (SELECT relid FROM pg_partition_tree('transaksi')
+                             UNION ALL SELECT relid FROM pg_partition_tree('detail_transaksi'))) AS jumlah_perubahan,
+            (SELECT count(*) FROM pg_partition_tree('transaksi') WHERE isleaf) AS jumlah_partisi,
+            (SELECT coalesce(min(id), 0) FROM transaksi) AS min_id,
+            (SELECT coalesce(max(id), 0) FROM transaksi) AS max_id,
+            (SELECT max(waktu_transaksi) FROM transaksi) AS max_waktu
+    """)
+
+    def __init__(self, compact: bool = True, chunk_rows: int = DEFAULT_CHUNK_ROWS,
+                 max_bytes: int | None = DEFAULT_MAX_BYTES):
+        self.compact = compact
+        self.chunk_rows = chunk_rows
+        self.max_bytes = max_bytes
+        self.df = None
+        self.watermark_id = 0
+        self.watermark_waktu = None
+        self.jumlah_perubahan = None
+        self.partisi = None
+        self.loaded_at = None
+        self._gaps = GapGuard(Transaksi.id)
+        self._lock = threading.Lock()
+
+    def _read_state(self, connection):
+        return connection.execute(self.STATE_QUERY).mappings().one()
+
+    def _fetch(self, connection, after_id: int | None, upto_id: int, expected_rows: int | None,
+               progress: ProgressCallback | None) -> pd.DataFrame:
+        where = "t.id <= :upto"
+        params = {'upto': upto_id}
+        max_bytes = self.max_bytes
+        if after_id is not None:
+            where += " AND t.id > :after"
+            params['after'] = after_id
+            if max_bytes is not None and self.df is not None:
+                # Batas berlaku untuk seluruh cache, jadi sisa kuota dikurangi frame yang sudah ada.
+                max_bytes -= int(self.df.memory_usage(index=False).sum())
+        return stream_fact_frame(connection, build_fact_query(where=where), params, compact=self.compact, chunk_rows=self.chunk_rows,
+                                 max_bytes=max_bytes, progress=progress, estimated_rows=expected_rows)
+
+    def refresh(self, progress: ProgressCallback | None = None, full: bool = False) -> str:
+        """Menyegarkan cache; mengembalikan 'full', 'incremental' atau 'unchanged'.
+
+        Jika pemuatan melebihi `max_bytes`, `MemoryCeilingExceeded` dilempar dan frame
+        lama tetap dipakai.
+        """
+        with self._lock:
+            # REPEATABLE READ agar watermark dan baris yang diambil berasal dari snapshot yang sama.
+            with engine.connect().execution_options(isolation_level='REPEATABLE READ') as connection:
+                with connection.begin():
+                    state = self._read_state(connection)
+                    changed = (
+                        state['jumlah_perubahan'] != self.jumlah_perubahan
+                        or (state['jumlah_partisi'], state['min_id']) != self.partisi
+                        or state['max_id'] < self.watermark_id
+                    )
+                    reload = self.df is None or full or changed
+                    upto = self._gaps.safe_upto(connection, 0 if reload else self.watermark_id, state['max_id'])
+                    if reload:
+                        df = self._fetch(connection, None, upto, _estimate_rows(connection), progress)
+                        mode = 'full'
+                    elif upto > self.watermark_id:
+                        new_rows = self._fetch(connection, self.watermark_id, upto, None, progress)
+                        df = append_fact_frames(self.df, new_rows)
+                        mode = 'incremental'
+                    else:
+                        df, mode = self.df, 'unchanged'
+
+            self.df = df
+            self.watermark_id = upto
+            self.watermark_waktu = state['max_waktu']
+            self.jumlah_perubahan = state['jumlah_perubahan']
+            self.partisi = (state['jumlah_partisi'], state['min_id'])
+            self.loaded_at = time.monotonic()
+            return mode
+
+    def is_stale(self, ttl_seconds: float) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at >= ttl_seconds
+
+    def refresh_if_stale(self, ttl_seconds: float, progress: ProgressCallback | None = None) -> pd.DataFrame:
+        """Menyegarkan cache jika umurnya melebihi `ttl_seconds`, lalu mengembalikan frame."""
+        if self.is_stale(ttl_seconds):
+            self.refresh(progress)
+        return self.df
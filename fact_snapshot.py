@@ -0,0 +1,161 @@
+# fact_snapshot.py
+"""Snapshot tabel fakta penjualan dalam file Arrow IPC yang dibaca lewat memory map.
+
+Satu proses (cron/CLI) mempublikasikan snapshot:
+
+    python fact_snapshot.py publish --keep 3
+
+Setiap snapshot ditulis ke file berversi (`fakta_<watermark>_<waktu>.arrow`) lewat file
+sementara + `os.replace`, lalu penunjuk `CURRENT` diganti secara atomik. Worker
+Streamlit membuka file aktif dengan `pa.memory_map`, sehingga kolom numerik dibaca
+tanpa salinan dan halaman file dibagi bersama oleh semua proses lewat page cache OS.
+Kolom kategorikal disimpan sebagai dictionary array Arrow dan kembali menjadi
+kategori pandas saat dibaca.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+
+from fact_data import FactCache
+
+SNAPSHOT_DIR = os.getenv('FACT_SNAPSHOT_DIR', 'snapshots')
+CURRENT_FILE = 'CURRENT'
+_PREFIX = 'fakta_'
+_SUFFIX = '.arrow'
+
+
+def _write_atomic(path: str, write):
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_snapshot(df: pd.DataFrame, watermark_id: int, directory: str = SNAPSHOT_DIR) -> str:
+    """Menulis frame fakta sebagai snapshot baru dan menjadikannya snapshot aktif; mengembalikan nama file."""
+    os.makedirs(directory, exist_ok=True)
+    name = f"{_PREFIX}{watermark_id:012d}_{time.time_ns()}{_SUFFIX}"
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = {'watermark_id': watermark_id, 'jumlah_baris': len(df), 'dibuat_pada': time.time()}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'snapshot': json.dumps(metadata).encode()})
+
+    def write_table(path):
+        # Tanpa kompresi: buffer di file harus bisa dipakai langsung dari memory map.
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    def write_pointer(path):
+        with open(path, 'w') as f:
+            json.dump({'file': name, **metadata}, f)
+
+    _write_atomic(os.path.join(directory, name), write_table)
+    _write_atomic(os.path.join(directory, CURRENT_FILE), write_pointer)
+    return name
+
+
+def publish_snapshot(directory: str = SNAPSHOT_DIR, keep: int = 3) -> str:
+    """Memuat frame fakta dari database (mode ringkas) lalu mempublikasikannya sebagai snapshot."""
+    cache = FactCache(compact=True)
+    cache.refresh()
+    name = write_snapshot(cache.df, cache.watermark_id, directory)
+    prune_snapshots(directory, keep)
+    return name
+
+
+def read_pointer(directory: str = SNAPSHOT_DIR) -> dict | None:
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def prune_snapshots(directory: str = SNAPSHOT_DIR, keep: int = 3) -> list[str]:
+    """Menghapus snapshot lama, menyisakan `keep` terbaru dan snapshot aktif.
+
+    Worker yang masih memetakan file yang dihapus tetap aman: di Linux isi file tetap
+    ada sampai memory map terakhir ditutup.
+    """
+    pointer = read_pointer(directory) or {}
+    names = sorted(n for n in os.listdir(directory) if n.startswith(_PREFIX) and n.endswith(_SUFFIX))
+    removed = [n for n in names[:-keep] if n != pointer.get('file')] if keep > 0 else []
+    for name in removed:
+        os.remove(os.path.join(directory, name))
+    return removed
+
+
+def open_snapshot(path: str) -> tuple[pd.DataFrame, dict]:
+    """Membuka satu file snapshot lewat memory map; mengembalikan (frame, metadata)."""
+    source = pa.memory_map(path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    metadata = json.loads(table.schema.metadata[b'snapshot'])
+    return table.to_pandas(split_blocks=True), metadata
+
+
+class SnapshotReader:
+    """Sumber frame fakta dari snapshot aktif, dengan antarmuka yang sama seperti `FactCache`.
+
+    Setiap pemanggilan hanya memeriksa `CURRENT`; frame baru dibuka saat snapshot
+    yang dipublikasikan berganti. Frame lama tetap valid bagi pemanggil yang masih memegangnya.
+    """
+
+    def __init__(self, directory: str = SNAPSHOT_DIR):
+        self.directory = directory
+        self.df = None
+        self.file = None
+        self.watermark_id = 0
+        self.loaded_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available(directory: str = SNAPSHOT_DIR) -> bool:
+        return read_pointer(directory) is not None
+
+    def is_stale(self, ttl_seconds: float = 0) -> bool:
+        pointer = read_pointer(self.directory)
+        return pointer is not None and pointer['file'] != self.file
+
+    def refresh(self, progress=None) -> str:
+        """Beralih ke snapshot aktif; mengembalikan 'swapped' atau 'unchanged'."""
+        with self._lock:
+            pointer = read_pointer(self.directory)
+            if pointer is None:
+                raise FileNotFoundError(f"Belum ada snapshot di '{self.directory}'. Jalankan `python fact_snapshot.py publish`.")
+            if pointer['file'] == self.file:
+                return 'unchanged'
+            df, metadata = open_snapshot(os.path.join(self.directory, pointer['file']))
+            self.df = df
+            self.file = pointer['file']
+            self.watermark_id = metadata['watermark_id']
+            self.loaded_at = time.monotonic()
+            if progress:
+                progress(len(df), len(df))
+            return 'swapped'
+
+    def refresh_if_stale(self, ttl_seconds: float = 0, progress=None) -> pd.DataFrame:
+        if self.df is None or self.is_stale(ttl_seconds):
+            self.refresh(progress)
+        return self.df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mengelola snapshot Arrow tabel fakta penjualan.")
+    parser.add_argument('command', choices=['publish', 'prune', 'status'])
+    parser.add_argument('--dir', default=SNAPSHOT_DIR, help="Folder snapshot (default: $FACT_SNAPSHOT_DIR atau ./snapshots)")
+    parser.add_argument('--keep', type=int, default=3, help="Jumlah snapshot terbaru yang disimpan")
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        print(f"✅ Snapshot {publish_snapshot(args.dir, args.keep)} dipublikasikan.")
+    elif args.command == 'prune':
+        print(f"✅ {len(prune_snapshots(args.dir, args.keep))} snapshot lama dihapus.")
+    else:
+        print(json.dumps(read_pointer(args.dir), indent=2))
@@ -0,0 +1,87 @@
+# filter_repository.py
+"""Akses data segmen tersimpan (`filter_tersimpan`).
+
+Semua fungsi memakai `session_scope()` dari `database.py`, jadi koneksi diambil dari
+pool bersama dan setiap operasi (termasuk operasi banyak baris) berjalan dalam satu
+transaksi. Fungsi di sini tidak bergantung pada Streamlit; pesan ke pengguna diatur
+oleh pemanggil.
+"""
+from datetime import datetime
+
+from sqlalchemy import delete, func, select, tuple_
+
+from database import session_scope
+from models import FilterTersimpan
+
+
+def _search_filter(query, search_term: str):
+    if search_term:
+        # ILIKE case-insensitive; karakter wildcard dari input di-escape. Didukung index trigram.
+        escaped = search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        query = query.where(FilterTersimpan.nama_filter.ilike(f"%{escaped}%", escape='\\'))
+    return query
+
+
+def save_or_update_filter(name: str, tree_dict: dict, old_name: str | None = None, dibuat_oleh: str = "user_dashboard"):
+    """Menyimpan segmen baru atau memperbarui segmen yang ada; `old_name` dipakai saat segmen diganti nama."""
+    with session_scope() as session:
+        if old_name and old_name != name:
+            session.execute(delete(FilterTersimpan).where(FilterTersimpan.nama_filter == old_name))
+        existing = session.execute(select(FilterTersimpan).where(FilterTersimpan.nama_filter == name)).scalar()
+        if existing:
+            existing.konfigurasi_json = tree_dict
+            existing.dibuat_pada = datetime.now()
+        else:
+            session.add(FilterTersimpan(nama_filter=name, konfigurasi_json=tree_dict, dibuat_oleh=dibuat_oleh))
+
+
+def count_filters(search_term: str = "") -> int:
+    """Jumlah segmen yang cocok dengan pencarian, tanpa memuat barisnya."""
+    with session_scope() as session:
+        return session.execute(_search_filter(select(func.count(FilterTersimpan.id)), search_term)).scalar()
+
+
+def load_filter_page(search_term: str = "", after: tuple | None = None, limit: int = 10) -> list:
+    """Satu halaman segmen (terbaru dahulu) dengan paginasi keyset pada (dibuat_pada, id).
+
+    Hanya kolom yang ditampilkan yang diambil; `konfigurasi_json` tidak ikut dimuat.
+    `after` adalah kunci (dibuat_pada, id) baris terakhir halaman sebelumnya.
+    """
+    query = _search_filter(select(FilterTersimpan.id, FilterTersimpan.nama_filter, FilterTersimpan.dibuat_pada),
+                           search_term)
+    if after is not None:
+        query = query.where(tuple_(FilterTersimpan.dibuat_pada, FilterTersimpan.id) < after)
+    query = query.order_by(FilterTersimpan.dibuat_pada.desc(), FilterTersimpan.id.desc()).limit(limit)
+    with session_scope() as session:
+        return session.execute(query).all()
+
+
+def load_segment_options(exclude_name: str | None = None) -> list[tuple[int, str]]:
+    """Daftar (id, nama) segmen tersimpan yang bisa direferensikan sebagai rule."""
+    query = select(FilterTersimpan.id, FilterTersimpan.nama_filter)
+    if exclude_name:
+        query = query.where(FilterTersimpan.nama_filter != exclude_name)
+    with session_scope() as session:
+        return [tuple(row) for row in session.execute(query.order_by(FilterTersimpan.nama_filter)).all()]
+
+
+def get_filter_config_by_name(name: str) -> dict | None:
+    with session_scope() as session:
+        return session.execute(
+            select(FilterTersimpan.konfigurasi_json).where(FilterTersimpan.nama_filter == name)
+        ).scalar()
+
+
+def get_filter_config_by_id(segment_id: int) -> dict | None:
+    with session_scope() as session:
+        return session.execute(
+            select(FilterTersimpan.konfigurasi_json).where(FilterTersimpan.id == segment_id)
+        ).scalar()
+
+
+def delete_filters_by_name(names: list[str]) -> int:
+    """Menghapus beberapa segmen sekaligus dengan satu `DELETE ... WHERE nama_filter IN (...)`; mengembalikan jumlah baris terhapus."""
+    if not names:
+        return 0
+    with session_scope() as session:
+        return session.execute(delete(FilterTersimpan).where(FilterTersimpan.nama_filter.in_(list(names)))).rowcount
@@ -0,0 +1,67 @@
+# id_gaps.py
+"""Batas aman watermark id untuk pembaca inkremental tabel append-only.
+
+Id SERIAL diambil dari sequence saat INSERT, bukan saat commit: baris dengan id yang
+lebih besar bisa sudah terlihat sementara id yang lebih kecil masih berada di
+transaksi yang belum di-commit (COPY paralel `data_generator.py`, atau lebih dari satu
+penulis). Pembaca yang memajukan watermark melewati celah seperti itu tidak akan
+pernah membaca baris tersebut.
+
+`GapGuard.safe_upto()` memotong batas baca tepat sebelum celah id pertama yang mungkin
+masih berjalan. Celah dianggap permanen (transaksi yang di-rollback, cache sequence)
+jika snapshot pembaca tidak mencatat transaksi lain yang sedang berjalan, jika celah
+sudah terlihat lebih lama dari `ID_GAP_SECONDS` detik oleh proses ini, atau jika
+letaknya lebih dari `ID_GAP_SCAN` id di bawah batas (penulis yang masih berjalan
+selalu memegang id dekat puncak).
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import func, select, text
+
+GAP_SECONDS = float(os.getenv('ID_GAP_SECONDS', '30'))
+SCAN_IDS = int(os.getenv('ID_GAP_SCAN', '100000'))
+
+
+def gap_starts(connection, column, after: int, upto: int) -> list[int]:
+    """Id pertama dari setiap celah di rentang `column` (after, upto]."""
+    ids = select(
+        column,
+        func.coalesce(func.lag(column).over(order_by=column), after).label('prev'),
+    ).where(column > after, column <= upto).subquery()
+    return connection.execute(
+        select(ids.c.prev + 1).where(ids.c[column.name] > ids.c.prev + 1).order_by(ids.c.prev)
+    ).scalars().all()
+
+
+def has_concurrent_writers(connection) -> bool:
+    """True jika snapshot koneksi ini mencatat transaksi lain yang belum selesai."""
+    return connection.execute(
+        text("SELECT EXISTS (SELECT FROM pg_snapshot_xip(pg_current_snapshot()))")
+    ).scalar()
+
+
+class GapGuard:
+    """Melacak celah id satu kolom (mis. `Transaksi.id`) yang sedang ditunggu oleh satu pembaca."""
+
+    def __init__(self, column, wait_seconds: float = GAP_SECONDS, scan_ids: int | None = SCAN_IDS):
+        self.column = column
+        self.wait_seconds = wait_seconds
+        self.scan_ids = scan_ids
+        self._seen = {}  # awal celah -> waktu pertama kali terlihat (time.monotonic())
+        self._lock = threading.Lock()
+
+    def safe_upto(self, connection, after: int, upto: int) -> int:
+        """Batas atas (≤ `upto`) yang aman dipakai sebagai watermark baru di atas `after`."""
+        if upto <= after or not has_concurrent_writers(connection):
+            return upto
+        low = after if self.scan_ids is None else max(after, upto - self.scan_ids)
+        now = time.monotonic()
+        with self._lock:
+            for filled in [gap for gap in self._seen if gap <= after]:
+                del self._seen[filled]
+            for gap in gap_starts(connection, self.column, low, upto):
+                if now - self._seen.setdefault(gap, now) < self.wait_seconds:
+                    return gap - 1
+        return upto
@@ -0,0 +1,492 @@
+# index_advisor.py
+"""Rekomendasi index berdasarkan rule yang benar-benar dipakai di segmen tersimpan.
+
+Semua pohon aturan di `filter_tersimpan` ditelusuri untuk menghitung pemakaian
+(field, operator) dan pasangan field yang muncul bersama dalam satu lingkup AND.
+Dari situ dibentuk kandidat index pada tabel fisik:
+
+- index satu kolom untuk field yang difilter (B-tree untuk kesamaan/rentang, GIN
+  trigram untuk `like`/`starts_with`/`ends_with`);
+- index komposit untuk pasangan field di tabel yang sama (kolom kesamaan di depan,
+  kolom rentang di belakang), dan `<tabel fakta>(<fk dimensi>, waktu_transaksi)` untuk
+  filter dimensi (mis. `toko.kota`) yang dipakai bersama rentang waktu;
+- index parsial `<tabel>(kolom) WHERE kolom_lain = <nilai>` untuk nilai konstan yang
+  dipakai berulang di banyak segmen bersama filter kolom lain di tabel yang sama.
+
+Hanya kandidat yang dipakai minimal `MIN_SEGMEN` segmen dan belum tercakup index
+yang ada yang dinilai. Penilaian memakai biaya `EXPLAIN` query estimasi setiap segmen
+yang terdampak; jika ekstensi `hypopg` terpasang, biaya sesudahnya dihitung dengan
+index hipotetis dan kandidat yang tidak menurunkan biaya dibuang. Tanpa `hypopg`,
+kandidat diurutkan menurut jumlah segmen pemakai dan biaya sebelumnya.
+
+`apply_recommendations()` membuat index dengan `CREATE INDEX CONCURRENTLY` (pada tabel
+berpartisi: per partisi, lalu di-ATTACH ke index induk) dan mengukur latensi query setiap
+segmen terdampak sebelum dan sesudahnya.
+
+Jalankan `python index_advisor.py` (tambahkan `--buat` untuk membuat index).
+"""
+import argparse
+import hashlib
+import re
+import statistics
+import time
+from collections import Counter, defaultdict, namedtuple
+from itertools import combinations
+
+from sqlalchemy import Column, column, exc, inspect, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import visitors
+
+from database import engine
+from models import FilterTersimpan
+from segment_membership import SEGMENT_FIELD, inline_segments
+from segment_query import FACT_COLUMNS, build_sales_estimate_query
+from segment_rules import children_of, group_parts, is_group, iter_rules, rule_parts
+
+MIN_SEGMEN = 2
+
+EQUALITY_OPERATORS = {'equal', 'select_equals', 'select_any_in', 'multiselect_equals', 'multiselect_contains',
+                      'is_null'}
+RANGE_OPERATORS = {'less', 'less_or_equal', 'greater', 'greater_or_equal', 'between'}
+TEXT_OPERATORS = {'like', 'starts_with', 'ends_with'}
+# Tabel dimensi -> (tabel fakta, kolom foreign key) untuk index komposit dengan waktu transaksi.
+FACT_FOREIGN_KEYS = {
+    'toko': ('transaksi', 'id_toko'),
+    'karyawan': ('transaksi', 'id_karyawan'),
+    'member': ('transaksi', 'id_member'),
+    'fitur_member': ('transaksi', 'id_member'),
+    'produk': ('detail_transaksi', 'id_produk'),
+}
+TIME_COLUMN = 'waktu_transaksi'
+# Cast yang ditambahkan `pg_get_expr` pada predikat index, mis. `::text` atau `::character varying`.
+_CAST = re.compile(r"::(?:character varying|double precision|timestamp with(?:out)? time zone|\w+)(?:\[\])?")
+
+SavedSegment = namedtuple('SavedSegment', ['id', 'nama', 'tree'])
+# `where` adalah predikat SQL index parsial (atau None); `fields` adalah field segmen yang melatarinya.
+IndexCandidate = namedtuple('IndexCandidate', ['table', 'columns', 'using', 'where', 'segments', 'fields'])
+_Filter = namedtuple('_Filter', ['field', 'table', 'column', 'kind', 'operator', 'values'])
+
+
+def load_saved_segments() -> list[SavedSegment]:
+    with engine.connect() as connection:
+        rows = connection.execute(
+            select(FilterTersimpan.id, FilterTersimpan.nama_filter, FilterTersimpan.konfigurasi_json)
+        ).all()
+    return [SavedSegment(*row) for row in rows]
+
+
+def physical_column(field: str) -> tuple[str, str] | None:
+    """(tabel, kolom) untuk field yang dipetakan langsung ke kolom; None untuk ekspresi turunan."""
+    entry = FACT_COLUMNS.get(field)
+    if entry is None:
+        return None
+    expression = getattr(entry[1], 'expression', entry[1])
+    if not isinstance(expression, Column) or expression.table is None:
+        return None
+    return expression.table.name, expression.name
+
+
+def operator_kind(operator: str) -> str | None:
+    if operator in EQUALITY_OPERATORS:
+        return 'eq'
+    if operator in RANGE_OPERATORS:
+        return 'range'
+    if operator in TEXT_OPERATORS:
+        return 'text'
+    # Operator negatif (not_equal, not_between, not_like, ...) tidak bisa memakai index.
+    return None
+
+
+def and_scopes(tree: dict | None, inherited: tuple = ()):
+    """Menghasilkan kumpulan rule yang di-AND-kan bersama.
+
+    Rule langsung di group AND digabung dengan lingkup AND induknya; setiap rule di group
+    OR menjadi alternatif tersendiri. Isi group NOT tidak ikut karena tidak bisa memakai index.
+    """
+    if not tree or not is_group(tree):
+        return
+    conjunction, negate = group_parts(tree)
+    if negate:
+        return
+    direct = [parts for child in children_of(tree)
+              if not is_group(child) and (parts := rule_parts(child)) and parts[0] != SEGMENT_FIELD]
+    if conjunction == 'AND':
+        scope = inherited + tuple(direct)
+        if scope:
+            yield scope
+    else:
+        scope = inherited
+        for rule in direct:
+            yield inherited + (rule,)
+    for child in children_of(tree):
+        if is_group(child):
+            yield from and_scopes(child, scope)
+
+
+def rule_usage(segments: list[SavedSegment]) -> Counter:
+    """Jumlah segmen yang memakai setiap (field, operator)."""
+    usage = Counter()
+    for segment in segments:
+        usage.update({(field, operator) for field, operator, _ in iter_rules(segment.tree) if field != SEGMENT_FIELD})
+    return usage
+
+
+def cooccurrence(segments: list[SavedSegment]) -> Counter:
+    """Jumlah segmen yang memakai setiap pasangan field dalam satu lingkup AND."""
+    pairs = Counter()
+    for segment in segments:
+        seen = set()
+        for scope in and_scopes(segment.tree):
+            seen.update(combinations(sorted({field for field, _, _ in scope}), 2))
+        pairs.update(seen)
+    return pairs
+
+
+def _filters(scope) -> list[_Filter]:
+    filters = []
+    for field, operator, values in scope:
+        physical, kind = physical_column(field), operator_kind(operator)
+        if physical and kind:
+            filters.append(_Filter(field, *physical, kind, operator, values))
+    return filters
+
+
+def _constant(item: _Filter):
+    """Nilai konstan tunggal dari rule kesamaan, atau None."""
+    if item.operator not in ('equal', 'select_equals') or len(item.values) != 1:
+        return None
+    value = item.values[0]
+    return value if isinstance(value, (str, int)) and not isinstance(value, bool) else None
+
+
+def _literal_predicate(name: str, value) -> str:
+    return str((column(name) == value).compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+
+
+def _scope_candidates(scope, time_tables: set[str]):
+    """Kunci kandidat (tabel, kolom, metode, predikat) beserta field pemicunya untuk satu lingkup AND."""
+    filters = _filters(scope)
+    for item in filters:
+        using = 'gin' if item.kind == 'text' else 'btree'
+        yield (item.table, (item.column,), using, None), {item.field}
+
+    for a, b in combinations(filters, 2):
+        if a.table != b.table or a.column == b.column or 'text' in (a.kind, b.kind):
+            continue
+        first, second = sorted((a, b), key=lambda item: (item.kind == 'range', item.column))
+        yield (a.table, (first.column, second.column), 'btree', None), {a.field, b.field}
+        for constant, other in ((a, b), (b, a)):
+            value = _constant(constant)
+            if value is not None:
+                yield ((other.table, (other.column,), 'btree', _literal_predicate(constant.column, value)),
+                       {constant.field, other.field})
+
+    times = [item for item in filters if item.column == TIME_COLUMN and item.kind != 'text']
+    if not times:
+        return
+    for item in filters:
+        fact = FACT_FOREIGN_KEYS.get(item.table)
+        if fact and fact[0] in time_tables:
+            yield (fact[0], (fact[1], TIME_COLUMN), 'btree', None), {item.field, times[0].field}
+
+
+def generate_candidates(segments: list[SavedSegment], min_segments: int = MIN_SEGMEN,
+                        time_tables: set[str] = frozenset({'transaksi'})) -> list[IndexCandidate]:
+    """Kandidat index yang dipakai minimal `min_segments` segmen.
+
+    `time_tables` adalah tabel fakta yang kolom `waktu_transaksi`-nya difilter oleh query
+    segmen (lihat `filtered_time_tables()`).
+    """
+    segment_ids, fields = defaultdict(set), defaultdict(set)
+    for segment in segments:
+        for scope in and_scopes(segment.tree):
+            for key, used_fields in _scope_candidates(scope, time_tables):
+                segment_ids[key].add(segment.id)
+                fields[key] |= used_fields
+    return [
+        IndexCandidate(*key, frozenset(ids), frozenset(fields[key]))
+        for key, ids in segment_ids.items() if len(ids) >= min_segments
+    ]
+
+
+def index_name(candidate: IndexCandidate, table: str | None = None) -> str:
+    """Nama index kandidat; `table` dipakai untuk index partisi dari tabel induk kandidat."""
+    name = f"idx_{table or candidate.table}_{'_'.join(candidate.columns)}"
+    if candidate.using == 'gin':
+        name += '_trgm'
+    if candidate.where:
+        name += '_' + hashlib.md5(candidate.where.encode()).hexdigest()[:8]
+    if len(name) > 63:
+        name = name[:54] + '_' + hashlib.md5(name.encode()).hexdigest()[:8]
+    return name
+
+
+def index_ddl(candidate: IndexCandidate, concurrently: bool = False, table: str | None = None,
+              only: bool = False) -> str:
+    """DDL index kandidat pada tabelnya (atau partisi `table`); `only=True` untuk index induk `ON ONLY`."""
+    ops = ' gin_trgm_ops' if candidate.using == 'gin' else ''
+    columns = ', '.join(f'"{name}"{ops}' for name in candidate.columns)
+    if concurrently:
+        prefix = 'CONCURRENTLY IF NOT EXISTS '
+    elif only:
+        prefix = 'IF NOT EXISTS '
+    else:
+        prefix = ''
+    sql = (f'CREATE INDEX {prefix}"{index_name(candidate, table)}" '
+           f'ON {"ONLY " if only else ""}"{table or candidate.table}" USING {candidate.using} ({columns})')
+    return f'{sql} WHERE {candidate.where}' if candidate.where else sql
+
+
+def existing_indexes(connection, tables) -> dict[str, list[tuple]]:
+    """(kolom, metode, predikat) index yang sudah ada per tabel, termasuk primary key dan UNIQUE."""
+    inspector = inspect(connection)
+    existing = {}
+    for table in tables:
+        if not inspector.has_table(table):
+            continue
+        entries = [(tuple(inspector.get_pk_constraint(table)['constrained_columns']), 'btree', None)]
+        entries += [(tuple(unique['column_names']), 'btree', None)
+                    for unique in inspector.get_unique_constraints(table)]
+        for index in inspector.get_indexes(table):
+            options = index.get('dialect_options', {})
+            entries.append((tuple(name for name in index['column_names'] if name),
+                            options.get('postgresql_using', 'btree'), options.get('postgresql_where')))
+        existing[table] = entries
+    return existing
+
+
+def normalize_predicate(where: str | None) -> str | None:
+    """Bentuk pembanding predikat index parsial.
+
+    PostgreSQL menyimpan predikat dalam bentuk `pg_get_expr`, mis. `((kota)::text = 'Jakarta'::text)`
+    untuk `kota = 'Jakarta'`, jadi cast, tanda kurung, kutip ganda, dan spasi diabaikan.
+    """
+    if where is None:
+        return None
+    where = _CAST.sub('', where)
+    return ' '.join(where.translate(str.maketrans('', '', '()"')).split())
+
+
+def is_covered(candidate: IndexCandidate, existing: dict[str, list[tuple]]) -> bool:
+    """True jika index yang ada sudah diawali kolom kandidat dengan metode dan predikat parsial yang sama."""
+    if candidate.table not in existing:
+        return True  # Tabelnya belum ada (mis. feature store belum dibuat).
+    width = len(candidate.columns)
+    where = normalize_predicate(candidate.where)
+    return any(
+        using == candidate.using and columns[:width] == candidate.columns and normalize_predicate(predicate) == where
+        for columns, using, predicate in existing[candidate.table]
+    )
+
+
+def segment_queries(segments: list[SavedSegment]) -> dict:
+    """Query estimasi per segmen (rule segmen acuan di-inline); segmen yang tidak bisa dikompilasi dilewati."""
+    trees = {segment.id: segment.tree for segment in segments}
+    queries = {}
+    for segment in segments:
+        try:
+            queries[segment.id] = build_sales_estimate_query(inline_segments(segment.tree, trees.get))
+        except ValueError:
+            continue
+    return queries
+
+
+def filtered_time_tables(queries) -> set[str]:
+    """Tabel yang kolom `waktu_transaksi`-nya benar-benar difilter oleh query segmen.
+
+    Filter waktu dikompilasi ke `transaksi.waktu_transaksi` dan tidak diturunkan lewat
+    join, jadi index waktu pada `detail_transaksi` tidak pernah dipakai query tersebut.
+    """
+    tables = set()
+    for query in queries:
+        if query.whereclause is None:
+            continue
+        for element in visitors.iterate(query.whereclause):
+            if isinstance(element, Column) and element.name == TIME_COLUMN and element.table is not None:
+                tables.add(element.table.name)
+    return tables
+
+
+def explain_cost(connection, query) -> float:
+    compiled = query.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled.params).scalar()
+    return float(plan[0]['Plan']['Total Cost'])
+
+
+def has_hypopg(connection) -> bool:
+    return bool(connection.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'hypopg')")
+    ).scalar())
+
+
+def _hypothetical_cost(connection, candidate: IndexCandidate, queries: list) -> float | None:
+    """Total biaya `queries` dengan index hipotetis (hypopg); None jika hypopg menolak index-nya."""
+    try:
+        with connection.begin_nested():
+            connection.execute(text("SELECT * FROM hypopg_create_index(:ddl)"), {'ddl': index_ddl(candidate)})
+            return sum(explain_cost(connection, query) for query in queries)
+    except exc.DBAPIError:
+        return None
+    finally:
+        # Index hipotetis berlaku per sesi, bukan per transaksi: reset setelah savepoint selesai
+        # (atau di-rollback), agar tidak ikut memengaruhi biaya kandidat berikutnya.
+        connection.execute(text("SELECT hypopg_reset()"))
+
+
+def recommend(segments: list[SavedSegment] | None = None, min_segments: int = MIN_SEGMEN) -> list[dict]:
+    """Kandidat index yang belum ada, dinilai dengan biaya EXPLAIN segmen terdampak."""
+    segments = load_saved_segments() if segments is None else segments
+    queries = segment_queries(segments)
+    with engine.connect() as connection:
+        inspector = inspect(connection)
+        time_tables = {table for table in ('transaksi', 'detail_transaksi')
+                       if inspector.has_table(table)
+                       and any(col['name'] == TIME_COLUMN for col in inspector.get_columns(table))}
+        time_tables &= filtered_time_tables(queries.values())
+        candidates = generate_candidates(segments, min_segments, time_tables)
+        existing = existing_indexes(connection, {candidate.table for candidate in candidates})
+        candidates = [candidate for candidate in candidates if not is_covered(candidate, existing)]
+
+        before = {segment_id: explain_cost(connection, query) for segment_id, query in queries.items()}
+        hypothetical = has_hypopg(connection)
+        recommendations = []
+        for candidate in candidates:
+            affected = sorted(segment_id for segment_id in candidate.segments if segment_id in queries)
+            if not affected:
+                continue
+            cost_before = sum(before[segment_id] for segment_id in affected)
+            cost_after = (_hypothetical_cost(connection, candidate, [queries[s] for s in affected])
+                          if hypothetical else None)
+            if cost_after is not None and cost_after >= cost_before:
+                continue  # Planner tidak akan memakai index ini untuk segmen-segmen tersebut.
+            recommendations.append({
+                'kandidat': candidate,
+                'index': index_name(candidate),
+                'ddl': index_ddl(candidate, concurrently=True),
+                'segmen': affected,
+                'fields': sorted(candidate.fields),
+                'biaya_sebelum': cost_before,
+                'biaya_sesudah': cost_after,
+            })
+        connection.rollback()
+
+    def priority(item):
+        saving = item['biaya_sebelum'] - item['biaya_sesudah'] if item['biaya_sesudah'] is not None else 0.0
+        return saving, len(item['segmen']), item['biaya_sebelum']
+
+    return sorted(recommendations, key=priority, reverse=True)
+
+
+def measure_latency(connection, query, repeats: int = 3) -> float:
+    """Median waktu eksekusi query (detik) dari `repeats` kali percobaan."""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        connection.execute(query).fetchall()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+PARTITIONS_QUERY = text("""
+    SELECT c.relname, c.relkind = 'p' AS partitioned
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = to_regclass(:tabel)
+    ORDER BY c.relname
+""")
+
+
+def is_partitioned(connection, table: str) -> bool:
+    return bool(connection.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:tabel)"), {'tabel': table}
+    ).scalar())
+
+
+def _create_partitioned_index(connection, candidate: IndexCandidate, table: str):
+    """Index pada tabel berpartisi tanpa mengunci penulisan.
+
+    CREATE INDEX CONCURRENTLY tidak didukung pada tabel berpartisi: index induk dibuat
+    `ON ONLY` (masih invalid), index setiap partisi dibuat CONCURRENTLY lalu di-ATTACH,
+    dan index induk otomatis valid setelah semua partisinya terpasang.
+    """
+    parent = index_name(candidate, table)
+    connection.exec_driver_sql(index_ddl(candidate, table=table, only=True))
+    for partition, partitioned in connection.execute(PARTITIONS_QUERY, {'tabel': table}).all():
+        if partitioned:
+            _create_partitioned_index(connection, candidate, partition)
+        else:
+            connection.exec_driver_sql(index_ddl(candidate, concurrently=True, table=partition))
+        connection.exec_driver_sql(f'ALTER INDEX "{parent}" ATTACH PARTITION "{index_name(candidate, partition)}"')
+
+
+def create_index(connection, candidate: IndexCandidate):
+    """Membuat index kandidat tanpa mengunci penulisan, termasuk pada tabel berpartisi."""
+    if is_partitioned(connection, candidate.table):
+        _create_partitioned_index(connection, candidate, candidate.table)
+    else:
+        connection.exec_driver_sql(index_ddl(candidate, concurrently=True))
+
+
+def apply_recommendations(recommendations: list[dict], segments: list[SavedSegment],
+                          repeats: int = 3) -> list[dict]:
+    """Membuat index rekomendasi secara CONCURRENTLY dan mengukur latensi segmen terdampak sebelum/sesudahnya.
+
+    Index yang gagal dibuat dilaporkan dengan kolom `galat` tanpa menghentikan rekomendasi berikutnya.
+    """
+    queries = segment_queries(segments)
+    names = {segment.id: segment.nama for segment in segments}
+    report = []
+    # CREATE INDEX CONCURRENTLY tidak boleh berjalan di dalam blok transaksi.
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        for recommendation in recommendations:
+            affected = [segment_id for segment_id in recommendation['segmen'] if segment_id in queries]
+            before = {segment_id: measure_latency(connection, queries[segment_id], repeats) for segment_id in affected}
+            started = time.perf_counter()
+            try:
+                create_index(connection, recommendation['kandidat'])
+            except exc.DBAPIError as error:
+                report.append({'index': recommendation['index'], 'galat': str(error.orig).strip()})
+                continue
+            build_seconds = time.perf_counter() - started
+            for segment_id in affected:
+                report.append({
+                    'index': recommendation['index'],
+                    'detik_pembuatan': build_seconds,
+                    'id_segmen': segment_id,
+                    'nama_segmen': names.get(segment_id),
+                    'sebelum_ms': 1000 * before[segment_id],
+                    'sesudah_ms': 1000 * measure_latency(connection, queries[segment_id], repeats),
+                    'galat': None,
+                })
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rekomendasi index dari rule segmen tersimpan.")
+    parser.add_argument('--min-segmen', type=int, default=MIN_SEGMEN,
+                        help="Minimal jumlah segmen pemakai agar kandidat dinilai.")
+    parser.add_argument('--top', type=int, default=10, help="Jumlah rekomendasi teratas yang ditampilkan/dibuat.")
+    parser.add_argument('--buat', action='store_true', help="Buat index rekomendasi (CREATE INDEX CONCURRENTLY).")
+    parser.add_argument('--ulang', type=int, default=3, help="Jumlah pengukuran latensi per segmen.")
+    args = parser.parse_args()
+
+    segments = load_saved_segments()
+    print(f"{len(segments)} segmen tersimpan.")
+    print("Pemakaian (field, operator):")
+    for (field, operator), count in rule_usage(segments).most_common(15):
+        print(f"   {field} {operator}: {count}")
+    print("Field yang sering dipakai bersama:")
+    for (first, second), count in cooccurrence(segments).most_common(10):
+        print(f"   {first} + {second}: {count}")
+
+    recommendations = recommend(segments, args.min_segmen)[:args.top]
+    for item in recommendations:
+        after = f"{item['biaya_sesudah']:.0f}" if item['biaya_sesudah'] is not None else "?"
+        print(f"   {item['ddl']}\n      {len(item['segmen'])} segmen ({', '.join(item['fields'])}), "
+              f"biaya EXPLAIN {item['biaya_sebelum']:.0f} -> {after}")
+    if args.buat and recommendations:
+        for row in apply_recommendations(recommendations, segments, args.ulang):
+            if row['galat']:
+                print(f"   ⚠️ {row['index']}: {row['galat']}")
+            else:
+                print(f"   {row['index']} | {row['nama_segmen']}: {row['sebelum_ms']:.1f} ms -> {row['sesudah_ms']:.1f} ms")
+    print(f"✅ {len(recommendations)} rekomendasi index{' dibuat' if args.buat and recommendations else ''}.")
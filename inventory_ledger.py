@@ -0,0 +1,162 @@
+# inventory_ledger.py
+"""Ledger stok: pengurangan `stok_gudang` dari penjualan, diproses per micro-batch.
+
+Setiap batch membaca baris `detail_transaksi` dengan id di atas watermark (paling
+banyak `STOK_BATCH_ROWS` id), menjumlahkannya per (id_produk, id_toko), lalu
+menerapkannya dengan satu `INSERT ... SELECT ... ON CONFLICT (id_produk, id_toko)
+DO UPDATE` beserta pembaruan watermark dalam transaksi yang sama. Jadi setiap baris
+stok hanya dikunci sekali per batch, bukan sekali per item terjual, dan baris
+dikunci dalam urutan (id_produk, id_toko) yang tetap sehingga tidak saling deadlock.
+Produk yang terjual tanpa baris stok akan mendapat baris baru dengan stok negatif.
+
+Baris watermark di `watermark_proses` dikunci `FOR UPDATE` selama batch berjalan,
+sehingga beberapa proses ledger yang berjalan bersamaan tidak menerapkan batch yang
+sama dua kali. Seperti `member_features.py`, detail transaksi diasumsikan append-only.
+
+`detail_transaksi.id` diambil dari sequence sebelum commit, jadi id yang lebih kecil
+bisa baru terlihat setelah id yang lebih besar (COPY paralel `data_generator.py`,
+atau lebih dari satu penulis; `pos_ingest.py` sendiri dijaga satu penulis). Karena itu
+batch berhenti tepat sebelum celah id pertama di rentangnya, sampai celah itu lebih
+tua dari `STOK_GAP_SECONDS` detik atau tidak ada lagi penulis yang sedang berjalan
+(`id_gaps.py`); celah yang bertahan dianggap permanen (transaksi yang di-rollback,
+cache sequence) dan dilewati.
+
+Stok awal dari `data_generator.py` adalah posisi stok saat ini, jadi generator
+memanggil `mark_baseline()` agar riwayat penjualan lama tidak ikut dikurangkan.
+
+Jalankan `python inventory_ledger.py` (atau `--terus` sebagai proses yang terus berjalan).
+"""
+import argparse
+import os
+import time
+from collections import namedtuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+
+from database import engine
+from id_gaps import GapGuard
+from models import DetailTransaksi, StokGudang, Transaksi, WatermarkProses
+
+PROSES = 'stok_gudang'
+BATCH_ROWS = int(os.getenv('STOK_BATCH_ROWS', '50000'))
+POLL_SECONDS = float(os.getenv('STOK_POLL_SECONDS', '5'))
+GAP_SECONDS = float(os.getenv('STOK_GAP_SECONDS', '30'))
+
+# Celah detail_transaksi.id yang sedang ditunggu; rentangnya sudah dibatasi ukuran batch.
+_guard = GapGuard(DetailTransaksi.id, GAP_SECONDS, scan_ids=None)
+
+LedgerBatch = namedtuple('LedgerBatch', ['dari', 'sampai', 'baris_detail', 'sel_stok', 'seconds', 'rows_per_second'])
+
+
+def _lock_watermark(connection) -> int:
+    """Watermark ledger (detail_transaksi.id terakhir yang diterapkan), dikunci sampai transaksi selesai."""
+    connection.execute(
+        insert(WatermarkProses).values(nama_proses=PROSES, watermark=0).on_conflict_do_nothing()
+    )
+    return connection.execute(
+        select(WatermarkProses.watermark).where(WatermarkProses.nama_proses == PROSES).with_for_update()
+    ).scalar()
+
+
+def _set_watermark(connection, watermark: int):
+    connection.execute(
+        WatermarkProses.__table__.update()
+        .where(WatermarkProses.nama_proses == PROSES)
+        .values(watermark=watermark, diperbarui_pada=func.now())
+    )
+
+
+def safe_upto(connection, after: int, upto: int) -> int:
+    """Memotong batas batch sebelum celah id yang mungkin masih berupa insert yang belum di-commit."""
+    return _guard.safe_upto(connection, after, upto)
+
+
+def build_stock_upsert(after: int, upto: int):
+    """Satu statement set-based: penjualan (after, upto] per (produk, toko) dikurangkan dari stok."""
+    sold = (
+        select(DetailTransaksi.id_produk, Transaksi.id_toko, -func.sum(DetailTransaksi.jumlah), func.now())
+        .join(Transaksi, Transaksi.id == DetailTransaksi.id_transaksi)
+        .where(DetailTransaksi.id > after, DetailTransaksi.id <= upto)
+        .group_by(DetailTransaksi.id_produk, Transaksi.id_toko)
+        .order_by(DetailTransaksi.id_produk, Transaksi.id_toko)
+    )
+    stmt = insert(StokGudang).from_select(['id_produk', 'id_toko', 'jumlah_stok', 'last_updated'], sold)
+    return stmt.on_conflict_do_update(
+        index_elements=['id_produk', 'id_toko'],
+        set_={'jumlah_stok': StokGudang.jumlah_stok + stmt.excluded.jumlah_stok,
+              'last_updated': stmt.excluded.last_updated},
+    )
+
+
+def apply_batch(batch_rows: int = BATCH_ROWS) -> LedgerBatch | None:
+    """Menerapkan satu micro-batch; None jika tidak ada detail transaksi baru."""
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        after = _lock_watermark(connection)
+        latest = connection.execute(select(func.coalesce(func.max(DetailTransaksi.id), 0))).scalar()
+        if latest <= after:
+            return None
+        upto = safe_upto(connection, after, min(after + batch_rows, latest))
+        if upto <= after:
+            return None
+        rows = connection.execute(
+            select(func.count()).where(DetailTransaksi.id > after, DetailTransaksi.id <= upto)
+        ).scalar()
+        cells = connection.execute(build_stock_upsert(after, upto)).rowcount
+        _set_watermark(connection, upto)
+    seconds = time.perf_counter() - started
+    return LedgerBatch(after, upto, rows, cells, seconds, rows / seconds if seconds > 0 else float('inf'))
+
+
+def run_ledger(batch_rows: int = BATCH_ROWS, max_batches: int | None = None) -> list[LedgerBatch]:
+    """Menerapkan batch berturut-turut sampai tidak ada detail baru (atau `max_batches` tercapai)."""
+    batches = []
+    while max_batches is None or len(batches) < max_batches:
+        batch = apply_batch(batch_rows)
+        if batch is None:
+            break
+        batches.append(batch)
+    return batches
+
+
+def mark_baseline() -> int:
+    """Menandai semua detail transaksi yang ada sebagai sudah tercermin di stok saat ini."""
+    with engine.begin() as connection:
+        _lock_watermark(connection)
+        latest = connection.execute(select(func.coalesce(func.max(DetailTransaksi.id), 0))).scalar()
+        _set_watermark(connection, latest)
+    return latest
+
+
+def report(batch: LedgerBatch):
+    print(f"   detail {batch.dari + 1:,}-{batch.sampai:,}: {batch.baris_detail:,} baris -> {batch.sel_stok:,} baris stok "
+          f"dalam {batch.seconds:.2f} dtk ({batch.rows_per_second:,.0f} baris/dtk)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Menerapkan penjualan baru ke stok_gudang per micro-batch.")
+    parser.add_argument('--batch', type=int, default=BATCH_ROWS, help="Jumlah id detail_transaksi per batch.")
+    parser.add_argument('--terus', action='store_true', help="Terus berjalan dan memeriksa penjualan baru berkala.")
+    parser.add_argument('--interval', type=float, default=POLL_SECONDS, help="Jeda antar pemeriksaan (detik).")
+    parser.add_argument('--baseline', action='store_true',
+                        help="Tandai semua penjualan yang ada sebagai sudah tercermin di stok, tanpa menerapkannya.")
+    args = parser.parse_args()
+
+    if args.baseline:
+        print(f"✅ Watermark ledger stok diset ke detail_transaksi.id {mark_baseline()}.")
+        parser.exit()
+    total_rows = total_seconds = 0
+    try:
+        while True:
+            for batch in run_ledger(args.batch):
+                report(batch)
+                total_rows += batch.baris_detail
+                total_seconds += batch.seconds
+            if not args.terus:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    rate = total_rows / total_seconds if total_seconds > 0 else 0
+    print(f"✅ {total_rows:,} baris detail diterapkan ke stok ({rate:,.0f} baris/dtk).")
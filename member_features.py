@@ -0,0 +1,180 @@
+# member_features.py
+"""Feature store RFM per member (`fitur_member`) yang dipelihara secara inkremental.
+
+Setiap refresh hanya membaca transaksi dengan `transaksi.id` di atas watermark yang
+tersimpan di `watermark_proses` (sampai sebelum celah id yang mungkin belum di-commit,
+lihat `id_gaps.py`), lalu menambahkan hasilnya ke akumulator per member
+(`INSERT ... ON CONFLICT DO UPDATE`):
+
+- frekuensi, jumlah item, total belanja, transaksi pertama/terakhir;
+- belanja dalam jendela `JENDELA_HARI` terakhir: transaksi yang keluar dari jendela
+  sejak refresh sebelumnya dikurangkan kembali (hanya rentang waktu yang bergeser
+  yang dibaca, lewat `idx_transaksi_waktu`);
+- kategori dan toko favorit, dihitung ulang hanya untuk member yang punya transaksi
+  baru, dari akumulator `fitur_member_kategori` dan `fitur_member_toko`.
+
+Recency dan rata-rata keranjang tidak disimpan, tetapi diturunkan saat query (lihat
+`FACT_COLUMNS` di `segment_query.py`). Seperti `FactCache`, tabel transaksi
+diasumsikan append-only; jalankan `python member_features.py --rebuild` jika ada
+transaksi lama yang dihapus atau diubah.
+
+Jalankan `python member_features.py` (mis. lewat cron, setelah `rollup.py`).
+"""
+import argparse
+from datetime import date, datetime, time as dt_time, timedelta
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from database import engine
+from id_gaps import GapGuard
+from models import DetailTransaksi, FiturMember, FiturMemberKategori, FiturMemberToko, Produk, Transaksi, WatermarkProses
+
+F = FiturMember
+PROSES = 'fitur_member'
+JENDELA_HARI = 90
+
+_gaps = GapGuard(Transaksi.id)
+
+
+def window_start(today: date | None = None) -> datetime:
+    """Awal jendela belanja: tengah malam `JENDELA_HARI` hari sebelum hari ini."""
+    return datetime.combine((today or date.today()) - timedelta(days=JENDELA_HARI), dt_time())
+
+
+def _upsert_add(model, select_stmt, columns: list[str], keys: list[str], extra_set: dict | None = None):
+    """INSERT ... SELECT yang menambahkan nilai ke akumulator jika barisnya sudah ada."""
+    stmt = insert(model).from_select(columns, select_stmt)
+    set_ = {col: getattr(model, col) + stmt.excluded[col] for col in columns if col not in keys}
+    set_.update({col: build(stmt.excluded) for col, build in (extra_set or {}).items()})
+    return stmt.on_conflict_do_update(index_elements=keys, set_=set_)
+
+
+def _apply(connection, after: int, upto: int, old_cutoff: datetime | None, cutoff: datetime) -> dict:
+    new_tx = (Transaksi.id > after) & (Transaksi.id <= upto) & Transaksi.id_member.isnot(None)
+    belanja = func.sum(DetailTransaksi.jumlah * DetailTransaksi.harga_saat_transaksi)
+
+    # Satu baris per transaksi baru (nilai keranjang), sebagai dasar semua akumulator.
+    basket = (
+        select(Transaksi.id, Transaksi.id_member, Transaksi.id_toko, Transaksi.waktu_transaksi,
+               belanja.label('belanja'), func.sum(DetailTransaksi.jumlah).label('item'))
+        .join(DetailTransaksi, DetailTransaksi.id_transaksi == Transaksi.id)
+        .where(new_tx)
+        .group_by(Transaksi.id, Transaksi.id_member, Transaksi.id_toko, Transaksi.waktu_transaksi)
+        .subquery()
+    )
+    per_member = (
+        select(
+            basket.c.id_member, func.count(), func.sum(basket.c.item), func.sum(basket.c.belanja),
+            func.coalesce(func.sum(basket.c.belanja).filter(basket.c.waktu_transaksi >= cutoff), 0),
+            func.min(basket.c.waktu_transaksi), func.max(basket.c.waktu_transaksi),
+        )
+        .group_by(basket.c.id_member)
+    )
+    members = connection.execute(_upsert_add(
+        F, per_member,
+        ['id_member', 'jumlah_transaksi', 'jumlah_item', 'total_belanja', 'belanja_90_hari',
+         'transaksi_pertama', 'transaksi_terakhir'],
+        ['id_member'],
+        {
+            'transaksi_pertama': lambda new: func.least(F.transaksi_pertama, new.transaksi_pertama),
+            'transaksi_terakhir': lambda new: func.greatest(F.transaksi_terakhir, new.transaksi_terakhir),
+        },
+    )).rowcount
+
+    kategori = func.coalesce(Produk.kategori, '')
+    connection.execute(_upsert_add(
+        FiturMemberKategori,
+        select(Transaksi.id_member, kategori, func.sum(DetailTransaksi.jumlah), belanja)
+        .join(DetailTransaksi, DetailTransaksi.id_transaksi == Transaksi.id)
+        .join(Produk, Produk.id == DetailTransaksi.id_produk)
+        .where(new_tx)
+        .group_by(Transaksi.id_member, kategori),
+        ['id_member', 'kategori', 'jumlah_item', 'total_belanja'],
+        ['id_member', 'kategori'],
+    ))
+    connection.execute(_upsert_add(
+        FiturMemberToko,
+        select(basket.c.id_member, basket.c.id_toko, func.count(), func.sum(basket.c.belanja))
+        .group_by(basket.c.id_member, basket.c.id_toko),
+        ['id_member', 'id_toko', 'jumlah_transaksi', 'total_belanja'],
+        ['id_member', 'id_toko'],
+    ))
+
+    # Transaksi lama yang keluar dari jendela sejak refresh sebelumnya dikurangkan dari belanja_90_hari.
+    if old_cutoff is not None and old_cutoff < cutoff:
+        expired = (
+            select(Transaksi.id_member, belanja.label('belanja'))
+            .join(DetailTransaksi, DetailTransaksi.id_transaksi == Transaksi.id)
+            .where(Transaksi.id <= after, Transaksi.id_member.isnot(None))
+            .where(Transaksi.waktu_transaksi >= old_cutoff, Transaksi.waktu_transaksi < cutoff)
+            .group_by(Transaksi.id_member)
+            .subquery()
+        )
+        connection.execute(
+            update(F).values(belanja_90_hari=F.belanja_90_hari - expired.c.belanja)
+            .where(F.id_member == expired.c.id_member)
+        )
+
+    # Favorit hanya dihitung ulang untuk member yang akumulatornya berubah.
+    affected = select(Transaksi.id_member).where(new_tx)
+    K, T = FiturMemberKategori, FiturMemberToko
+    fav_kategori = (
+        select(K.id_member, K.kategori).where(K.id_member.in_(affected))
+        .order_by(K.id_member, K.total_belanja.desc(), K.kategori).distinct(K.id_member).subquery()
+    )
+    connection.execute(
+        update(F).values(kategori_favorit=func.nullif(fav_kategori.c.kategori, ''))
+        .where(F.id_member == fav_kategori.c.id_member)
+    )
+    fav_toko = (
+        select(T.id_member, T.id_toko).where(T.id_member.in_(affected))
+        .order_by(T.id_member, T.jumlah_transaksi.desc(), T.total_belanja.desc(), T.id_toko)
+        .distinct(T.id_member).subquery()
+    )
+    connection.execute(
+        update(F).values(id_toko_favorit=fav_toko.c.id_toko).where(F.id_member == fav_toko.c.id_member)
+    )
+
+    applied_cutoff = max(old_cutoff, cutoff) if old_cutoff is not None else cutoff
+    stmt = insert(WatermarkProses).values(nama_proses=PROSES, watermark=upto, waktu_acuan=applied_cutoff,
+                                          diperbarui_pada=datetime.now())
+    connection.execute(stmt.on_conflict_do_update(index_elements=['nama_proses'], set_={
+        k: stmt.excluded[k] for k in ('watermark', 'waktu_acuan', 'diperbarui_pada')
+    }))
+    return {'watermark': upto, 'member_diperbarui': members}
+
+
+def refresh_member_features(today: date | None = None, rebuild: bool = False) -> dict:
+    """Memproses transaksi baru sejak watermark terakhir; `rebuild=True` menghitung ulang dari nol.
+
+    Mengembalikan watermark baru dan jumlah member yang fiturnya diperbarui.
+    """
+    cutoff = window_start(today)
+    # REPEATABLE READ agar batas watermark dan baris yang dibaca berasal dari snapshot yang sama.
+    with engine.connect().execution_options(isolation_level='REPEATABLE READ') as connection:
+        with connection.begin():
+            if rebuild:
+                for model in (FiturMemberKategori, FiturMemberToko, F):
+                    connection.execute(delete(model))
+                connection.execute(delete(WatermarkProses).where(WatermarkProses.nama_proses == PROSES))
+            state = connection.execute(
+                select(WatermarkProses.watermark, WatermarkProses.waktu_acuan)
+                .where(WatermarkProses.nama_proses == PROSES)
+            ).first()
+            after, old_cutoff = (state.watermark, state.waktu_acuan) if state else (0, None)
+            if old_cutoff is not None:
+                old_cutoff = old_cutoff.replace(tzinfo=None)
+            upto = connection.execute(select(func.coalesce(func.max(Transaksi.id), 0))).scalar()
+            if upto < after:
+                raise RuntimeError("Watermark fitur member melewati transaksi terakhir; jalankan dengan --rebuild.")
+            upto = _gaps.safe_upto(connection, after, upto)
+            return _apply(connection, after, upto, old_cutoff, cutoff)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memperbarui feature store RFM per member.")
+    parser.add_argument('--rebuild', action='store_true', help="Hitung ulang semua fitur dari awal.")
+    args = parser.parse_args()
+    result = refresh_member_features(rebuild=args.rebuild)
+    print(f"✅ Fitur {result['member_diperbarui']} member diperbarui (watermark transaksi {result['watermark']}).")
@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Numeric, JSON, Date, Text, CheckConstraint
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Numeric, JSON, Date, Text, CheckConstraint, Boolean, BigInteger, LargeBinary, Index, UniqueConstraint, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import JSONB 
 from database import Base, engine
@@ -49,6 +49,10 @@ class DetailTransaksi(Base):
     id_produk = Column(Integer, ForeignKey('produk.id'), nullable=False)
     jumlah = Column(Integer, CheckConstraint('jumlah > 0'), nullable=False)
     harga_saat_transaksi = Column(Numeric(10, 2), nullable=False)
+    __table_args__ = (
+        # Join transaksi -> detail dan count per watermark memakai index ini, bukan scan seluruh tabel.
+        Index('idx_detail_transaksi_transaksi', 'id_transaksi'),
+    )
 
 class StokGudang(Base):
     __tablename__ = 'stok_gudang'
@@ -57,6 +61,10 @@ class StokGudang(Base):
     id_toko = Column(Integer, ForeignKey('toko.id'), nullable=False)
     jumlah_stok = Column(Integer, default=0, nullable=False)
     last_updated = Column(DateTime(timezone=True), default=datetime.datetime.now)
+    __table_args__ = (
+        # Target ON CONFLICT (id_produk, id_toko) untuk upsert batch ledger stok (inventory_ledger.py).
+        UniqueConstraint('id_produk', 'id_toko', name='stok_gudang_id_produk_id_toko_key'),
+    )
 
 class FilterTersimpan(Base):
     __tablename__ = 'filter_tersimpan'
@@ -65,4 +73,134 @@ class FilterTersimpan(Base):
     deskripsi = Column(Text)
     konfigurasi_json = Column(JSONB, nullable=False)
     dibuat_oleh = Column(String(100))
-    dibuat_pada = Column(DateTime(timezone=True), default=datetime.datetime.now)
\ No newline at end of file
+    dibuat_pada = Column(DateTime(timezone=True), default=datetime.datetime.now)
+
+    __table_args__ = (
+        # Pencarian ILIKE '%kata%' pada nama segmen (butuh ekstensi pg_trgm).
+        Index('idx_filter_tersimpan_nama_trgm', 'nama_filter',
+              postgresql_using='gin', postgresql_ops={'nama_filter': 'gin_trgm_ops'}),
+        # Paginasi keyset Segment Directory pada (dibuat_pada, id).
+        Index('idx_filter_tersimpan_dibuat_pada', dibuat_pada.desc(), id.desc()),
+    )
+
+# Index trigram di atas membutuhkan pg_trgm saat tabel dibuat lewat create_all().
+event.listen(FilterTersimpan.__table__, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+
+# Agregat harian penjualan per (tanggal, toko, produk, member/non-member, posisi karyawan).
+class RollupPenjualanHarian(Base):
+    __tablename__ = 'rollup_penjualan_harian'
+    tanggal = Column(Date, primary_key=True)
+    id_toko = Column(Integer, ForeignKey('toko.id'), primary_key=True)
+    id_produk = Column(Integer, ForeignKey('produk.id'), primary_key=True)
+    is_member = Column(Boolean, primary_key=True)
+    posisi_karyawan = Column(String(50), primary_key=True, default='')  # '' jika posisi kosong
+    total_jumlah = Column(BigInteger, nullable=False)
+    total_pendapatan = Column(Numeric(14, 2), nullable=False)
+    jumlah_baris = Column(Integer, nullable=False)
+    sketsa_member = Column(LargeBinary)  # sketsa HyperLogLog ID member (hll.py); NULL untuk sel non-member
+
+# Cache keanggotaan segmen tersimpan dalam bentuk bitmap terkompresi (ID detail_transaksi).
+class KeanggotaanSegmen(Base):
+    __tablename__ = 'keanggotaan_segmen'
+    id_filter = Column(Integer, ForeignKey('filter_tersimpan.id', ondelete='CASCADE'), primary_key=True)
+    versi = Column(String(40), nullable=False)  # hash dari pohon aturan (termasuk segmen yang direferensikan)
+    watermark = Column(BigInteger, nullable=False)  # transaksi.id tertinggi saat bitmap dihitung
+    kardinalitas = Column(Integer, nullable=False)
+    bitmap = Column(LargeBinary, nullable=False)
+    dihitung_pada = Column(DateTime(timezone=True), default=datetime.datetime.now)
+
+# Fitur RFM per member (recency, frequency, monetary, favorit), dipelihara inkremental oleh member_features.py.
+class FiturMember(Base):
+    __tablename__ = 'fitur_member'
+    id_member = Column(Integer, ForeignKey('member.id', ondelete='CASCADE'), primary_key=True)
+    jumlah_transaksi = Column(Integer, nullable=False)
+    jumlah_item = Column(BigInteger, nullable=False)
+    total_belanja = Column(Numeric(14, 2), nullable=False)
+    belanja_90_hari = Column(Numeric(14, 2), nullable=False)  # belanja sejak awal jendela 90 hari terakhir
+    transaksi_pertama = Column(DateTime(timezone=True))
+    transaksi_terakhir = Column(DateTime(timezone=True))
+    kategori_favorit = Column(String(50))
+    id_toko_favorit = Column(Integer, ForeignKey('toko.id'))
+
+    __table_args__ = (
+        # Segmen seperti "belanja > 500rb dalam 90 hari terakhir" menjadi lookup index, bukan scan + groupby.
+        Index('idx_fitur_member_belanja_90_hari', 'belanja_90_hari'),
+        Index('idx_fitur_member_total_belanja', 'total_belanja'),
+        Index('idx_fitur_member_transaksi_terakhir', 'transaksi_terakhir'),
+    )
+
+# Akumulasi belanja per (member, kategori) untuk menentukan kategori favorit secara inkremental.
+class FiturMemberKategori(Base):
+    __tablename__ = 'fitur_member_kategori'
+    id_member = Column(Integer, ForeignKey('member.id', ondelete='CASCADE'), primary_key=True)
+    kategori = Column(String(50), primary_key=True)  # '' jika kategori produk kosong
+    jumlah_item = Column(BigInteger, nullable=False)
+    total_belanja = Column(Numeric(14, 2), nullable=False)
+
+# Akumulasi transaksi per (member, toko) untuk menentukan toko favorit secara inkremental.
+class FiturMemberToko(Base):
+    __tablename__ = 'fitur_member_toko'
+    id_member = Column(Integer, ForeignKey('member.id', ondelete='CASCADE'), primary_key=True)
+    id_toko = Column(Integer, ForeignKey('toko.id'), primary_key=True)
+    jumlah_transaksi = Column(Integer, nullable=False)
+    total_belanja = Column(Numeric(14, 2), nullable=False)
+
+# Posisi terakhir setiap proses inkremental (transaksi.id tertinggi yang sudah diproses).
+class WatermarkProses(Base):
+    __tablename__ = 'watermark_proses'
+    nama_proses = Column(String(50), primary_key=True)
+    watermark = Column(BigInteger, nullable=False)
+    waktu_acuan = Column(DateTime(timezone=True))  # mis. awal jendela waktu yang sudah diterapkan
+    diperbarui_pada = Column(DateTime(timezone=True), default=datetime.datetime.now)
+
+# Job materialisasi audiens campaign (daftar member unik) dari satu segmen tersimpan, lihat audience_jobs.py.
+class AudiensJob(Base):
+    __tablename__ = 'audiens_job'
+    id = Column(Integer, primary_key=True)
+    id_filter = Column(Integer, ForeignKey('filter_tersimpan.id', ondelete='CASCADE'), nullable=False)
+    status = Column(String(20), nullable=False, default='antri')  # antri, berjalan, selesai, dibatalkan, gagal
+    watermark = Column(BigInteger, nullable=False)  # transaksi.id tertinggi saat job dibuat
+    id_member_maks = Column(Integer, nullable=False)  # batas atas rentang member.id yang diproses
+    id_member_terakhir = Column(Integer, nullable=False, default=0)  # rentang member.id yang sudah selesai
+    jumlah_anggota = Column(Integer, nullable=False, default=0)
+    pesan_error = Column(Text)
+    dibuat_pada = Column(DateTime(timezone=True), default=datetime.datetime.now)
+    diperbarui_pada = Column(DateTime(timezone=True), default=datetime.datetime.now)
+
+# Anggota audiens hasil materialisasi; primary key (id_job, id_member) sekaligus kunci paginasi keyset.
+class AudiensMember(Base):
+    __tablename__ = 'audiens_member'
+    id_job = Column(Integer, ForeignKey('audiens_job.id', ondelete='CASCADE'), primary_key=True)
+    id_member = Column(Integer, ForeignKey('member.id', ondelete='CASCADE'), primary_key=True)
+    kode_member = Column(String(20), nullable=False)
+
+# Anggota member segmen tersimpan yang dipelihara inkremental oleh segment_maintenance.py.
+class AnggotaSegmen(Base):
+    __tablename__ = 'anggota_segmen'
+    id_filter = Column(Integer, ForeignKey('filter_tersimpan.id', ondelete='CASCADE'), primary_key=True)
+    id_member = Column(Integer, ForeignKey('member.id', ondelete='CASCADE'), primary_key=True)
+    __table_args__ = (
+        # Segmen apa saja yang memuat seorang member.
+        Index('idx_anggota_segmen_member', 'id_member'),
+    )
+
+# Status pemeliharaan keanggotaan per segmen: versi pohon aturan dan transaksi.id terakhir yang diterapkan.
+class StatusAnggotaSegmen(Base):
+    __tablename__ = 'status_anggota_segmen'
+    id_filter = Column(Integer, ForeignKey('filter_tersimpan.id', ondelete='CASCADE'), primary_key=True)
+    versi = Column(String(40), nullable=False)
+    watermark = Column(BigInteger, nullable=False)
+    jumlah_anggota = Column(Integer, nullable=False, default=0)
+    diperbarui_pada = Column(DateTime(timezone=True), default=datetime.datetime.now)
+
+# Kunci idempotensi ingest POS (pos_ingest.py): transaksi dengan kunci yang sama hanya ditulis sekali.
+# Tanpa foreign key ke transaksi agar tetap berlaku pada skema berpartisi (primary key transaksi komposit).
+class KunciIngest(Base):
+    __tablename__ = 'kunci_ingest'
+    kunci = Column(String(64), primary_key=True)
+    id_transaksi = Column(Integer, nullable=False)
+    diterima_pada = Column(DateTime(timezone=True), default=datetime.datetime.now)
+    __table_args__ = (
+        # Pembersihan kunci lama per rentang waktu (lihat purge_keys()).
+        Index('idx_kunci_ingest_diterima_pada', 'diterima_pada'),
+    )
@@ -0,0 +1,159 @@
+# partition_maintenance.py
+"""Pemeliharaan partisi bulanan `transaksi` dan `detail_transaksi` (varian `skema_partisi.sql`).
+
+- `ensure_partitions()` membuat partisi bulan berjalan sampai `BULAN_DEPAN` bulan ke
+  depan (dan bulan-bulan lampau jika `start` diberikan, mis. sebelum backfill), dengan
+  nama `<tabel>_YYYY_MM`. Index tabel induk (BRIN waktu, join `id_transaksi`, dst.)
+  otomatis ikut dibuat di setiap partisi baru.
+- `detach_old_partitions()` melepas partisi yang seluruhnya lebih tua dari masa retensi,
+  dan jika diminta langsung men-drop-nya: retensi menjadi `DROP TABLE` per bulan,
+  bukan DELETE besar yang ber-cascade ke detail. Partisi detail selalu dilepas lebih
+  dulu karena foreign key-nya menunjuk ke partisi transaksi bulan yang sama; tanpa
+  drop, foreign key partisi detail yang dilepas dihapus agar partisi transaksinya juga
+  bisa dilepas. Baris partisi yang dilepas tidak tercatat di `n_tup_del`; `FactCache`
+  (`fact_data.py`) mendeteksinya dari jumlah partisi dan `min(transaksi.id)` yang
+  berubah, lalu memuat ulang frame fakta penuh pada refresh berikutnya.
+
+Batas partisi ditulis sebagai tanggal dan ditafsirkan dalam `TimeZone` sesi
+PostgreSQL, jadi jalankan skrip ini dengan zona waktu server yang sama dengan data.
+Query dengan filter rentang `waktu_transaksi` hanya membaca partisi transaksi bulan
+yang relevan; detailnya dicapai lewat `idx_detail_transaksi_transaksi` per partisi.
+
+Jalankan `python partition_maintenance.py` secara berkala (mis. cron bulanan).
+"""
+import argparse
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+from database import engine
+
+# Urutan induk -> anak; pelepasan partisi dilakukan dalam urutan terbalik.
+TABEL_PARTISI = ('transaksi', 'detail_transaksi')
+BULAN_DEPAN = int(os.getenv('PARTISI_BULAN_DEPAN', '3'))
+RETENSI_BULAN = int(os.getenv('PARTISI_RETENSI_BULAN', '0'))  # 0 berarti tanpa retensi.
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+def is_partitioned(connection, table: str = 'detail_transaksi') -> bool:
+    """True jika `table` adalah tabel berpartisi (skema_partisi.sql sudah diterapkan)."""
+    return bool(connection.execute(
+        text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:tabel)"), {'tabel': table}
+    ).scalar())
+
+
+def list_partitions(connection, table: str) -> dict[date, str]:
+    """Partisi bulanan `table` yang mengikuti pola nama `<tabel>_YYYY_MM`, per awal bulan."""
+    rows = connection.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:tabel)
+    """), {'tabel': table}).scalars()
+    pattern = re.compile(rf'^{re.escape(table)}_(\d{{4}})_(\d{{2}})$')
+    partitions = {}
+    for name in rows:
+        match = pattern.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def ensure_partitions(connection, start=None, months_ahead: int = BULAN_DEPAN, today: date | None = None) -> list[str]:
+    """Membuat partisi yang belum ada dari bulan `start` (default bulan ini) sampai `months_ahead` bulan ke depan."""
+    current = month_start(today or date.today())
+    month = month_start(start) if start is not None else current
+    last = add_months(current, months_ahead)
+    existing = {table: list_partitions(connection, table) for table in TABEL_PARTISI}
+    created = []
+    while month <= last:
+        for table in TABEL_PARTISI:
+            if month in existing[table]:
+                continue
+            name = partition_name(table, month)
+            connection.execute(text(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table}" '
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+            ))
+            created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def _drop_partition_foreign_keys(connection, name: str):
+    """Menghapus foreign key partisi yang sudah dilepas ke tabel berpartisi lain.
+
+    Partisi detail yang dilepas tetap membawa salinan foreign key ke `transaksi`, sehingga
+    partisi transaksi bulan yang sama tidak bisa dilepas selama datanya masih ada.
+    """
+    constraints = connection.execute(text("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = to_regclass(:tabel) AND contype = 'f' AND conparentid = 0
+          AND pg_partition_root(confrelid) = ANY (ARRAY(SELECT to_regclass(t) FROM unnest(CAST(:induk AS text[])) AS t))
+    """), {'tabel': f'"{name}"', 'induk': list(TABEL_PARTISI)}).scalars().all()
+    for constraint in constraints:
+        connection.execute(text(f'ALTER TABLE "{name}" DROP CONSTRAINT "{constraint}"'))
+
+
+def detach_old_partitions(connection, retention_months: int = RETENSI_BULAN, drop: bool = False,
+                          concurrently: bool = False, today: date | None = None) -> list[str]:
+    """Melepas (dan opsional men-drop) partisi yang seluruhnya lebih tua dari `retention_months` bulan.
+
+    `concurrently=True` memakai `DETACH PARTITION ... CONCURRENTLY` (PostgreSQL 14+) agar
+    query lain tidak terblokir; `connection` harus dalam mode AUTOCOMMIT.
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(month_start(today or date.today()), -retention_months)
+    detached = []
+    for table in reversed(TABEL_PARTISI):
+        for month, name in sorted(list_partitions(connection, table).items()):
+            if month >= cutoff:
+                break
+            mode = ' CONCURRENTLY' if concurrently else ''
+            connection.execute(text(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"{mode}'))
+            if drop:
+                connection.execute(text(f'DROP TABLE "{name}"'))
+            else:
+                _drop_partition_foreign_keys(connection, name)
+            detached.append(name)
+    return detached
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Membuat partisi bulanan ke depan dan melepas partisi lama.")
+    parser.add_argument('--mulai', type=lambda value: date.fromisoformat(f"{value}-01"),
+                        help="Buat juga partisi mulai bulan ini (YYYY-MM), mis. sebelum backfill data lama.")
+    parser.add_argument('--bulan-depan', type=int, default=BULAN_DEPAN, help="Jumlah bulan ke depan yang disiapkan.")
+    parser.add_argument('--retensi-bulan', type=int, default=RETENSI_BULAN,
+                        help="Lepas partisi yang lebih tua dari sekian bulan (0 = tanpa retensi).")
+    parser.add_argument('--drop', action='store_true', help="Drop partisi yang dilepas, bukan hanya detach.")
+    parser.add_argument('--concurrently', action='store_true',
+                        help="Gunakan DETACH PARTITION CONCURRENTLY (PostgreSQL 14+).")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        if not is_partitioned(conn, 'transaksi'):
+            parser.exit(1, "Tabel transaksi belum berpartisi; jalankan skema_partisi.sql terlebih dahulu.\n")
+        created = ensure_partitions(conn, args.mulai, args.bulan_depan)
+    if args.concurrently:
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            detached = detach_old_partitions(conn, args.retensi_bulan, args.drop, concurrently=True)
+    else:
+        with engine.begin() as conn:
+            detached = detach_old_partitions(conn, args.retensi_bulan, args.drop)
+    print(f"✅ {len(created)} partisi dibuat, {len(detached)} partisi {'di-drop' if args.drop else 'dilepas'}.")
@@ -0,0 +1,633 @@
+# pos_ingest.py
+"""Ingest transaksi POS (header + item) secara kontinu dalam micro-batch.
+
+Alur: sumber (folder spool atau replay output generator) -> `PosIngestor.submit()`
+(validasi) -> antrean berbatas -> satu thread penulis yang mengumpulkan micro-batch
+sampai `INGEST_BATCH_MAX` transaksi atau `INGEST_BATCH_WAIT` detik, lalu menulis
+seluruh batch dengan satu statement (satu round trip): array kolom dikirim sebagai
+parameter, di-`unnest`, dan header, item, serta kunci idempotensi di-INSERT dalam
+CTE yang sama.
+
+- Validasi mengikuti model `Transaksi`/`DetailTransaksi`: kolom wajib, tipe, presisi
+  NUMERIC, `jumlah > 0`, dan ID foreign key yang harus ada di tabel acuannya.
+- Back-pressure: jika database tertinggal (atau sedang tidak bisa dihubungi, batch
+  dicoba ulang dengan jeda), antrean penuh dan `submit()` memblokir produsen.
+- Idempotensi: setiap pesan wajib membawa `kunci`; kunci yang sudah ada di
+  `kunci_ingest` dilewati, jadi pengiriman ulang (mis. file spool yang diproses ulang
+  setelah crash) aman.
+- Metrik: throughput ingest dan latensi commit p50/p99 lewat `PosIngestor.metrics()`.
+
+Hanya satu proses penulis yang boleh berjalan, sehingga `transaksi.id` dan
+`detail_transaksi.id` bertambah sesuai urutan commit; watermark `FactCache`,
+`member_features.py`, dan `inventory_ledger.py` bergantung pada sifat ini.
+`PosIngestor.start()` memegang advisory lock `INGEST_LOCK_KEY` selama penulis hidup
+dan gagal jika proses ingest lain sudah memegangnya.
+
+Format pesan (JSON):
+    {"kunci": "POS-01-000123", "waktu_transaksi": "2024-05-01T08:15:00+07:00",
+     "id_toko": 1, "id_karyawan": 3, "id_member": null,
+     "items": [{"id_produk": 10, "jumlah": 2, "harga_saat_transaksi": "3500.00"}]}
+
+File spool (`*.json` berisi satu pesan atau list pesan, atau `*.jsonl`) harus ditulis
+atomik oleh produsen (tulis ke nama sementara lalu rename). File yang sedang diproses
+di-rename ke `*.proses` (diproses ulang setelah crash) dan dihapus setelah semua
+pesannya ter-commit; pesan yang
+ditolak ditulis ke `ditolak/<nama file>.jsonl` beserta alasannya.
+
+Jalankan `python pos_ingest.py spool` atau `python pos_ingest.py replay <output-dir generator>`.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import DateTime, Integer, Numeric, delete, exc, select, text
+
+from database import engine
+from models import DetailTransaksi, KunciIngest, Transaksi
+from partition_maintenance import is_partitioned
+
+BATCH_MAX = int(os.getenv('INGEST_BATCH_MAX', '500'))
+BATCH_WAIT = float(os.getenv('INGEST_BATCH_WAIT', '0.2'))
+QUEUE_MAX = int(os.getenv('INGEST_QUEUE_MAX', '5000'))
+SPOOL_DIR = os.getenv('INGEST_SPOOL_DIR', 'spool')
+RETRY_SECONDS = 2.0
+# Advisory lock PostgreSQL yang menjamin hanya ada satu proses penulis ingest.
+INGEST_LOCK_KEY = int(os.getenv('INGEST_LOCK_KEY', '7301'))
+
+logger = logging.getLogger(__name__)
+
+HEADER_COLUMNS = ('waktu_transaksi', 'id_toko', 'id_karyawan', 'id_member')
+ITEM_COLUMNS = ('id_produk', 'jumlah', 'harga_saat_transaksi')
+
+PosTransaksi = namedtuple('PosTransaksi', ['kunci', 'waktu_transaksi', 'id_toko', 'id_karyawan', 'id_member', 'items'])
+
+
+# --- VALIDASI ---
+
+def _coerce(column, value):
+    """Mengubah nilai JSON ke tipe kolom model; ValueError jika tidak sesuai."""
+    if value is None:
+        if not column.nullable:
+            raise ValueError(f"'{column.name}' wajib diisi.")
+        return None
+    if isinstance(column.type, Integer):
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError(f"'{column.name}' harus bilangan bulat.")
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"'{column.name}' harus bilangan bulat.") from None
+    if isinstance(column.type, Numeric):
+        try:
+            number = Decimal(str(value))
+        except InvalidOperation:
+            raise ValueError(f"'{column.name}' harus angka.") from None
+        scale, precision = column.type.scale or 0, column.type.precision
+        number = number.quantize(Decimal(1).scaleb(-scale))
+        if not number.is_finite() or (precision and len(number.as_tuple().digits) > precision):
+            raise ValueError(f"'{column.name}' melebihi NUMERIC({precision}, {scale}).")
+        return number
+    if isinstance(column.type, DateTime):
+        try:
+            return datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError(f"'{column.name}' harus waktu ISO 8601.") from None
+    return value
+
+
+class ReferenceCache:
+    """ID yang valid untuk setiap kolom foreign key header/item, dimuat dari tabel acuannya.
+
+    ID yang belum dikenal memicu muat ulang (paling sering sekali per `min_refresh_seconds`),
+    sehingga master data baru tetap diterima tanpa restart.
+    """
+
+    def __init__(self, min_refresh_seconds: float = 5.0):
+        self.columns = [
+            column for table, names in ((Transaksi.__table__, HEADER_COLUMNS), (DetailTransaksi.__table__, ITEM_COLUMNS))
+            for column in (table.c[name] for name in names) if column.foreign_keys
+        ]
+        self.min_refresh_seconds = min_refresh_seconds
+        self._ids = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        ids = {}
+        with engine.connect() as connection:
+            for column in self.columns:
+                target = next(iter(column.foreign_keys)).column
+                ids[column.name] = set(connection.execute(select(target)).scalars())
+        self._ids = ids
+        self._loaded_at = time.monotonic()
+
+    def check(self, column, value):
+        if value is None:
+            return
+        with self._lock:
+            if self._loaded_at is None:
+                self._load()
+            if value in self._ids[column.name]:
+                return
+            if time.monotonic() - self._loaded_at >= self.min_refresh_seconds:
+                self._load()
+                if value in self._ids[column.name]:
+                    return
+        raise ValueError(f"'{column.name}' {value} tidak ditemukan.")
+
+
+def validate(message: dict, references: ReferenceCache | None = None) -> PosTransaksi:
+    """Memvalidasi satu pesan POS terhadap model; ValueError berisi alasan penolakan."""
+    if not isinstance(message, dict):
+        raise ValueError("Pesan harus berupa objek JSON.")
+    kunci = message.get('kunci')
+    if not isinstance(kunci, str) or not kunci or len(kunci) > KunciIngest.kunci.type.length:
+        raise ValueError(f"'kunci' wajib berupa teks 1-{KunciIngest.kunci.type.length} karakter.")
+
+    header = {}
+    for name in HEADER_COLUMNS:
+        column = Transaksi.__table__.c[name]
+        value = message.get(name)
+        if value is None and name == 'waktu_transaksi':
+            value = datetime.now().isoformat()  # Sama dengan default kolom model.
+        header[name] = _coerce(column, value)
+        if references:
+            references.check(column, header[name])
+
+    items = message.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError("'items' wajib berisi minimal satu item.")
+    parsed = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Setiap item harus berupa objek JSON.")
+        row = []
+        for name in ITEM_COLUMNS:
+            column = DetailTransaksi.__table__.c[name]
+            value = _coerce(column, item.get(name))
+            if references:
+                references.check(column, value)
+            row.append(value)
+        if row[1] <= 0:
+            raise ValueError("'jumlah' harus lebih dari 0.")  # CheckConstraint('jumlah > 0') di model.
+        parsed.append(tuple(row))
+    return PosTransaksi(kunci, *(header[name] for name in HEADER_COLUMNS), parsed)
+
+
+# --- PENULISAN BATCH ---
+
+def build_batch_statement(with_detail_waktu: bool = False):
+    """Satu statement untuk seluruh batch: kunci baru -> header -> item, dengan id transaksi dialokasikan di awal.
+
+    `with_detail_waktu=True` untuk skema berpartisi, yang menyimpan waktu_transaksi di detail.
+    """
+    detail_column = ', waktu_transaksi' if with_detail_waktu else ''
+    detail_value = ', m.waktu' if with_detail_waktu else ''
+    detail_join = 'JOIN masuk m USING (kunci)' if with_detail_waktu else ''
+    return text(f"""
+        WITH masuk AS (
+            SELECT *
+            FROM unnest(CAST(:kunci AS varchar[]), CAST(:waktu AS timestamptz[]), CAST(:id_toko AS integer[]),
+                        CAST(:id_karyawan AS integer[]), CAST(:id_member AS integer[]))
+                AS m(kunci, waktu, id_toko, id_karyawan, id_member)
+        ),
+        baru AS (
+            INSERT INTO kunci_ingest (kunci, id_transaksi, diterima_pada)
+            SELECT kunci, nextval(pg_get_serial_sequence('transaksi', 'id')), now() FROM masuk
+            ON CONFLICT (kunci) DO NOTHING
+            RETURNING kunci, id_transaksi
+        ),
+        header AS (
+            INSERT INTO transaksi (id, waktu_transaksi, id_toko, id_karyawan, id_member)
+            SELECT b.id_transaksi, m.waktu, m.id_toko, m.id_karyawan, m.id_member
+            FROM baru b JOIN masuk m USING (kunci)
+            ORDER BY b.id_transaksi
+            RETURNING id
+        ),
+        item AS (
+            INSERT INTO detail_transaksi (id_transaksi, id_produk, jumlah, harga_saat_transaksi{detail_column})
+            SELECT b.id_transaksi, i.id_produk, i.jumlah, i.harga{detail_value}
+            FROM unnest(CAST(:item_kunci AS varchar[]), CAST(:item_produk AS integer[]),
+                        CAST(:item_jumlah AS integer[]), CAST(:item_harga AS numeric[]))
+                WITH ORDINALITY AS i(kunci, id_produk, jumlah, harga, urutan)
+            JOIN baru b USING (kunci) {detail_join}
+            ORDER BY b.id_transaksi, i.urutan
+            RETURNING 1
+        )
+        SELECT (SELECT count(*) FROM header) AS transaksi, (SELECT count(*) FROM item) AS detail
+    """)
+
+
+def batch_params(records: list[PosTransaksi]) -> dict:
+    params = {name: [] for name in ('kunci', 'waktu', 'id_toko', 'id_karyawan', 'id_member',
+                                    'item_kunci', 'item_produk', 'item_jumlah', 'item_harga')}
+    for record in records:
+        params['kunci'].append(record.kunci)
+        params['waktu'].append(record.waktu_transaksi)
+        params['id_toko'].append(record.id_toko)
+        params['id_karyawan'].append(record.id_karyawan)
+        params['id_member'].append(record.id_member)
+        for id_produk, jumlah, harga in record.items:
+            params['item_kunci'].append(record.kunci)
+            params['item_produk'].append(id_produk)
+            params['item_jumlah'].append(jumlah)
+            params['item_harga'].append(harga)
+    return params
+
+
+def purge_keys(older_than_days: int) -> int:
+    """Menghapus kunci idempotensi yang lebih tua dari jendela pengiriman ulang."""
+    with engine.begin() as connection:
+        return connection.execute(
+            delete(KunciIngest).where(KunciIngest.diterima_pada < datetime.now() - timedelta(days=older_than_days))
+        ).rowcount
+
+
+# --- METRIK ---
+
+class IngestMetrics:
+    """Penghitung ingest dan latensi commit per batch (aman dipakai dari banyak thread)."""
+
+    def __init__(self, window_seconds: float = 60.0, max_samples: int = 2048):
+        self.window_seconds = window_seconds
+        self.started = time.monotonic()
+        self.counts = dict.fromkeys(['diterima', 'ditulis', 'duplikat', 'ditolak', 'detail', 'batch', 'retry'], 0)
+        self._latencies = deque(maxlen=max_samples)
+        self._recent = deque()  # (waktu commit, transaksi ditulis)
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.counts[name] += value
+
+    def record_batch(self, seconds: float, written: int, duplicates: int, details: int):
+        now = time.monotonic()
+        with self._lock:
+            self.counts['batch'] += 1
+            self.counts['ditulis'] += written
+            self.counts['duplikat'] += duplicates
+            self.counts['detail'] += details
+            self._latencies.append(seconds)
+            self._recent.append((now, written))
+            while self._recent and self._recent[0][0] < now - self.window_seconds:
+                self._recent.popleft()
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            recent = sum(written for at, written in self._recent if at >= now - self.window_seconds)
+            snapshot = dict(self.counts)
+        elapsed = min(self.window_seconds, now - self.started)
+        snapshot.update({
+            'transaksi_per_detik': recent / elapsed if elapsed > 0 else 0.0,
+            'commit_p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else None,
+            'commit_p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        })
+        return snapshot
+
+
+# --- INGESTOR ---
+
+class PosIngestor:
+    """Antrean berbatas + satu thread penulis micro-batch.
+
+    `ack(ok, error)` opsional dipanggil per pesan setelah batch-nya ter-commit (ok=True,
+    termasuk duplikat) atau ditolak (ok=False).
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_max: int = BATCH_MAX, batch_wait: float = BATCH_WAIT, queue_max: int = QUEUE_MAX):
+        self.batch_max = batch_max
+        self.batch_wait = batch_wait
+        self.references = ReferenceCache()
+        self._metrics = IngestMetrics()
+        self._queue = queue.Queue(maxsize=queue_max)
+        self._statement = None
+        self._thread = None
+        self._lock_connection = None
+
+    def start(self) -> 'PosIngestor':
+        """Mengambil lock penulis tunggal lalu menjalankan thread penulis (RuntimeError jika lock dipegang proses lain)."""
+        connection = engine.connect()
+        locked = connection.execute(text("SELECT pg_try_advisory_lock(:kunci)"), {'kunci': INGEST_LOCK_KEY}).scalar()
+        connection.commit()
+        if not locked:
+            connection.close()
+            raise RuntimeError("Proses ingest POS lain sedang berjalan; hanya satu penulis yang diizinkan.")
+        self._lock_connection = connection
+        with engine.connect() as connection:
+            self._statement = build_batch_statement(is_partitioned(connection, 'detail_transaksi'))
+        self._thread = threading.Thread(target=self._run, name='pos-ingest', daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(self, message: dict, ack=None, timeout: float | None = None) -> bool:
+        """Memvalidasi lalu mengantrekan pesan; memblokir selama antrean penuh (queue.Full jika `timeout` habis)."""
+        try:
+            record = validate(message, self.references)
+        except ValueError as error:
+            self._metrics.add(ditolak=1)
+            if ack:
+                ack(False, str(error))
+            return False
+        self._queue.put((record, ack), timeout=timeout)
+        self._metrics.add(diterima=1)
+        return True
+
+    def close(self):
+        """Menulis sisa antrean lalu menghentikan thread penulis."""
+        if self._thread is not None:
+            self._queue.put(self._STOP)
+            self._thread.join()
+            self._thread = None
+        if self._lock_connection is not None:
+            self._lock_connection.execute(text("SELECT pg_advisory_unlock(:kunci)"), {'kunci': INGEST_LOCK_KEY})
+            self._lock_connection.close()
+            self._lock_connection = None
+
+    def metrics(self) -> dict:
+        snapshot = self._metrics.snapshot()
+        snapshot['antrean'] = self._queue.qsize()
+        return snapshot
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is self._STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_max:
+                try:
+                    entry = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if entry is self._STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            try:
+                self._write(batch)
+            except Exception as error:
+                # Thread penulis harus tetap hidup; tanpanya antrean penuh dan submit() memblokir selamanya.
+                logger.exception("Batch ingest POS gagal ditulis")
+                self._metrics.add(ditolak=len(batch))
+                for _, ack in batch:
+                    if ack:
+                        try:
+                            ack(False, str(error))
+                        except Exception:
+                            logger.exception("Callback ack ingest POS gagal")
+
+    def _write(self, batch: list):
+        # Kunci ganda dalam satu batch: hanya kemunculan pertama yang dikirim, sisanya dihitung duplikat.
+        records, seen = [], set()
+        for record, _ in batch:
+            if record.kunci not in seen:
+                seen.add(record.kunci)
+                records.append(record)
+        while True:
+            started = time.perf_counter()
+            try:
+                with engine.begin() as connection:
+                    written, details = connection.execute(self._statement, batch_params(records)).one()
+                break
+            except (exc.IntegrityError, exc.DataError):
+                # Satu pesan bermasalah tidak boleh menggagalkan batch lain: tulis satu per satu.
+                self._write_individually(batch)
+                return
+            except exc.OperationalError:
+                # Database tidak bisa dihubungi: tahan batch ini (antrean penuh = back-pressure) lalu coba lagi.
+                self._metrics.add(retry=1)
+                time.sleep(RETRY_SECONDS)
+        self._metrics.record_batch(time.perf_counter() - started, written, len(batch) - written, details)
+        for _, ack in batch:
+            if ack:
+                ack(True, None)
+
+    def _write_individually(self, batch: list):
+        for record, ack in batch:
+            while True:
+                started = time.perf_counter()
+                try:
+                    with engine.begin() as connection:
+                        written, details = connection.execute(self._statement, batch_params([record])).one()
+                    break
+                except (exc.IntegrityError, exc.DataError) as error:
+                    written = None
+                    self._metrics.add(ditolak=1)
+                    if ack:
+                        ack(False, str(error.orig).strip())
+                    break
+                except exc.OperationalError:
+                    self._metrics.add(retry=1)
+                    time.sleep(RETRY_SECONDS)
+            if written is None:
+                continue
+            self._metrics.record_batch(time.perf_counter() - started, written, 1 - written, details)
+            if ack:
+                ack(True, None)
+
+
+# --- SUMBER: FOLDER SPOOL ---
+
+class _SpoolFile:
+    """Melacak pesan satu file spool; file dihapus setelah semua pesannya selesai diproses."""
+
+    def __init__(self, path: str, rejected_dir: str):
+        self.path = path
+        self.rejected_dir = rejected_dir
+        self.pending = 1  # Ditahan sampai seluruh file selesai dibaca.
+        self.rejected = []
+        self._lock = threading.Lock()
+
+    def add(self):
+        with self._lock:
+            self.pending += 1
+
+    def ack(self, message):
+        def callback(ok, error):
+            with self._lock:
+                if not ok:
+                    self.rejected.append({'alasan': error, 'pesan': message})
+                self.pending -= 1
+                done = self.pending == 0
+            if done:
+                self._finish()
+        return callback
+
+    def read_done(self):
+        self.ack(None)(True, None)
+
+    def _finish(self):
+        if self.rejected:
+            os.makedirs(self.rejected_dir, exist_ok=True)
+            name = os.path.splitext(os.path.basename(self.path).rsplit('.proses', 1)[0])[0]
+            with open(os.path.join(self.rejected_dir, f'{name}.jsonl'), 'a', encoding='utf-8') as f:
+                for entry in self.rejected:
+                    f.write(json.dumps(entry, default=str) + '\n')
+        os.remove(self.path)
+
+
+def _read_messages(path: str):
+    with open(path, encoding='utf-8') as f:
+        if path.rsplit('.proses', 1)[0].endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        content = json.load(f)
+    yield from content if isinstance(content, list) else [content]
+
+
+def run_spool(ingestor: PosIngestor, directory: str = SPOOL_DIR, poll_seconds: float = 1.0,
+              stop: threading.Event | None = None):
+    """Memproses file spool terus-menerus; file `*.proses` sisa crash sebelumnya diproses ulang lebih dulu."""
+    stop = stop or threading.Event()
+    rejected_dir = os.path.join(directory, 'ditolak')
+    os.makedirs(directory, exist_ok=True)
+    pending = sorted(glob.glob(os.path.join(directory, '*.proses')))
+    while not stop.is_set():
+        fresh = glob.glob(os.path.join(directory, '*.json')) + glob.glob(os.path.join(directory, '*.jsonl'))
+        for path in pending + sorted(fresh):
+            if not path.endswith('.proses'):
+                claimed = path + '.proses'
+                try:
+                    os.replace(path, claimed)
+                except FileNotFoundError:
+                    continue  # Dihapus produsen di antara glob dan rename.
+                path = claimed
+            tracker = _SpoolFile(path, rejected_dir)
+            try:
+                for message in _read_messages(path):
+                    tracker.add()
+                    ingestor.submit(message, tracker.ack(message))
+            except json.JSONDecodeError as error:
+                tracker.add()
+                tracker.ack(None)(False, f"File JSON tidak valid: {error}")
+            tracker.read_done()
+        pending = []
+        stop.wait(poll_seconds)
+
+
+# --- SUMBER: REPLAY OUTPUT GENERATOR ---
+
+def frames_to_messages(df_transaksi: pd.DataFrame, df_detail: pd.DataFrame, prefix: str):
+    """Mengubah pasangan frame transaksi/detail (format data_generator) menjadi pesan POS.
+
+    ID transaksi dari generator hanya dipakai sebagai kunci idempotensi; ID di database
+    dialokasikan oleh pipeline.
+    """
+    df_detail = df_detail.sort_values('id_transaksi', kind='stable')
+    detail_ids = df_detail['id_transaksi'].to_numpy()
+    produk, jumlah, harga = (df_detail[col].to_numpy() for col in ITEM_COLUMNS)
+    for row in df_transaksi.itertuples(index=False):
+        start, end = np.searchsorted(detail_ids, [row.id, row.id + 1])
+        yield {
+            'kunci': f'{prefix}-{row.id}',
+            'waktu_transaksi': pd.Timestamp(row.waktu_transaksi).isoformat(),
+            'id_toko': int(row.id_toko),
+            'id_karyawan': int(row.id_karyawan),
+            'id_member': None if pd.isna(row.id_member) else int(row.id_member),
+            'items': [{'id_produk': int(produk[i]), 'jumlah': int(jumlah[i]), 'harga_saat_transaksi': str(harga[i])}
+                      for i in range(start, end)],
+        }
+
+
+def replay_generator_output(ingestor: PosIngestor, directory: str, rate: float | None = None) -> int:
+    """Memutar ulang CSV shard dari `data_generator.py --output-dir` lewat pipeline.
+
+    `rate` membatasi jumlah transaksi per detik; tanpa `rate`, kecepatan hanya dibatasi
+    back-pressure antrean. Master data (toko, produk, ...) harus sudah dimuat.
+    """
+    sent = 0
+    started = time.monotonic()
+    for path in sorted(glob.glob(os.path.join(directory, 'transaksi_*.csv'))):
+        name = os.path.basename(path)
+        df_transaksi = pd.read_csv(path, parse_dates=['waktu_transaksi'])
+        df_detail = pd.read_csv(os.path.join(directory, f'detail_{name}'))
+        for message in frames_to_messages(df_transaksi, df_detail, prefix=f'replay-{name[:-4]}'):
+            ingestor.submit(message)
+            sent += 1
+            if rate:
+                delay = sent / rate - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+    return sent
+
+
+def _report(metrics: dict):
+    p99 = f"{metrics['commit_p99_ms']:.1f}" if metrics['commit_p99_ms'] is not None else '-'
+    print(f"   {metrics['ditulis']:,} ditulis, {metrics['duplikat']:,} duplikat, {metrics['ditolak']:,} ditolak | "
+          f"{metrics['transaksi_per_detik']:,.0f} transaksi/dtk | commit p99 {p99} ms | antrean {metrics['antrean']:,}")
+
+
+def _write_metrics(path: str, metrics: dict):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(metrics, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest transaksi POS dalam micro-batch.")
+    parser.add_argument('command', choices=['spool', 'replay', 'purge'])
+    parser.add_argument('path', nargs='?', help="Folder spool (spool) atau folder output generator (replay)")
+    parser.add_argument('--batch', type=int, default=BATCH_MAX, help="Maksimum transaksi per batch")
+    parser.add_argument('--tunggu', type=float, default=BATCH_WAIT, help="Maksimum waktu mengumpulkan satu batch (detik)")
+    parser.add_argument('--antrean', type=int, default=QUEUE_MAX, help="Kapasitas antrean sebelum produsen diblokir")
+    parser.add_argument('--laju', type=float, default=None, help="Batas transaksi per detik untuk replay")
+    parser.add_argument('--interval-metrik', type=float, default=5.0, help="Jeda antar laporan metrik (detik)")
+    parser.add_argument('--metrics-file', default=None, help="Tulis snapshot metrik JSON ke file ini")
+    parser.add_argument('--hari', type=int, default=7, help="Umur kunci idempotensi yang dihapus oleh purge (hari)")
+    args = parser.parse_args()
+
+    if args.command == 'purge':
+        print(f"✅ {purge_keys(args.hari)} kunci idempotensi dihapus.")
+        parser.exit()
+    if args.command == 'replay' and not args.path:
+        parser.error("replay membutuhkan folder output data_generator.py --output-dir")
+
+    try:
+        ingestor = PosIngestor(args.batch, args.tunggu, args.antrean).start()
+    except RuntimeError as error:
+        parser.exit(1, f"{error}\n")
+    stop = threading.Event()
+
+    def report_metrics():
+        while not stop.wait(args.interval_metrik):
+            metrics = ingestor.metrics()
+            _report(metrics)
+            if args.metrics_file:
+                _write_metrics(args.metrics_file, metrics)
+
+    threading.Thread(target=report_metrics, name='pos-ingest-metrik', daemon=True).start()
+    try:
+        if args.command == 'spool':
+            run_spool(ingestor, args.path or SPOOL_DIR, stop=stop)
+        else:
+            replay_generator_output(ingestor, args.path, args.laju)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        ingestor.close()
+    metrics = ingestor.metrics()
+    _report(metrics)
+    if args.metrics_file:
+        _write_metrics(args.metrics_file, metrics)
+    print(f"✅ {metrics['ditulis']:,} transaksi dan {metrics['detail']:,} detail berhasil di-ingest.")
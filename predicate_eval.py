@@ -0,0 +1,177 @@
+# predicate_eval.py
+"""Evaluator pohon aturan yang bekerja langsung dari JSON condition tree.
+
+Pengganti `fix_query_for_pandas()` + `df.query()`: pohon tidak lagi diubah menjadi
+string lalu di-parse ulang. Setiap pohon dikompilasi menjadi rencana (plan) berisi
+operasi mask boolean NumPy per rule. Plan di-cache dalam LRU berdasarkan bentuk
+pohon (struktur group, field dan operator), sedangkan nilai rule dikirim sebagai
+parameter, sehingga mengetik nilai baru di builder tidak memicu kompilasi ulang.
+"""
+import functools
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from segment_rules import children_of, group_parts, has_rules, is_group, rule_parts
+
+# Hasil pengukuran waktu per rule: path di dalam pohon, field, operator, detik, dan jumlah baris lolos.
+RuleTiming = namedtuple('RuleTiming', ['path', 'field', 'operator', 'seconds', 'matched'])
+
+# Operator yang meloloskan nilai NULL (mengikuti perilaku pandas pada "tidak sama dengan").
+NULL_PASSING_OPERATORS = {
+    'is_null', 'is_empty', 'not_equal', 'select_not_equals',
+    'select_not_any_in', 'multiselect_not_equals', 'multiselect_not_contains',
+}
+
+
+# --- KERNEL PER OPERATOR ---
+# Setiap kernel menerima (values, isnull, args, is_text) dan mengembalikan mask boolean.
+
+def _isin(values: np.ndarray, items: list) -> np.ndarray:
+    return pd.Series(values).isin(items).to_numpy()
+
+
+def _items(args: list) -> list:
+    return args[0] if isinstance(args[0], list) else args
+
+
+def _on_present(compare):
+    """Membungkus kernel agar hanya dievaluasi pada nilai yang tidak NULL; NULL tidak pernah lolos."""
+    def kernel(values, isnull, args, is_text):
+        result = np.zeros(len(values), dtype=bool)
+        result[~isnull] = np.asarray(compare(values[~isnull], args), dtype=bool)
+        return result
+    return kernel
+
+
+def _text(present: np.ndarray):
+    return pd.Series(present, dtype='object').astype(str).str
+
+
+def _empty(values, isnull, is_text):
+    return isnull | (values == '') if is_text else isnull
+
+
+def _between(present, args):
+    return (present >= args[0]) & (present <= args[1])
+
+
+KERNELS = {
+    'is_null': lambda values, isnull, args, is_text: isnull,
+    'is_not_null': lambda values, isnull, args, is_text: ~isnull,
+    'is_empty': lambda values, isnull, args, is_text: _empty(values, isnull, is_text),
+    'is_not_empty': lambda values, isnull, args, is_text: ~_empty(values, isnull, is_text),
+    'equal': lambda values, isnull, args, is_text: _isin(values, [args[0]]),
+    'not_equal': lambda values, isnull, args, is_text: ~_isin(values, [args[0]]),
+    'select_any_in': lambda values, isnull, args, is_text: _isin(values, _items(args)),
+    'select_not_any_in': lambda values, isnull, args, is_text: ~_isin(values, _items(args)),
+    'less': _on_present(lambda present, args: present < args[0]),
+    'less_or_equal': _on_present(lambda present, args: present <= args[0]),
+    'greater': _on_present(lambda present, args: present > args[0]),
+    'greater_or_equal': _on_present(lambda present, args: present >= args[0]),
+    'between': _on_present(_between),
+    'not_between': _on_present(lambda present, args: ~_between(present, args)),
+    'like': _on_present(lambda present, args: _text(present).contains(str(args[0]), regex=False)),
+    'not_like': _on_present(lambda present, args: ~_text(present).contains(str(args[0]), regex=False)),
+    'starts_with': _on_present(lambda present, args: _text(present).startswith(str(args[0]))),
+    'ends_with': _on_present(lambda present, args: _text(present).endswith(str(args[0]))),
+}
+KERNELS['select_equals'] = KERNELS['equal']
+KERNELS['select_not_equals'] = KERNELS['not_equal']
+KERNELS['multiselect_equals'] = KERNELS['multiselect_contains'] = KERNELS['select_any_in']
+KERNELS['multiselect_not_equals'] = KERNELS['multiselect_not_contains'] = KERNELS['select_not_any_in']
+
+
+def _coerce_args(series: pd.Series, args: list) -> list:
+    """Menyesuaikan nilai dari widget dengan tipe kolom (mis. string tanggal -> datetime64)."""
+    dtype = series.dtype.categories.dtype if isinstance(series.dtype, pd.CategoricalDtype) else series.dtype
+    if not pd.api.types.is_datetime64_any_dtype(dtype):
+        return args
+    convert = lambda v: np.datetime64(pd.Timestamp(v).tz_localize(None))
+    return [[convert(x) for x in v] if isinstance(v, list) else convert(v) for v in args]
+
+
+def apply_kernel(series: pd.Series, operator: str, kernel, args: list) -> np.ndarray:
+    """Menjalankan kernel pada satu kolom.
+
+    Untuk kolom kategorikal, kernel dievaluasi sekali pada kamus kategori
+    (beberapa puluh nilai), lalu hasilnya dipetakan ke baris melalui kode integer.
+    """
+    args = _coerce_args(series, args)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories.to_numpy(dtype=object)
+        per_category = kernel(categories, pd.isna(categories), args, True)
+        # Kode -1 berarti NULL; hasilnya diwakili oleh elemen terakhir pada lookup.
+        lookup = np.append(per_category, operator in NULL_PASSING_OPERATORS)
+        return lookup[series.cat.codes.to_numpy()]
+    values = series.to_numpy()
+    return kernel(values, pd.isna(values), args, pd.api.types.is_string_dtype(series.dtype))
+
+
+# --- KOMPILASI PLAN ---
+
+def tree_shape(tree: dict | None, params: list | None = None):
+    """Mengembalikan (shape, params): kunci cache yang hashable dan nilai rule secara berurutan."""
+    params = [] if params is None else params
+    if not tree or not has_rules(tree):
+        return ('TRUE',), params
+    if not is_group(tree):
+        field, operator, values = rule_parts(tree)
+        params.append(values)
+        return ('RULE', field, operator, len(params) - 1), params
+    conjunction, negate = group_parts(tree)
+    children = tuple(tree_shape(child, params)[0] for child in children_of(tree) if has_rules(child))
+    return ('GROUP', conjunction, negate, children), params
+
+
+def _compile(shape, path: str):
+    kind = shape[0]
+    if kind == 'TRUE':
+        return lambda df, params, timings: np.ones(len(df), dtype=bool)
+    if kind == 'RULE':
+        _, field, operator, slot = shape
+        kernel = KERNELS.get(operator)
+        if kernel is None:
+            raise ValueError(f"Operator '{operator}' belum didukung.")
+
+        def run_rule(df, params, timings):
+            if field not in df:
+                raise ValueError(f"Field '{field}' tidak dikenal.")
+            started = time.perf_counter()
+            mask = apply_kernel(df[field], operator, kernel, params[slot])
+            if timings is not None:
+                timings.append(RuleTiming(path, field, operator, time.perf_counter() - started, int(mask.sum())))
+            return mask
+        return run_rule
+
+    _, conjunction, negate, children = shape
+    compiled = [_compile(child, f"{path}.{i}") for i, child in enumerate(children)]
+    combine = np.logical_or if conjunction == 'OR' else np.logical_and
+
+    def run_group(df, params, timings):
+        mask = compiled[0](df, params, timings)
+        for child in compiled[1:]:
+            mask = combine(mask, child(df, params, timings))
+        return ~mask if negate else mask
+    return run_group
+
+
+@functools.lru_cache(maxsize=256)
+def compile_plan(shape):
+    """Mengompilasi bentuk pohon menjadi fungsi `plan(df, params, timings) -> mask` (di-cache LRU)."""
+    return _compile(shape, '0')
+
+
+def evaluate_tree(df: pd.DataFrame, tree: dict | None, timings: list | None = None) -> np.ndarray:
+    """Mengevaluasi pohon aturan pada frame fakta dan mengembalikan mask boolean per baris.
+
+    Jika `timings` berupa list, setiap rule menambahkan satu `RuleTiming`.
+    """
+    shape, params = tree_shape(tree)
+    return compile_plan(shape)(df, params, timings)
+
+
+def plan_cache_info():
+    return compile_plan.cache_info()
@@ -0,0 +1,165 @@
+# sample_preview.py
+"""Pratinjau cepat "Estimated Total Sales" dari sampel berstrata baris item.
+
+Baris frame fakta distratifikasi per (toko, bulan transaksi), lalu dari setiap
+strata diambil sampel acak sederhana tanpa pengembalian. Total per produk
+diestimasi dengan estimator Horvitz-Thompson berstrata (bobot N_h / n_h), dengan
+interval kepercayaan 95% dari varians estimator berstrata (termasuk koreksi
+populasi hingga). Jawaban pasti dihitung di latar belakang oleh `ExactEstimator`
+dan menggantikan pratinjau setelah selesai.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from predicate_eval import evaluate_tree
+from segment_rules import tree_fields
+
+SAMPLE_FRACTION = float(os.getenv('PREVIEW_SAMPLE_FRACTION', '0.02'))
+MIN_PER_STRATUM = 20
+Z_95 = 1.96
+
+
+class StratifiedSample:
+    """Sampel berstrata dari frame fakta beserta ukuran populasi (N_h) dan sampel (n_h) setiap strata."""
+
+    def __init__(self, df: pd.DataFrame, fraction: float = SAMPLE_FRACTION,
+                 min_per_stratum: int = MIN_PER_STRATUM, seed: int = 0):
+        months = df['waktu_transaksi'].dt.year.to_numpy() * 12 + df['waktu_transaksi'].dt.month.to_numpy()
+        month_codes, _ = pd.factorize(months)
+        store_codes, _ = pd.factorize(df['nama_toko'])
+        strata, _ = pd.factorize(store_codes.astype(np.int64) * (month_codes.max(initial=0) + 1) + month_codes)
+
+        self.population = np.bincount(strata).astype(np.int64)
+        self.size = np.minimum(
+            np.maximum(np.ceil(fraction * self.population).astype(np.int64), min_per_stratum),
+            self.population,
+        )
+        # Urutan acak di dalam setiap strata; n_h baris pertama dari setiap strata diambil.
+        rng = np.random.default_rng(seed)
+        order = np.lexsort((rng.random(len(df)), strata))
+        starts = np.concatenate(([0], np.cumsum(self.population)[:-1]))
+        position = np.arange(len(df)) - starts[strata[order]]
+        picked = np.sort(order[position < self.size[strata[order]]])
+
+        self.frame = df.iloc[picked].reset_index(drop=True)
+        self.strata = strata[picked]
+        self.source_rows = len(df)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def supports(self, tree: dict | None) -> bool:
+        """Sampel hanya bisa menjawab pohon yang semua field-nya ada di frame fakta."""
+        return all(field in self.frame for field in tree_fields(tree))
+
+    def estimate(self, tree: dict | None, value: str = 'jumlah_item', by: str = 'nama_produk'):
+        """Estimasi total `value` per `by` untuk baris yang cocok dengan pohon aturan.
+
+        Mengembalikan (DataFrame [by, value, 'ci'], total, ci total) dengan `ci` adalah
+        setengah lebar interval kepercayaan 95%.
+        """
+        mask = evaluate_tree(self.frame, tree)
+        y = np.where(mask, self.frame[value].to_numpy(dtype='float64'), 0.0)
+        codes, labels = pd.factorize(self.frame[by])
+        n_strata, n_groups = len(self.population), len(labels)
+
+        # Jumlah dan jumlah kuadrat per (strata, kelompok); setiap baris hanya masuk satu kelompok,
+        # jadi total per strata cukup dijumlahkan dari matriks yang sama.
+        cell = self.strata.astype(np.int64) * n_groups + codes
+        sums = np.bincount(cell, weights=y, minlength=n_strata * n_groups).reshape(n_strata, n_groups)
+        squares = np.bincount(cell, weights=y * y, minlength=n_strata * n_groups).reshape(n_strata, n_groups)
+
+        N = self.population[:, None].astype('float64')
+        n = self.size[:, None].astype('float64')
+        point = (N / n * sums).sum(axis=0)
+        group_var = self._variance(sums, squares, N, n).sum(axis=0)
+        total = float(point.sum())
+        total_var = float(self._variance(sums.sum(axis=1, keepdims=True), squares.sum(axis=1, keepdims=True),
+                                         N, n).sum())
+
+        result = pd.DataFrame({by: labels, value: np.rint(point).astype('int64'), 'ci': Z_95 * np.sqrt(group_var)})
+        return result[result[value] > 0].reset_index(drop=True), total, Z_95 * np.sqrt(total_var)
+
+    @staticmethod
+    def _variance(sums, squares, N, n):
+        """Varians estimator total per strata: N_h^2 (1 - n_h/N_h) s_h^2 / n_h."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            s2 = np.where(n > 1, (squares - sums * sums / n) / (n - 1), 0.0)
+        return N * N * (1 - n / N) * np.maximum(s2, 0.0) / n
+
+
+class SampleCache:
+    """Sampel berstrata yang dibangun ulang hanya jika frame fakta sumbernya berganti."""
+
+    def __init__(self, fraction: float = SAMPLE_FRACTION):
+        self.fraction = fraction
+        self._source = None
+        self._sample = None
+        self._lock = threading.Lock()
+
+    def get(self, df: pd.DataFrame) -> StratifiedSample:
+        with self._lock:
+            if self._source is not df:
+                self._sample = StratifiedSample(df, self.fraction)
+                self._source = df
+            return self._sample
+
+
+class ExactEstimator:
+    """Menjalankan `compute` di thread latar belakang; hasil disimpan per argumen selama `ttl_seconds`.
+
+    `watermark` (opsional) dipanggil setiap `submit` dan ikut menjadi kunci cache, sehingga
+    hasil dihitung ulang begitu data sumbernya maju. Hasil yang gagal hanya disimpan selama
+    `retry_seconds` (agar rerun UI tidak mengulang query yang gagal terus-menerus); sesudah itu
+    `submit` dengan argumen yang sama menjalankan `compute` lagi.
+    """
+
+    def __init__(self, compute, max_workers: int = 2, ttl_seconds: float = 600, max_entries: int = 64,
+                 watermark=None, retry_seconds: float = 30):
+        self.compute = compute
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self.max_entries = max_entries
+        self.watermark = watermark
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='estimasi')
+        self._futures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, *args) -> Future:
+        version = self.watermark() if self.watermark is not None else None
+        key = json.dumps([version, args], sort_keys=True, default=str)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._futures.get(key)
+            if entry is not None and now - entry[1] < self.ttl_seconds:
+                self._futures.move_to_end(key)
+                return entry[0]
+            future = self._executor.submit(self.compute, *args)
+            self._futures[key] = (future, now)
+            self._futures.move_to_end(key)
+            # Hasil lama yang sudah selesai dibuang; yang masih berjalan dibiarkan selesai.
+            while len(self._futures) > self.max_entries:
+                oldest_key, (oldest, _) = next(iter(self._futures.items()))
+                if not oldest.done():
+                    break
+                del self._futures[oldest_key]
+        # Di luar lock: callback langsung dijalankan di thread ini jika future sudah selesai.
+        future.add_done_callback(lambda done: self._expire_failed(key, done))
+        return future
+
+    def _expire_failed(self, key: str, future: Future):
+        if future.cancelled() or future.exception() is None:
+            return
+        with self._lock:
+            entry = self._futures.get(key)
+            if entry is not None and entry[0] is future:
+                # Umur entri dimajukan sehingga kedaluwarsa `retry_seconds` dari sekarang.
+                self._futures[key] = (future, time.monotonic() - self.ttl_seconds + self.retry_seconds)
+
@@ -0,0 +1,175 @@
+# segment_bitmap.py
+"""Bitmap terkompresi bergaya Roaring untuk menyimpan keanggotaan segmen.
+
+ID 32-bit dibagi per 16 bit atas (key). Setiap key memiliki satu container:
+- container array: `uint16` terurut, dipakai jika isinya <= 4096 nilai;
+- container bitmap: 1024 x `uint64` (65536 bit), dipakai jika lebih padat.
+Operasi AND/OR/ANDNOT dilakukan per container sehingga tidak perlu mengevaluasi ulang predikat.
+"""
+import struct
+
+import numpy as np
+
+ARRAY_MAX = 4096
+_BITSET_WORDS = 1024
+_HEADER = b'RBM1'
+
+
+def _popcount(bitset: np.ndarray) -> int:
+    return int(np.unpackbits(bitset.view(np.uint8)).sum())
+
+
+def _array_to_bitset(values: np.ndarray) -> np.ndarray:
+    bits = np.zeros(65536, dtype=bool)
+    bits[values] = True
+    return np.packbits(bits, bitorder='little').view(np.uint64)
+
+
+def _bitset_to_array(bitset: np.ndarray) -> np.ndarray:
+    bits = np.unpackbits(bitset.view(np.uint8), bitorder='little')
+    return np.flatnonzero(bits).astype(np.uint16)
+
+
+def _is_bitset(container: np.ndarray) -> bool:
+    return container.dtype == np.uint64
+
+
+def _normalize(container: np.ndarray) -> np.ndarray | None:
+    """Memilih representasi container yang paling hemat; None jika kosong."""
+    if _is_bitset(container):
+        if _popcount(container) <= ARRAY_MAX:
+            container = _bitset_to_array(container)
+        else:
+            return container
+    if len(container) == 0:
+        return None
+    return container if len(container) <= ARRAY_MAX else _array_to_bitset(container)
+
+
+def _cardinality(container: np.ndarray) -> int:
+    return _popcount(container) if _is_bitset(container) else len(container)
+
+
+class RoaringBitmap:
+    """Himpunan ID integer 32-bit tak bertanda yang terkompresi."""
+
+    def __init__(self, containers: dict | None = None):
+        self._containers = containers or {}
+
+    @classmethod
+    def from_array(cls, values) -> 'RoaringBitmap':
+        values = np.unique(np.asarray(values, dtype=np.uint32))
+        if len(values) == 0:
+            return cls()
+        high = (values >> 16).astype(np.uint16)
+        low = (values & 0xFFFF).astype(np.uint16)
+        keys, starts = np.unique(high, return_index=True)
+        ends = np.append(starts[1:], len(values))
+        containers = {}
+        for key, start, end in zip(keys.tolist(), starts, ends):
+            containers[key] = _normalize(low[start:end].copy())
+        return cls(containers)
+
+    def __len__(self) -> int:
+        return sum(_cardinality(c) for c in self._containers.values())
+
+    def __bool__(self) -> bool:
+        return bool(self._containers)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, RoaringBitmap) and np.array_equal(self.to_array(), other.to_array())
+
+    def to_array(self) -> np.ndarray:
+        """Mengembalikan semua ID sebagai array `uint32` terurut."""
+        parts = []
+        for key in sorted(self._containers):
+            container = self._containers[key]
+            low = _bitset_to_array(container) if _is_bitset(container) else container
+            parts.append((np.uint32(key) << np.uint32(16)) | low.astype(np.uint32))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.uint32)
+
+    def contains_many(self, ids) -> np.ndarray:
+        """Mask boolean: apakah setiap ID pada `ids` termasuk di dalam bitmap."""
+        members = self.to_array()
+        ids = np.asarray(ids)
+        if len(members) == 0:
+            return np.zeros(len(ids), dtype=bool)
+        pos = np.searchsorted(members, ids)
+        pos[pos == len(members)] = 0
+        return members[pos] == ids
+
+    # --- OPERASI HIMPUNAN ---
+
+    def _combine(self, other: 'RoaringBitmap', op: str) -> 'RoaringBitmap':
+        if op == 'and':
+            keys = self._containers.keys() & other._containers.keys()
+        elif op == 'or':
+            keys = self._containers.keys() | other._containers.keys()
+        else:
+            keys = self._containers.keys()
+        result = {}
+        for key in keys:
+            a, b = self._containers.get(key), other._containers.get(key)
+            if b is None:
+                merged = a if op != 'and' else None
+            elif a is None:
+                merged = b if op == 'or' else None
+            elif not _is_bitset(a) and not _is_bitset(b):
+                if op == 'and':
+                    merged = np.intersect1d(a, b, assume_unique=True)
+                elif op == 'or':
+                    merged = np.union1d(a, b)
+                else:
+                    merged = np.setdiff1d(a, b, assume_unique=True)
+                merged = _normalize(merged.astype(np.uint16))
+            else:
+                a_bits = a if _is_bitset(a) else _array_to_bitset(a)
+                b_bits = b if _is_bitset(b) else _array_to_bitset(b)
+                if op == 'and':
+                    merged = a_bits & b_bits
+                elif op == 'or':
+                    merged = a_bits | b_bits
+                else:
+                    merged = a_bits & ~b_bits
+                merged = _normalize(merged)
+            if merged is not None:
+                result[key] = merged
+        return RoaringBitmap(result)
+
+    def __and__(self, other: 'RoaringBitmap') -> 'RoaringBitmap':
+        return self._combine(other, 'and')
+
+    def __or__(self, other: 'RoaringBitmap') -> 'RoaringBitmap':
+        return self._combine(other, 'or')
+
+    def __sub__(self, other: 'RoaringBitmap') -> 'RoaringBitmap':
+        """ANDNOT: anggota `self` yang bukan anggota `other`."""
+        return self._combine(other, 'andnot')
+
+    # --- SERIALISASI ---
+
+    def to_bytes(self) -> bytes:
+        chunks = [_HEADER, struct.pack('<I', len(self._containers))]
+        for key in sorted(self._containers):
+            container = self._containers[key]
+            kind = 1 if _is_bitset(container) else 0
+            payload = container.astype('<u8' if kind else '<u2').tobytes()
+            chunks.append(struct.pack('<HBI', key, kind, len(container)))
+            chunks.append(payload)
+        return b''.join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'RoaringBitmap':
+        if data[:4] != _HEADER:
+            raise ValueError("Format bitmap tidak dikenal.")
+        (count,) = struct.unpack_from('<I', data, 4)
+        offset = 8
+        containers = {}
+        for _ in range(count):
+            key, kind, length = struct.unpack_from('<HBI', data, offset)
+            offset += struct.calcsize('<HBI')
+            dtype, width = ('<u8', 8) if kind else ('<u2', 2)
+            container = np.frombuffer(data, dtype=dtype, count=length, offset=offset)
+            containers[key] = container.astype(np.uint64 if kind else np.uint16)
+            offset += length * width
+        return cls(containers)
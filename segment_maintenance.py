@@ -0,0 +1,260 @@
+# segment_maintenance.py
+"""Pemeliharaan inkremental keanggotaan member segmen tersimpan (`anggota_segmen`).
+
+Member termasuk segmen jika minimal satu item transaksinya cocok dengan pohon aturan
+segmen (rule `segmen_tersimpan` diganti pohon segmen acuannya), sama seperti audiens
+di `audience_jobs.py`. Karena transaksi append-only, transaksi baru hanya dapat
+menambah anggota, kecuali pada segmen fitur member (fitur member yang berubah bisa
+membuat member keluar). Setiap putaran:
+
+- membaca sekali saja baris fakta dengan `transaksi.id` di atas watermark segmen
+  (paling banyak `SEGMEN_DELTA_TRANSAKSI` transaksi per langkah, dan tidak melewati celah
+  id yang mungkin belum di-commit, lihat `id_gaps.py`), lalu mengevaluasi
+  setiap segmen pada delta itu dengan `predicate_eval` di memori. Segmen yang tidak
+  punya baris cocok tidak ditulis sama sekali selain watermark-nya; member yang cocok
+  ditambahkan dengan `INSERT ... ON CONFLICT DO NOTHING`;
+- segmen dengan rule fitur member (`member_*`) dihitung ulang di PostgreSQL hanya untuk
+  member yang muncul di delta, sampai watermark `member_features.py` agar fitur yang
+  dibaca sudah mencakup transaksinya;
+- segmen baru, segmen yang aturannya (atau segmen acuannya) berubah, dan segmen fitur
+  member pada hari baru (recency dan jendela 90 hari bergeser) dibangun ulang penuh.
+
+Anggota, watermark, dan jumlah anggota satu segmen di-commit dalam transaksi yang
+sama, jadi putaran yang terhenti cukup diulang.
+
+Jalankan `python segment_maintenance.py --terus` sebagai proses yang terus berjalan.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict, namedtuple
+from datetime import date, datetime
+
+import numpy as np
+from sqlalchemy import any_, bindparam, delete, func, literal, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+from database import engine
+from fact_data import build_fact_query, stream_fact_frame
+from id_gaps import GapGuard
+from member_features import PROSES as FITUR_MEMBER_PROSES
+from models import AnggotaSegmen, FiturMember, FilterTersimpan, StatusAnggotaSegmen, Transaksi, WatermarkProses
+from predicate_eval import evaluate_tree
+from segment_membership import inline_segments
+from segment_query import compile_condition, fact_join, required_models
+from segment_rules import has_rules
+
+DELTA_TRANSAKSI = int(os.getenv('SEGMEN_DELTA_TRANSAKSI', '200000'))
+POLL_SECONDS = float(os.getenv('SEGMEN_POLL_SECONDS', '120'))
+
+# Frame fakta delta: kolom fakta biasa ditambah id_member, hanya transaksi member.
+DELTA_QUERY = build_fact_query(('t.id_member',), "t.id > :after AND t.id <= :upto AND t.id_member IS NOT NULL")
+
+_gaps = GapGuard(Transaksi.id)
+
+SegmentPlan = namedtuple('SegmentPlan', ['id_filter', 'tree', 'versi', 'fitur'])
+MaintenanceRun = namedtuple('MaintenanceRun', ['diperiksa', 'dibangun_ulang', 'berubah', 'anggota_baru',
+                                               'anggota_keluar', 'baris_delta', 'gagal', 'seconds'])
+
+
+def segment_version(tree: dict | None, today: date) -> str:
+    """Versi pohon aturan yang sudah di-inline; segmen fitur member berganti versi setiap hari."""
+    digest = hashlib.sha1(json.dumps(tree, sort_keys=True, default=str).encode())
+    if FiturMember in required_models(tree):
+        digest.update(today.isoformat().encode())
+    return digest.hexdigest()
+
+
+def _member_array(members):
+    return bindparam('members', [int(member) for member in members], type_=ARRAY(AnggotaSegmen.id_member.type))
+
+
+def _matching_members(tree: dict | None, upto: int, members=None):
+    """`SELECT DISTINCT id_member` yang cocok dengan segmen (opsional dibatasi ke `members`)."""
+    query = (
+        select(Transaksi.id_member).distinct()
+        .select_from(fact_join(required_models(tree)))
+        .where(Transaksi.id <= upto, Transaksi.id_member.isnot(None))
+        .where(compile_condition(tree))
+    )
+    if members is not None:
+        query = query.where(Transaksi.id_member == any_(_member_array(members)))
+    return query
+
+
+def build_membership_insert(segment_id: int, members_query):
+    """Menambahkan hasil `members_query` (satu kolom id_member) sebagai anggota segmen."""
+    rows = select(literal(segment_id), members_query.subquery().c[0])
+    return (
+        insert(AnggotaSegmen).from_select(['id_filter', 'id_member'], rows)
+        .on_conflict_do_nothing()
+    )
+
+
+def _count_members(connection, segment_id: int) -> int:
+    return connection.execute(
+        select(func.count()).select_from(AnggotaSegmen).where(AnggotaSegmen.id_filter == segment_id)
+    ).scalar()
+
+
+def _set_status(connection, segment_id: int, version: str, watermark: int, members: int):
+    stmt = insert(StatusAnggotaSegmen).values(
+        id_filter=segment_id, versi=version, watermark=watermark, jumlah_anggota=members,
+        diperbarui_pada=datetime.now())
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['id_filter'],
+        set_={key: stmt.excluded[key] for key in ('versi', 'watermark', 'jumlah_anggota', 'diperbarui_pada')},
+    ))
+
+
+def rebuild_segment(plan: SegmentPlan, upto: int) -> int:
+    """Membangun ulang seluruh anggota segmen dari transaksi hingga `upto`."""
+    with engine.begin() as connection:
+        connection.execute(delete(AnggotaSegmen).where(AnggotaSegmen.id_filter == plan.id_filter))
+        connection.execute(build_membership_insert(plan.id_filter, _matching_members(plan.tree, upto)))
+        members = _count_members(connection, plan.id_filter)
+        _set_status(connection, plan.id_filter, plan.versi, upto, members)
+    return members
+
+
+def apply_delta(plan: SegmentPlan, delta, upto: int) -> tuple[int, int]:
+    """Menerapkan frame delta (transaksi hingga `upto`) ke satu segmen; mengembalikan (anggota baru, anggota keluar)."""
+    members = np.unique(delta['id_member'].to_numpy())
+    added = removed = 0
+    with engine.begin() as connection:
+        if plan.fitur and len(members):
+            # Fitur member yang terlibat berubah: hitung ulang keanggotaan mereka saja.
+            before = set(connection.execute(
+                delete(AnggotaSegmen)
+                .where(AnggotaSegmen.id_filter == plan.id_filter,
+                       AnggotaSegmen.id_member == any_(_member_array(members)))
+                .returning(AnggotaSegmen.id_member)
+            ).scalars())
+            after = set(connection.execute(
+                build_membership_insert(plan.id_filter, _matching_members(plan.tree, upto, members))
+                .returning(AnggotaSegmen.id_member)
+            ).scalars())
+            added, removed = len(after - before), len(before - after)
+        elif not plan.fitur and len(members):
+            if has_rules(plan.tree):
+                members = np.unique(members_of(delta, plan.tree))
+            if len(members):
+                added = connection.execute(
+                    insert(AnggotaSegmen).from_select(
+                        ['id_filter', 'id_member'],
+                        select(literal(plan.id_filter), func.unnest(_member_array(members))))
+                    .on_conflict_do_nothing()
+                ).rowcount
+        connection.execute(
+            update(StatusAnggotaSegmen).where(StatusAnggotaSegmen.id_filter == plan.id_filter)
+            .values(watermark=upto, diperbarui_pada=datetime.now(),
+                    jumlah_anggota=StatusAnggotaSegmen.jumlah_anggota + added - removed)
+        )
+    return added, removed
+
+
+def members_of(delta, tree: dict | None) -> np.ndarray:
+    """id_member dari baris delta yang cocok dengan pohon aturan (dievaluasi di memori)."""
+    return delta['id_member'].to_numpy()[evaluate_tree(delta, tree)]
+
+
+def _load_delta(after: int, upto: int):
+    with engine.connect() as connection:
+        return stream_fact_frame(connection, DELTA_QUERY, {'after': after, 'upto': upto}, compact=True)
+
+
+def _plan_segments(trees: dict, segment_ids, today: date, errors: dict) -> list[SegmentPlan]:
+    plans = []
+    for segment_id in segment_ids:
+        if segment_id not in trees:
+            errors[segment_id] = f"Segmen dengan id {segment_id} tidak ditemukan."
+            continue
+        try:
+            tree = inline_segments(trees[segment_id], trees.get)
+            compile_condition(tree)
+        except ValueError as error:
+            errors[segment_id] = str(error)
+            continue
+        # Rule yang tidak ada di frame delta (fitur member) dievaluasi di database.
+        fitur = FiturMember in required_models(tree)
+        plans.append(SegmentPlan(segment_id, tree, segment_version(tree, today), fitur))
+    return plans
+
+
+def maintain_segments(segment_ids=None, delta_rows: int = DELTA_TRANSAKSI, today: date | None = None) -> MaintenanceRun:
+    """Satu putaran pemeliharaan untuk semua segmen tersimpan (atau `segment_ids`)."""
+    started = time.perf_counter()
+    today = today or date.today()
+    with engine.connect().execution_options(isolation_level='REPEATABLE READ') as connection:
+        trees = dict(connection.execute(select(FilterTersimpan.id, FilterTersimpan.konfigurasi_json)).all())
+        status = {row.id_filter: row for row in connection.execute(
+            select(StatusAnggotaSegmen.id_filter, StatusAnggotaSegmen.versi, StatusAnggotaSegmen.watermark))}
+        newest = connection.execute(select(func.coalesce(func.max(Transaksi.id), 0))).scalar()
+        latest = _gaps.safe_upto(connection, min((row.watermark for row in status.values()), default=0), newest)
+        feature_watermark = connection.execute(
+            select(WatermarkProses.watermark).where(WatermarkProses.nama_proses == FITUR_MEMBER_PROSES)
+        ).scalar() or 0
+
+    errors = {}
+    plans = _plan_segments(trees, sorted(trees) if segment_ids is None else segment_ids, today, errors)
+    rebuilt = changed = added = removed = delta_total = 0
+    pending = defaultdict(list)
+    for plan in plans:
+        upto = min(latest, feature_watermark) if plan.fitur else latest
+        limit = min(newest, feature_watermark) if plan.fitur else newest
+        current = status.get(plan.id_filter)
+        # Watermark di atas transaksi terakhir (atau watermark fitur) berarti datanya mundur; watermark
+        # yang hanya melewati batas celah id (karena segmen lain masih tertinggal) cukup ditunggu.
+        if current is None or current.versi != plan.versi or current.watermark > limit:
+            rebuild_segment(plan, upto)
+            rebuilt += 1
+        elif current.watermark < upto:
+            pending[current.watermark, upto].append(plan)
+
+    # Segmen dengan watermark yang sama berbagi satu frame delta per langkah.
+    while pending:
+        (after, upto), group = pending.popitem()
+        step = min(upto, after + delta_rows)
+        delta = _load_delta(after, step)
+        delta_total += len(delta)
+        for plan in group:
+            new, gone = apply_delta(plan, delta, step)
+            changed += bool(new or gone)
+            added += new
+            removed += gone
+        if step < upto:
+            pending[step, upto].extend(group)
+
+    return MaintenanceRun(len(plans), rebuilt, changed, added, removed, delta_total, errors,
+                          time.perf_counter() - started)
+
+
+def report(run: MaintenanceRun):
+    print(f"   {run.diperiksa:,} segmen diperiksa: {run.dibangun_ulang:,} dibangun ulang, {run.berubah:,} berubah "
+          f"(+{run.anggota_baru:,} / -{run.anggota_keluar:,} anggota) dari {run.baris_delta:,} baris delta "
+          f"dalam {run.seconds:.2f} dtk")
+    for segment_id, message in run.gagal.items():
+        print(f"   ⚠️ segmen {segment_id}: {message}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memelihara keanggotaan member segmen tersimpan dari transaksi baru.")
+    parser.add_argument('--segmen', type=int, nargs='*', help="Hanya segmen dengan id ini (default semua).")
+    parser.add_argument('--delta', type=int, default=DELTA_TRANSAKSI, help="Jumlah transaksi per langkah delta.")
+    parser.add_argument('--terus', action='store_true', help="Terus berjalan dan memeriksa transaksi baru berkala.")
+    parser.add_argument('--interval', type=float, default=POLL_SECONDS, help="Jeda antar putaran (detik).")
+    args = parser.parse_args()
+
+    runs = 0
+    try:
+        while True:
+            report(maintain_segments(args.segmen or None, args.delta))
+            runs += 1
+            if not args.terus:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    print(f"✅ {runs} putaran pemeliharaan keanggotaan segmen selesai.")
@@ -0,0 +1,321 @@
+# segment_membership.py
+"""Cache keanggotaan segmen tersimpan berbasis bitmap.
+
+Setiap segmen yang sudah dievaluasi disimpan sebagai `RoaringBitmap` berisi ID
+`detail_transaksi`, ditandai dengan watermark data (`FactCache.watermark_id`, yang
+tidak melewati celah id yang mungkin belum di-commit) dan versi pohon aturannya. Segment Builder dapat mereferensikan segmen tersimpan
+sebagai rule (`segmen_tersimpan`) yang digabung lewat operasi AND/OR/ANDNOT bitmap
+tanpa mengevaluasi ulang predikat segmen acuannya.
+
+Rule pada field yang tidak ada di frame fakta (mis. fitur RFM `member_*`) dievaluasi
+di PostgreSQL dan hasilnya (ID detail) diubah menjadi bitmap.
+
+Keanggotaan setiap baris hanya bergantung pada baris itu sendiri, jadi bitmap dengan
+versi yang sama tetapi watermark lebih lama diperluas dengan mengevaluasi baris di atas
+watermark lamanya saja. Bitmap semesta (semua ID detail di frame) juga di-cache per
+frame dan diperluas dengan cara yang sama saat frame bertambah.
+"""
+import hashlib
+import json
+import threading
+import weakref
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, select
+from sqlalchemy.dialects.postgresql import insert
+
+from database import engine
+from member_features import PROSES as FITUR_MEMBER_PROSES
+from models import DetailTransaksi, FiturMember, FilterTersimpan, KeanggotaanSegmen, Transaksi, WatermarkProses
+from predicate_eval import evaluate_tree
+from segment_bitmap import RoaringBitmap
+from segment_query import FACT_COLUMNS, compile_condition, fact_join, required_models
+from segment_rules import children_of, group_parts, has_rules, is_group, iter_rules, rule_parts, tree_fields
+
+SEGMENT_FIELD = 'segmen_tersimpan'
+SEGMENT_OPERATORS = ['select_equals', 'select_not_equals', 'select_any_in', 'select_not_any_in']
+
+
+def references_segments(tree: dict | None) -> bool:
+    return SEGMENT_FIELD in tree_fields(tree)
+
+
+def segment_field_config(options: list[tuple[int, str]]) -> dict:
+    """Definisi field `segmen_tersimpan` untuk config condition tree."""
+    return {
+        'label': 'Saved Segment',
+        'type': 'select',
+        'operators': SEGMENT_OPERATORS,
+        'fieldSettings': {'listValues': [{'value': seg_id, 'title': name} for seg_id, name in options]},
+    }
+
+
+class _Evaluation:
+    """State satu kali evaluasi: frame, watermark, pohon segmen yang sudah dimuat.
+
+    Evaluasi delta (`delta()`) hanya memuat baris dengan `id_transaksi > after`, tetapi
+    berbagi pohon, versi, dan bitmap segmen acuan dengan evaluasi penuh (`root`).
+    """
+
+    def __init__(self, df: pd.DataFrame, watermark: int, universe: RoaringBitmap,
+                 root: '_Evaluation | None' = None, after: int | None = None):
+        self.df = df
+        self.watermark = watermark
+        self.after = after
+        self.ids = df['id_detail'].to_numpy()
+        self.universe = universe
+        self.root = root or self
+        if root is None:
+            self.trees = {}
+            self.versions = {}
+            self.stack = []
+            self.feature_version = None
+        else:
+            # Versi dan fitur member selalu dihitung lewat evaluasi penuh (lihat segment_bitmap()).
+            self.trees, self.versions, self.stack = root.trees, root.versions, root.stack
+
+    def delta(self, after: int) -> '_Evaluation':
+        df = self.df[self.df['id_transaksi'].to_numpy() > after]
+        return _Evaluation(df, self.watermark, RoaringBitmap.from_array(df['id_detail'].to_numpy()),
+                           root=self.root, after=after)
+
+
+class MembershipCache:
+    """Cache bitmap keanggotaan segmen di memori proses dan di tabel `keanggotaan_segmen`."""
+
+    def __init__(self):
+        self._memory = {}
+        self._universe = None  # (weakref frame, watermark, bitmap)
+        self._lock = threading.Lock()
+
+    def _universe_for(self, df: pd.DataFrame, watermark: int) -> RoaringBitmap:
+        """Bitmap semua ID detail di frame; diperluas dari frame sebelumnya jika frame hanya bertambah."""
+        with self._lock:
+            cached = self._universe
+        if cached is not None and cached[0]() is df and cached[1] == watermark:
+            return cached[2]
+        ids = df['id_detail'].to_numpy()
+        universe = None
+        if cached is not None and cached[1] <= watermark:
+            new_rows = df['id_transaksi'].to_numpy() > cached[1]
+            universe = cached[2] | RoaringBitmap.from_array(ids[new_rows])
+            if len(universe) != len(df):
+                # Frame dimuat ulang (ada baris yang dihapus): bangun ulang dari awal.
+                universe = None
+        if universe is None:
+            universe = RoaringBitmap.from_array(ids)
+        with self._lock:
+            self._universe = (weakref.ref(df), watermark, universe)
+        return universe
+
+    # --- PEMUATAN POHON & VERSI ---
+
+    def _tree(self, ctx: _Evaluation, segment_id: int) -> dict:
+        if segment_id not in ctx.trees:
+            with engine.connect() as connection:
+                tree = connection.execute(
+                    select(FilterTersimpan.konfigurasi_json).where(FilterTersimpan.id == segment_id)
+                ).scalar()
+            if tree is None:
+                raise ValueError(f"Segmen dengan id {segment_id} tidak ditemukan.")
+            ctx.trees[segment_id] = tree
+        return ctx.trees[segment_id]
+
+    def _referenced_ids(self, tree: dict | None) -> list[int]:
+        ids = []
+        for _, _, values in _iter_segment_rules(tree):
+            ids.extend(_segment_ids(values))
+        return sorted(set(ids))
+
+    def _version(self, ctx: _Evaluation, segment_id: int) -> str:
+        """Hash pohon aturan segmen beserta versi segmen yang direferensikannya."""
+        if segment_id in ctx.versions:
+            return ctx.versions[segment_id]
+        if segment_id in ctx.stack:
+            raise ValueError("Segmen tidak boleh mereferensikan dirinya sendiri (referensi melingkar).")
+        ctx.stack.append(segment_id)
+        try:
+            tree = self._tree(ctx, segment_id)
+            digest = hashlib.sha1(json.dumps(tree, sort_keys=True, default=str).encode())
+            if FiturMember in required_models(tree):
+                # Fitur member berubah tanpa transaksi baru (refresh fitur, recency yang bertambah tiap hari).
+                digest.update(self._feature_version(ctx).encode())
+            for ref_id in self._referenced_ids(tree):
+                digest.update(self._version(ctx, ref_id).encode())
+        finally:
+            ctx.stack.pop()
+        ctx.versions[segment_id] = digest.hexdigest()
+        return ctx.versions[segment_id]
+
+    def _feature_version(self, ctx: _Evaluation) -> str:
+        if ctx.feature_version is None:
+            with engine.connect() as connection:
+                row = connection.execute(
+                    select(WatermarkProses.watermark, WatermarkProses.waktu_acuan)
+                    .where(WatermarkProses.nama_proses == FITUR_MEMBER_PROSES)
+                ).first()
+            ctx.feature_version = f"{tuple(row) if row else None}@{date.today().isoformat()}"
+        return ctx.feature_version
+
+    # --- CACHE ---
+
+    def _load_stored(self, segment_id: int, version: str, watermark: int) -> tuple[int, RoaringBitmap] | None:
+        """Bitmap tersimpan dengan versi yang sama dan watermark tidak lebih baru: (watermark, bitmap)."""
+        with engine.connect() as connection:
+            row = connection.execute(
+                select(KeanggotaanSegmen.watermark, KeanggotaanSegmen.bitmap)
+                .where(KeanggotaanSegmen.id_filter == segment_id)
+                .where(KeanggotaanSegmen.versi == version)
+                .where(KeanggotaanSegmen.watermark <= watermark)
+            ).first()
+        return (row[0], RoaringBitmap.from_bytes(bytes(row[1]))) if row else None
+
+    def _store(self, segment_id: int, version: str, watermark: int, bitmap: RoaringBitmap):
+        values = {
+            'id_filter': segment_id, 'versi': version, 'watermark': watermark,
+            'kardinalitas': len(bitmap), 'bitmap': bitmap.to_bytes(),
+        }
+        stmt = insert(KeanggotaanSegmen).values(**values)
+        stmt = stmt.on_conflict_do_update(index_elements=['id_filter'], set_={
+            k: stmt.excluded[k] for k in ('versi', 'watermark', 'kardinalitas', 'bitmap')
+        })
+        with engine.begin() as connection:
+            connection.execute(stmt)
+
+    def segment_bitmap(self, ctx: _Evaluation, segment_id: int) -> RoaringBitmap:
+        """Bitmap keanggotaan satu segmen tersimpan, dihitung (atau diperluas) hanya jika belum ada di cache."""
+        ctx = ctx.root
+        version = self._version(ctx, segment_id)
+        key = (segment_id, version, ctx.watermark)
+        with self._lock:
+            cached = self._memory.get(segment_id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        if cached is not None and cached[0][1] == version and cached[0][2] < ctx.watermark:
+            base = (cached[0][2], cached[1])
+        else:
+            base = self._load_stored(segment_id, version, ctx.watermark)
+        if base is not None and base[0] == ctx.watermark:
+            bitmap = base[1]
+        else:
+            ctx.stack.append(segment_id)
+            try:
+                if base is None:
+                    bitmap = self._evaluate_node(ctx, self._tree(ctx, segment_id))
+                else:
+                    # Hanya baris di atas watermark bitmap lama yang dievaluasi.
+                    delta = ctx.delta(base[0])
+                    bitmap = base[1] | (self._evaluate_node(delta, self._tree(ctx, segment_id)) & delta.universe)
+            finally:
+                ctx.stack.pop()
+            self._store(segment_id, version, ctx.watermark, bitmap)
+        with self._lock:
+            self._memory[segment_id] = (key, bitmap)
+        return bitmap
+
+    # --- EVALUASI ---
+
+    def _evaluate_node(self, ctx: _Evaluation, node: dict) -> RoaringBitmap:
+        if not has_rules(node):
+            return ctx.universe
+        if not is_group(node):
+            field, operator, values = rule_parts(node)
+            if field == SEGMENT_FIELD:
+                return self._segment_rule(ctx, operator, values)
+            return self._evaluate_plain(ctx, node)
+
+        conjunction, negate = group_parts(node)
+        children = [child for child in children_of(node) if has_rules(child)]
+        plain = [child for child in children if not references_segments(child)]
+        linked = [child for child in children if references_segments(child)]
+        parts = []
+        if plain:
+            # Rule biasa dalam satu group dievaluasi sekaligus sebagai mask, lalu diubah sekali ke bitmap.
+            plain_group = {'type': 'group', 'properties': {'conjunction': conjunction}, 'children1': plain}
+            parts.append(self._evaluate_plain(ctx, plain_group))
+        parts.extend(self._evaluate_node(ctx, child) for child in linked)
+
+        result = parts[0]
+        for part in parts[1:]:
+            result = result | part if conjunction == 'OR' else result & part
+        return ctx.universe - result if negate else result
+
+    def _evaluate_plain(self, ctx: _Evaluation, node: dict) -> RoaringBitmap:
+        """Rule tanpa referensi segmen: dievaluasi pada frame, atau di database jika ada field di luar frame."""
+        if all(field in ctx.df for field in tree_fields(node)):
+            return RoaringBitmap.from_array(ctx.ids[evaluate_tree(ctx.df, node)])
+        unknown = [field for field in tree_fields(node) if field not in ctx.df and field not in FACT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Field '{unknown[0]}' tidak dikenal.")
+        query = (
+            select(DetailTransaksi.id)
+            .select_from(fact_join(required_models(node)))
+            .where(and_(Transaksi.id <= ctx.watermark, compile_condition(node)))
+        )
+        if ctx.after is not None:
+            query = query.where(Transaksi.id > ctx.after)
+        with engine.connect() as connection:
+            ids = np.fromiter(connection.execute(query).scalars(), dtype=np.int64)
+        return RoaringBitmap.from_array(ids) & ctx.universe
+
+    def _segment_rule(self, ctx: _Evaluation, operator: str, values: list) -> RoaringBitmap:
+        bitmaps = [self.segment_bitmap(ctx, seg_id) for seg_id in _segment_ids(values)]
+        combined = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            combined = combined | bitmap
+        if operator in ('select_equals', 'select_any_in'):
+            return combined
+        if operator in ('select_not_equals', 'select_not_any_in'):
+            return ctx.universe - combined
+        raise ValueError(f"Operator '{operator}' tidak didukung untuk segmen tersimpan.")
+
+    def evaluate(self, tree: dict | None, df: pd.DataFrame, watermark: int) -> RoaringBitmap:
+        """Mengevaluasi pohon aturan (boleh mereferensikan segmen tersimpan) menjadi bitmap ID detail."""
+        ctx = _Evaluation(df, watermark, self._universe_for(df, watermark))
+        return self._evaluate_node(ctx, tree or {})
+
+    def evaluate_mask(self, tree: dict | None, df: pd.DataFrame, watermark: int) -> np.ndarray:
+        return self.evaluate(tree, df, watermark).contains_many(df['id_detail'].to_numpy())
+
+
+def inline_segments(tree: dict | None, load_tree, _stack: tuple = ()) -> dict | None:
+    """Menyalin pohon aturan dengan setiap rule `segmen_tersimpan` diganti pohon segmen acuannya.
+
+    Dipakai jika pohon harus dievaluasi sepenuhnya di database. `load_tree(id)` mengembalikan
+    pohon aturan segmen tersimpan.
+    """
+    if not tree:
+        return tree
+    if is_group(tree):
+        node = {key: value for key, value in tree.items() if key not in ('children', 'children1')}
+        node['children1'] = [inline_segments(child, load_tree, _stack) for child in children_of(tree)]
+        return node
+    parts = rule_parts(tree)
+    if parts is None or parts[0] != SEGMENT_FIELD:
+        return tree
+    _, operator, values = parts
+    if operator not in SEGMENT_OPERATORS:
+        raise ValueError(f"Operator '{operator}' tidak didukung untuk segmen tersimpan.")
+    children = []
+    for segment_id in _segment_ids(values):
+        if segment_id in _stack:
+            raise ValueError("Segmen tidak boleh mereferensikan dirinya sendiri (referensi melingkar).")
+        referenced = load_tree(segment_id)
+        if referenced is None:
+            raise ValueError(f"Segmen dengan id {segment_id} tidak ditemukan.")
+        children.append(inline_segments(referenced, load_tree, _stack + (segment_id,)))
+    negate = operator in ('select_not_equals', 'select_not_any_in')
+    return {'type': 'group', 'properties': {'conjunction': 'OR', 'not': negate}, 'children1': children}
+
+
+def _iter_segment_rules(tree):
+    return (rule for rule in iter_rules(tree) if rule[0] == SEGMENT_FIELD)
+
+
+def _segment_ids(values: list) -> list[int]:
+    ids = []
+    for value in values:
+        ids.extend(value if isinstance(value, list) else [value])
+    return [int(v) for v in ids]
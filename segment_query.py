@@ -0,0 +1,168 @@
+# segment_query.py
+"""Kompilasi pohon aturan segmen menjadi klausa WHERE SQLAlchemy yang terparameterisasi.
+
+Dengan begini filter dan agregasi "Estimated Total Sales" dijalankan di PostgreSQL
+(memanfaatkan index seperti `idx_transaksi_waktu` dan `idx_produk_kategori`),
+sehingga hanya hasil agregasi yang dikirim ke aplikasi.
+"""
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import Date, DateTime, and_, cast, func, not_, or_, select, true
+
+from database import engine
+from models import DetailTransaksi, FiturMember, Karyawan, Member, Produk, Toko, Transaksi
+from segment_rules import children_of, group_parts, has_rules, is_group, rule_parts, tree_fields
+
+# Pemetaan nama kolom pada tabel fakta (hasil `load_data_from_db()`) ke (model, ekspresi SQL).
+# Model dipakai untuk menentukan JOIN mana yang benar-benar dibutuhkan.
+FACT_COLUMNS = {
+    'id_transaksi': (Transaksi, Transaksi.id),
+    'waktu_transaksi': (Transaksi, Transaksi.waktu_transaksi),
+    'nama_toko': (Toko, Toko.nama_toko),
+    'kota': (Toko, Toko.kota),
+    'nama_karyawan': (Karyawan, Karyawan.nama_karyawan),
+    'posisi_karyawan': (Karyawan, Karyawan.posisi),
+    'nama_produk': (Produk, Produk.nama_produk),
+    'kategori_produk': (Produk, Produk.kategori),
+    'harga_jual': (Produk, Produk.harga_jual),
+    'jumlah_item': (DetailTransaksi, DetailTransaksi.jumlah),
+    'harga_saat_transaksi': (DetailTransaksi, DetailTransaksi.harga_saat_transaksi),
+    'total_harga_item': (DetailTransaksi, DetailTransaksi.jumlah * DetailTransaksi.harga_saat_transaksi),
+    'nama_member': (Member, Member.nama_member),
+    'tanggal_join_member': (Member, Member.tanggal_bergabung),
+    # Fitur RFM dari `fitur_member` (lihat member_features.py); NULL untuk transaksi non-member.
+    'member_recency_hari': (FiturMember, func.current_date() - cast(FiturMember.transaksi_terakhir, Date)),
+    'member_frekuensi': (FiturMember, FiturMember.jumlah_transaksi),
+    'member_total_belanja': (FiturMember, FiturMember.total_belanja),
+    'member_belanja_90_hari': (FiturMember, FiturMember.belanja_90_hari),
+    'member_rata_rata_keranjang': (FiturMember,
+                                   FiturMember.total_belanja / func.nullif(FiturMember.jumlah_transaksi, 0)),
+    'member_kategori_favorit': (FiturMember, FiturMember.kategori_favorit),
+    'member_toko_favorit': (FiturMember, select(Toko.nama_toko)
+                            .where(Toko.id == FiturMember.id_toko_favorit).scalar_subquery()),
+    'member_transaksi_pertama': (FiturMember, FiturMember.transaksi_pertama),
+    'member_transaksi_terakhir': (FiturMember, FiturMember.transaksi_terakhir),
+}
+
+
+def _coerce_value(column, value):
+    """Mengubah nilai dari widget (string) ke tipe Python yang sesuai dengan kolom."""
+    col_type = getattr(column, 'type', None)
+    if isinstance(value, str) and isinstance(col_type, (DateTime, Date)):
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return parsed.date() if isinstance(col_type, Date) and not isinstance(col_type, DateTime) else parsed
+    return value
+
+
+def _compile_rule(column, operator: str, values: list):
+    values = [_coerce_value(column, v) if not isinstance(v, list) else [_coerce_value(column, x) for x in v]
+              for v in values]
+    if operator == 'is_null':
+        return column.is_(None)
+    if operator == 'is_not_null':
+        return column.isnot(None)
+    if operator == 'is_empty':
+        return or_(column.is_(None), column == '')
+    if operator == 'is_not_empty':
+        return and_(column.isnot(None), column != '')
+
+    value = values[0]
+    if operator in ('equal', 'select_equals'):
+        return column == value
+    if operator in ('not_equal', 'select_not_equals'):
+        # Sama seperti pandas: baris dengan nilai NULL ikut lolos pada "tidak sama dengan".
+        return column.is_distinct_from(value)
+    if operator == 'less':
+        return column < value
+    if operator == 'less_or_equal':
+        return column <= value
+    if operator == 'greater':
+        return column > value
+    if operator == 'greater_or_equal':
+        return column >= value
+    if operator == 'between':
+        return column.between(values[0], values[1])
+    if operator == 'not_between':
+        return not_(column.between(values[0], values[1]))
+    if operator == 'like':
+        return column.contains(value, autoescape=True)
+    if operator == 'not_like':
+        return not_(column.contains(value, autoescape=True))
+    if operator == 'starts_with':
+        return column.startswith(value, autoescape=True)
+    if operator == 'ends_with':
+        return column.endswith(value, autoescape=True)
+    if operator in ('select_any_in', 'multiselect_equals', 'multiselect_contains'):
+        return column.in_(value if isinstance(value, list) else values)
+    if operator in ('select_not_any_in', 'multiselect_not_equals', 'multiselect_not_contains'):
+        items = value if isinstance(value, list) else values
+        return or_(column.not_in(items), column.is_(None))
+    raise ValueError(f"Operator '{operator}' belum didukung untuk pushdown SQL.")
+
+
+def compile_condition(tree: dict | None, columns: dict = FACT_COLUMNS):
+    """Mengubah pohon aturan menjadi satu ekspresi boolean SQLAlchemy.
+
+    Nilai dari rule selalu dikirim sebagai bind parameter, bukan disisipkan ke string SQL.
+    Group kosong dianggap selalu benar.
+    """
+    if not tree:
+        return true()
+    if not is_group(tree):
+        parts = rule_parts(tree)
+        if parts is None:
+            return true()
+        field, operator, values = parts
+        if field not in columns:
+            raise ValueError(f"Field '{field}' tidak dikenal.")
+        return _compile_rule(columns[field][1], operator, values)
+
+    conjunction, negate = group_parts(tree)
+    # Rule yang belum lengkap dan group kosong dilewati agar tidak membuat OR selalu benar.
+    clauses = [compile_condition(child, columns) for child in children_of(tree) if has_rules(child)]
+    if not clauses:
+        clause = true()
+    elif conjunction == 'OR':
+        clause = or_(*clauses)
+    else:
+        clause = and_(*clauses)
+    return not_(clause) if negate else clause
+
+
+def required_models(tree: dict | None, columns: dict = FACT_COLUMNS) -> set:
+    """Mengembalikan model (tabel) yang direferensikan oleh rule di dalam pohon."""
+    return {columns[field][0] for field in tree_fields(tree) if field in columns}
+
+
+def fact_join(models: set):
+    """Membangun JOIN tabel fakta, hanya dengan tabel dimensi yang dibutuhkan."""
+    joined = Transaksi.__table__.join(DetailTransaksi.__table__, Transaksi.id == DetailTransaksi.id_transaksi)
+    joined = joined.join(Produk.__table__, DetailTransaksi.id_produk == Produk.id)
+    if Toko in models:
+        joined = joined.join(Toko.__table__, Transaksi.id_toko == Toko.id)
+    if Karyawan in models:
+        joined = joined.join(Karyawan.__table__, Transaksi.id_karyawan == Karyawan.id)
+    if Member in models:
+        joined = joined.outerjoin(Member.__table__, Transaksi.id_member == Member.id)
+    if FiturMember in models:
+        joined = joined.outerjoin(FiturMember.__table__, Transaksi.id_member == FiturMember.id_member)
+    return joined
+
+
+def build_sales_estimate_query(tree: dict | None):
+    """Query agregasi jumlah item per produk untuk panel "Estimated Total Sales"."""
+    return (
+        select(Produk.nama_produk, func.sum(DetailTransaksi.jumlah).label('jumlah_item'))
+        .select_from(fact_join(required_models(tree)))
+        .where(compile_condition(tree))
+        .group_by(Produk.nama_produk)
+    )
+
+
+def load_sales_estimate(tree: dict | None) -> pd.DataFrame:
+    """Menjalankan query estimasi di database dan mengembalikan DataFrame (nama_produk, jumlah_item)."""
+    with engine.connect() as connection:
+        df = pd.read_sql(build_sales_estimate_query(tree), connection)
+    df['jumlah_item'] = df['jumlah_item'].fillna(0).astype('int64')
+    return df
@@ -0,0 +1,68 @@
+# segment_rules.py
+"""Utilitas untuk membaca pohon aturan (condition tree) dari streamlit-condition-tree.
+
+Struktur pohon sama dengan yang disimpan di `FilterTersimpan.konfigurasi_json`:
+group memiliki `children1` (list atau dict) dan `properties.conjunction`,
+sedangkan rule memiliki `properties.field`, `properties.operator` dan `properties.value`.
+"""
+
+# Operator yang tidak membutuhkan nilai pembanding.
+NO_VALUE_OPERATORS = {'is_null', 'is_not_null', 'is_empty', 'is_not_empty'}
+
+
+def children_of(node: dict) -> list:
+    """Mengembalikan anak-anak sebuah group sebagai list, apa pun format penyimpanannya."""
+    children = node.get('children1', node.get('children')) or []
+    if isinstance(children, dict):
+        return list(children.values())
+    return list(children)
+
+
+def is_group(node: dict) -> bool:
+    return node.get('type', 'group') in ('group', 'rule_group')
+
+
+def group_parts(group: dict) -> tuple[str, bool]:
+    """Mengembalikan (conjunction, not) dari sebuah group."""
+    props = group.get('properties') or {}
+    return (props.get('conjunction') or 'AND').upper(), bool(props.get('not'))
+
+
+def rule_parts(rule: dict) -> tuple[str, str, list] | None:
+    """Mengembalikan (field, operator, values) atau None jika rule belum lengkap.
+
+    Rule yang belum lengkap (field/operator kosong atau nilai belum diisi) diabaikan,
+    sama seperti perilaku `queryString` dari komponen condition tree.
+    """
+    props = rule.get('properties') or {}
+    field, operator = props.get('field'), props.get('operator')
+    if not field or not operator:
+        return None
+    values = list(props.get('value') or [])
+    if operator in NO_VALUE_OPERATORS:
+        return field, operator, []
+    if not values or any(v is None for v in values):
+        return None
+    return field, operator, values
+
+
+def iter_rules(tree: dict | None):
+    """Menghasilkan semua rule lengkap di dalam pohon sebagai (field, operator, values)."""
+    if not tree:
+        return
+    if not is_group(tree):
+        parts = rule_parts(tree)
+        if parts:
+            yield parts
+        return
+    for child in children_of(tree):
+        yield from iter_rules(child)
+
+
+def tree_fields(tree: dict | None) -> set[str]:
+    """Mengembalikan semua nama field yang dipakai oleh rule di dalam pohon."""
+    return {field for field, _, _ in iter_rules(tree)}
+
+
+def has_rules(tree: dict | None) -> bool:
+    return next(iter_rules(tree), None) is not None
@@ -1,6 +1,9 @@
 -- Skema untuk PostgreSQL
 -- Versi 1.1: Menambahkan komentar rinci untuk kejelasan.
 
+-- Ekstensi trigram untuk pencarian nama segmen dengan ILIKE '%kata%'.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- ===== TABEL MASTER =====
 
 -- Tabel untuk menyimpan data master setiap gerai/toko.
@@ -83,6 +86,134 @@ CREATE TABLE filter_tersimpan (
 );
 
 
+-- ===== TABEL AGREGAT (ROLLUP) =====
+
+-- Agregat harian penjualan untuk panel "Estimated Total Sales" (diisi oleh rollup.py).
+-- posisi_karyawan berisi '' jika posisi karyawan kosong, karena menjadi bagian primary key.
+CREATE TABLE rollup_penjualan_harian (
+    tanggal DATE NOT NULL,
+    id_toko INTEGER NOT NULL REFERENCES toko(id),
+    id_produk INTEGER NOT NULL REFERENCES produk(id),
+    is_member BOOLEAN NOT NULL,
+    posisi_karyawan VARCHAR(50) NOT NULL DEFAULT '',
+    total_jumlah BIGINT NOT NULL,
+    total_pendapatan NUMERIC(14, 2) NOT NULL,
+    jumlah_baris INTEGER NOT NULL,
+    sketsa_member BYTEA, -- Sketsa HyperLogLog ID member untuk estimasi reach (NULL untuk sel non-member).
+    PRIMARY KEY (tanggal, id_toko, id_produk, is_member, posisi_karyawan)
+);
+
+
+-- Cache keanggotaan segmen tersimpan: bitmap terkompresi dari ID detail_transaksi,
+-- ditandai dengan watermark data (transaksi.id tertinggi) saat bitmap dihitung.
+CREATE TABLE keanggotaan_segmen (
+    id_filter INTEGER PRIMARY KEY REFERENCES filter_tersimpan(id) ON DELETE CASCADE,
+    versi VARCHAR(40) NOT NULL, -- Hash pohon aturan, berubah jika segmen atau segmen acuannya diubah.
+    watermark BIGINT NOT NULL,
+    kardinalitas INTEGER NOT NULL,
+    bitmap BYTEA NOT NULL,
+    dihitung_pada TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+
+-- ===== FEATURE STORE MEMBER (RFM) =====
+
+-- Fitur per member yang dipelihara inkremental oleh member_features.py.
+-- Recency dan rata-rata keranjang diturunkan saat query dari kolom di bawah ini.
+CREATE TABLE fitur_member (
+    id_member INTEGER PRIMARY KEY REFERENCES member(id) ON DELETE CASCADE,
+    jumlah_transaksi INTEGER NOT NULL,
+    jumlah_item BIGINT NOT NULL,
+    total_belanja NUMERIC(14, 2) NOT NULL,
+    belanja_90_hari NUMERIC(14, 2) NOT NULL, -- Belanja sejak awal jendela 90 hari terakhir.
+    transaksi_pertama TIMESTAMP WITH TIME ZONE,
+    transaksi_terakhir TIMESTAMP WITH TIME ZONE,
+    kategori_favorit VARCHAR(50),
+    id_toko_favorit INTEGER REFERENCES toko(id)
+);
+
+-- Akumulator untuk kategori dan toko favorit; kategori berisi '' jika kategori produk kosong.
+CREATE TABLE fitur_member_kategori (
+    id_member INTEGER NOT NULL REFERENCES member(id) ON DELETE CASCADE,
+    kategori VARCHAR(50) NOT NULL,
+    jumlah_item BIGINT NOT NULL,
+    total_belanja NUMERIC(14, 2) NOT NULL,
+    PRIMARY KEY (id_member, kategori)
+);
+
+CREATE TABLE fitur_member_toko (
+    id_member INTEGER NOT NULL REFERENCES member(id) ON DELETE CASCADE,
+    id_toko INTEGER NOT NULL REFERENCES toko(id),
+    jumlah_transaksi INTEGER NOT NULL,
+    total_belanja NUMERIC(14, 2) NOT NULL,
+    PRIMARY KEY (id_member, id_toko)
+);
+
+-- Posisi terakhir proses inkremental (transaksi.id tertinggi yang sudah diproses).
+CREATE TABLE watermark_proses (
+    nama_proses VARCHAR(50) PRIMARY KEY,
+    watermark BIGINT NOT NULL,
+    waktu_acuan TIMESTAMP WITH TIME ZONE, -- Mis. awal jendela waktu yang sudah diterapkan.
+    diperbarui_pada TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+
+-- ===== AUDIENS CAMPAIGN =====
+
+-- Job materialisasi audiens dari segmen tersimpan (dijalankan di latar belakang oleh audience_jobs.py).
+-- id_member_terakhir mencatat rentang member.id yang sudah selesai, sehingga job dapat dilanjutkan.
+CREATE TABLE audiens_job (
+    id SERIAL PRIMARY KEY,
+    id_filter INTEGER NOT NULL REFERENCES filter_tersimpan(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL DEFAULT 'antri', -- antri, berjalan, selesai, dibatalkan, gagal
+    watermark BIGINT NOT NULL, -- transaksi.id tertinggi saat job dibuat.
+    id_member_maks INTEGER NOT NULL,
+    id_member_terakhir INTEGER NOT NULL DEFAULT 0,
+    jumlah_anggota INTEGER NOT NULL DEFAULT 0,
+    pesan_error TEXT,
+    dibuat_pada TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    diperbarui_pada TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Anggota audiens; primary key (id_job, id_member) juga dipakai untuk paginasi keyset dan ekspor.
+CREATE TABLE audiens_member (
+    id_job INTEGER NOT NULL REFERENCES audiens_job(id) ON DELETE CASCADE,
+    id_member INTEGER NOT NULL REFERENCES member(id) ON DELETE CASCADE,
+    kode_member VARCHAR(20) NOT NULL,
+    PRIMARY KEY (id_job, id_member)
+);
+
+
+-- ===== KEANGGOTAAN SEGMEN =====
+
+-- Anggota member segmen tersimpan, dipelihara inkremental dari transaksi baru oleh segment_maintenance.py.
+CREATE TABLE anggota_segmen (
+    id_filter INTEGER NOT NULL REFERENCES filter_tersimpan(id) ON DELETE CASCADE,
+    id_member INTEGER NOT NULL REFERENCES member(id) ON DELETE CASCADE,
+    PRIMARY KEY (id_filter, id_member)
+);
+
+-- Versi pohon aturan (sudah di-inline) dan transaksi.id terakhir yang sudah diterapkan per segmen.
+CREATE TABLE status_anggota_segmen (
+    id_filter INTEGER PRIMARY KEY REFERENCES filter_tersimpan(id) ON DELETE CASCADE,
+    versi VARCHAR(40) NOT NULL,
+    watermark BIGINT NOT NULL,
+    jumlah_anggota INTEGER NOT NULL DEFAULT 0,
+    diperbarui_pada TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+
+-- ===== INGEST POS =====
+
+-- Kunci idempotensi ingest POS (pos_ingest.py): kirim ulang dengan kunci yang sama tidak menggandakan transaksi.
+-- Tanpa foreign key ke transaksi agar tetap berlaku pada skema berpartisi (skema_partisi.sql).
+CREATE TABLE kunci_ingest (
+    kunci VARCHAR(64) PRIMARY KEY,
+    id_transaksi INTEGER NOT NULL,
+    diterima_pada TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+
 -- ===== INDEX UNTUK OPTIMASI PERFORMA =====
 
 -- Index untuk mempercepat query yang memfilter berdasarkan rentang waktu.
@@ -94,5 +225,28 @@ CREATE INDEX idx_transaksi_toko ON transaksi(id_toko);
 -- Index untuk mempercepat join dan filter berdasarkan produk.
 CREATE INDEX idx_detail_transaksi_produk ON detail_transaksi(id_produk);
 
+-- Index untuk join transaksi -> detail_transaksi (load_data_from_db, segment_query).
+CREATE INDEX idx_detail_transaksi_transaksi ON detail_transaksi(id_transaksi);
+
 -- Index untuk mempercepat filter berdasarkan kategori produk, yang umum digunakan.
 CREATE INDEX idx_produk_kategori ON produk(kategori);
+
+-- Index trigram agar pencarian nama segmen (ILIKE '%kata%') di Segment Directory tidak memindai seluruh tabel.
+CREATE INDEX idx_filter_tersimpan_nama_trgm ON filter_tersimpan USING gin (nama_filter gin_trgm_ops);
+
+-- Index untuk paginasi keyset Segment Directory (urut dari yang terbaru).
+CREATE INDEX idx_filter_tersimpan_dibuat_pada ON filter_tersimpan(dibuat_pada DESC, id DESC);
+
+-- Index untuk join transaksi ke member dan fitur_member.
+CREATE INDEX idx_transaksi_member ON transaksi(id_member);
+
+-- Index untuk segmen berbasis fitur RFM member (lookup, bukan scan + groupby).
+CREATE INDEX idx_fitur_member_belanja_90_hari ON fitur_member(belanja_90_hari);
+CREATE INDEX idx_fitur_member_total_belanja ON fitur_member(total_belanja);
+CREATE INDEX idx_fitur_member_transaksi_terakhir ON fitur_member(transaksi_terakhir);
+
+-- Index untuk membersihkan kunci idempotensi ingest yang sudah kedaluwarsa.
+CREATE INDEX idx_kunci_ingest_diterima_pada ON kunci_ingest(diterima_pada);
+
+-- Index untuk mencari segmen yang memuat seorang member.
+CREATE INDEX idx_anggota_segmen_member ON anggota_segmen(id_member);
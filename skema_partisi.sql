@@ -0,0 +1,51 @@
+-- Varian skema berpartisi untuk PostgreSQL (>= 12)
+-- Jalankan SETELAH skema_database.sql pada database yang masih kosong: tabel transaksi dan
+-- detail_transaksi dibuat ulang sebagai tabel berpartisi bulanan menurut waktu transaksi.
+-- Partisi bulanan dibuat dan dilepas oleh partition_maintenance.py, mis.:
+--   python partition_maintenance.py --mulai 2024-01 --bulan-depan 3
+
+DROP TABLE IF EXISTS detail_transaksi;
+DROP TABLE IF EXISTS transaksi;
+
+
+-- ===== TABEL TRANSAKSIONAL BERPARTISI =====
+
+-- Header transaksi, dipartisi per bulan. Kunci partisi wajib menjadi bagian primary key,
+-- sehingga primary key menjadi (id, waktu_transaksi); id tetap unik karena berasal dari satu sequence.
+CREATE TABLE transaksi (
+    id SERIAL,
+    waktu_transaksi TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(), -- Kunci partisi, tidak boleh NULL.
+    id_toko INTEGER NOT NULL REFERENCES toko(id),
+    id_karyawan INTEGER NOT NULL REFERENCES karyawan(id),
+    id_member INTEGER REFERENCES member(id) NULL, -- Bisa NULL jika pembeli bukan member.
+    PRIMARY KEY (id, waktu_transaksi)
+) PARTITION BY RANGE (waktu_transaksi);
+
+-- Detail transaksi membawa salinan waktu_transaksi header-nya, sehingga ikut dipartisi per bulan
+-- yang sama (co-partitioned). Pemuat data wajib mengisi kolom ini (lihat data_generator.py).
+CREATE TABLE detail_transaksi (
+    id SERIAL,
+    id_transaksi INTEGER NOT NULL,
+    waktu_transaksi TIMESTAMP WITH TIME ZONE NOT NULL,
+    id_produk INTEGER NOT NULL REFERENCES produk(id),
+    jumlah INTEGER NOT NULL CHECK (jumlah > 0),
+    harga_saat_transaksi NUMERIC(10, 2) NOT NULL,
+    PRIMARY KEY (id, waktu_transaksi),
+    FOREIGN KEY (id_transaksi, waktu_transaksi) REFERENCES transaksi(id, waktu_transaksi) ON DELETE CASCADE
+) PARTITION BY RANGE (waktu_transaksi);
+
+
+-- ===== INDEX (dibuat pada tabel induk, otomatis diturunkan ke setiap partisi) =====
+
+-- BRIN untuk rentang waktu: data masuk berurutan waktu, jadi ringkasan per blok sangat selektif
+-- dengan ukuran index yang jauh lebih kecil dari B-tree.
+CREATE INDEX idx_transaksi_waktu_brin ON transaksi USING brin (waktu_transaksi);
+CREATE INDEX idx_detail_transaksi_waktu_brin ON detail_transaksi USING brin (waktu_transaksi);
+
+-- Index untuk join transaksi -> detail_transaksi.
+CREATE INDEX idx_detail_transaksi_transaksi ON detail_transaksi(id_transaksi);
+
+-- Index yang sama dengan skema_database.sql.
+CREATE INDEX idx_transaksi_toko ON transaksi(id_toko);
+CREATE INDEX idx_transaksi_member ON transaksi(id_member);
+CREATE INDEX idx_detail_transaksi_produk ON detail_transaksi(id_produk);
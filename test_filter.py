@@ -3,11 +3,11 @@ import pandas as pd
 import streamlit as st
 from sqlalchemy.orm import sessionmaker
 from streamlit_condition_tree import condition_tree, config_from_dataframe, JsCode
-import re # Import library regular expression
 
 # Asumsikan file-file ini sudah ada
 from database import engine
 from models import Base, FilterTersimpan
+from predicate_eval import evaluate_tree
 
 # Inisialisasi: Buat tabel di database jika belum ada.
 Base.metadata.create_all(bind=engine)
@@ -81,24 +81,6 @@ def load_data_from_db():
     df.columns = [c.replace(' ', '_') for c in df.columns]
     return df
 
-# **LANGKAH KUNCI 1: Fungsi untuk Memperbaiki Kueri**
-def fix_query_for_pandas(query_string: str) -> str:
-    """
-    Mengonversi sintaks null dari gaya SQL ke gaya Pandas menggunakan regular expression.
-    Contoh: `(nama_kolom == null)` menjadi `(nama_kolom.isnull())`
-             `(`Nama Kolom` != null)` menjadi `(`Nama Kolom`.notnull())`
-    """
-    # Mencari pola: (opsional spasi)(nama kolom)(opsional spasi)(operator)(opsional spasi)(null)
-    # Nama kolom bisa berupa kata biasa atau diapit backtick
-    pattern_eq = re.compile(r"([\w`_]+)\s*==\s*null")
-    pattern_ne = re.compile(r"([\w`_]+)\s*!=\s*null")
-    
-    # Lakukan penggantian
-    fixed_query = pattern_eq.sub(r"\1.isnull()", query_string)
-    fixed_query = pattern_ne.sub(r"\1.notnull()", fixed_query)
-    
-    return fixed_query
-
 # Blok utama aplikasi
 try:
     df_initial = load_data_from_db()
@@ -173,20 +155,20 @@ st.markdown("---")
 st.header("Hasil Analisis")
 
 if query_string:
-    # **LANGKAH KUNCI 2: Terapkan Perbaikan Sebelum Menjalankan Query**
-    fixed_query = fix_query_for_pandas(query_string)
-    
-    st.subheader("Kueri Asli & yang Diperbaiki:")
-    st.code(f"Asli: {query_string}\nDiperbaiki: {fixed_query}", language="text")
-    
+    st.subheader("Kueri:")
+    st.code(query_string, language="text")
+
     st.subheader("Data Hasil Filter:")
     try:
-        # Gunakan kueri yang sudah diperbaiki
-        df_filtered = df_initial.query(fixed_query)
+        # Pohon aturan dievaluasi langsung (tanpa regex dan df.query), dengan waktu per rule
+        rule_timings = []
+        df_filtered = df_initial[evaluate_tree(df_initial, st.session_state.active_tree, rule_timings)]
         st.dataframe(df_filtered)
         st.success(f"Menampilkan {len(df_filtered):,} dari {len(df_initial):,} baris data.")
+        with st.expander("⏱️ Waktu evaluasi per rule"):
+            st.dataframe(pd.DataFrame(rule_timings))
     except Exception as e:
-        st.error(f"Kueri filter tidak valid untuk Pandas: {e}")
+        st.error(f"Filter tidak valid: {e}")
 else:
     st.subheader("Data Awal (Tidak ada filter yang diterapkan)")
     st.dataframe(df_initial)
\ No newline at end of file
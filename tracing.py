@@ -0,0 +1,213 @@
+# tracing.py
+"""Span waktu bersarang untuk menelusuri ke mana waktu satu rerun `app.py` habis.
+
+    begin_trace('rerun', tab='Segment Builder')
+    with span('load_data_from_db') as s:
+        df = ...
+        s.set(rows=len(df), bytes=frame_bytes(df))
+    trace = end_trace()
+
+Span aktif disimpan di `contextvars`, jadi span yang dibuka di dalam fungsi lain
+otomatis menjadi anaknya. `instrument_engine()` menambahkan span untuk setiap
+statement SQL yang dieksekusi engine (dengan jumlah baris dari `rowcount`).
+Trace yang selesai ditulis sebagai satu baris JSON ke `CDP_TRACE_FILE`
+(default `traces.jsonl`). Tracing aktif jika `CDP_TRACE=1` atau jika pemanggil
+mengaktifkannya per trace (mis. lewat query param `?trace=1`).
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+TRACE_ENABLED = os.getenv('CDP_TRACE', '0').lower() in ('1', 'true', 'yes')
+TRACE_FILE = os.getenv('CDP_TRACE_FILE', 'traces.jsonl')
+
+_current = contextvars.ContextVar('cdp_current_span', default=None)
+_write_lock = threading.Lock()
+_instrumented = weakref.WeakSet()
+
+
+class Span:
+    def __init__(self, name: str, parent: 'Span | None' = None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs
+        self.children = []
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        if parent is not None:
+            parent.children.append(self)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def finish(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._start
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'started_at': self.started_at,
+            'ms': round(1000 * (self.duration or 0.0), 3),
+            'attrs': self.attrs,
+            'error': self.error,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+
+class _NullSpan:
+    """Span pengganti saat tracing tidak aktif; semua operasi diabaikan."""
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Membuka span anak dari span aktif; tanpa trace aktif, tidak ada yang dicatat."""
+    parent = _current.get()
+    if parent is None:
+        yield _NULL_SPAN
+        return
+    child = Span(name, parent, **attrs)
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = type(e).__name__
+        raise
+    finally:
+        child.finish()
+        _current.reset(token)
+
+
+def traced(name: str | None = None):
+    """Dekorator: setiap pemanggilan fungsi dibungkus dalam satu span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def begin_trace(name: str, enabled: bool | None = None, **attrs) -> Span | None:
+    """Memulai root span baru untuk konteks ini. Trace sebelumnya yang belum ditutup diekspor sebagai tidak lengkap."""
+    previous = _root_of(_current.get())
+    if previous is not None:
+        previous.set(incomplete=True)
+        _finish_root(previous)
+    if not (TRACE_ENABLED if enabled is None else enabled):
+        _current.set(None)
+        return None
+    root = Span(name, **attrs)
+    _current.set(root)
+    return root
+
+
+def end_trace() -> Span | None:
+    """Menutup trace aktif, mengekspornya ke file JSON lines, dan mengembalikan root span-nya."""
+    root = _root_of(_current.get())
+    if root is None:
+        return None
+    _finish_root(root)
+    return root
+
+
+def _root_of(node: Span | None) -> Span | None:
+    while node is not None and node.parent is not None:
+        node = node.parent
+    return node
+
+
+def _finish_root(root: Span):
+    root.finish()
+    _current.set(None)
+    line = json.dumps(root.to_dict(), default=str)
+    with _write_lock:
+        with open(TRACE_FILE, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+def flatten(root: Span | None) -> list[dict]:
+    """Baris datar (kedalaman, nama, ms, atribut) untuk ditampilkan sebagai tabel."""
+    rows = []
+
+    def walk(node: Span, depth: int):
+        rows.append({
+            'span': '  ' * depth + node.name,
+            'ms': round(1000 * (node.duration or 0.0), 2),
+            'rows': node.attrs.get('rows'),
+            'bytes': node.attrs.get('bytes'),
+            'detail': node.attrs.get('statement') or node.error or '',
+        })
+        for child in node.children:
+            walk(child, depth + 1)
+
+    if root is not None:
+        walk(root, 0)
+    return rows
+
+
+def frame_bytes(df) -> int:
+    return int(df.memory_usage(index=False).sum())
+
+
+# --- SPAN SQL ---
+
+def instrument_engine(engine):
+    """Mencatat setiap statement SQL engine sebagai span (hanya saat ada trace aktif di thread tersebut).
+
+    Aman dipanggil berulang (mis. di setiap rerun Streamlit); listener hanya dipasang sekali.
+    `rows` pada span SQL adalah jumlah baris hasil (`cursor.rowcount`); ukuran data
+    dicatat oleh span pemuatan frame (`frame_bytes()`), bukan di sini.
+    """
+    if engine in _instrumented:
+        return
+    _instrumented.add(engine)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = _current.get()
+        if parent is None:
+            return
+        sql_span = Span('sql', parent, statement=' '.join(statement.split())[:200])
+        conn.info.setdefault('cdp_spans', []).append((sql_span, _current.set(sql_span)))
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get('cdp_spans')
+        if not stack:
+            return
+        sql_span, token = stack.pop()
+        sql_span.finish()
+        # rowcount = -1 untuk server-side cursor (streaming), karena baris belum diambil.
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            sql_span.set(rows=cursor.rowcount)
+        _current.reset(token)
+
+    @event.listens_for(engine, 'handle_error')
+    def _error(context):
+        stack = context.connection.info.get('cdp_spans') if context.connection is not None else None
+        if stack:
+            sql_span, token = stack.pop()
+            sql_span.error = type(context.original_exception).__name__
+            sql_span.finish()
+            _current.reset(token)
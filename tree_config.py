@@ -0,0 +1,129 @@
+# tree_config.py
+"""Pembuatan config `streamlit-condition-tree` untuk Segment Builder.
+
+Tipe setiap field diambil dari metadata kolom di `models.py` (lewat pemetaan
+`FACT_COLUMNS` di `segment_query.py`), dan daftar pilihan dropdown dibaca dengan
+`SELECT DISTINCT` pada tabel dimensi (toko, karyawan, produk, member), bukan dari
+frame fakta. Hasilnya di-cache dan hanya dibangun ulang jika tabel dimensi berubah
+(sidik jari dari statistik `pg_stat_user_tables`).
+"""
+import threading
+import time
+
+from sqlalchemy import BigInteger, Date, DateTime, Integer, Numeric, bindparam, select, text
+from streamlit_condition_tree import JsCode
+
+from database import engine
+from segment_membership import SEGMENT_FIELD, segment_field_config
+from segment_query import FACT_COLUMNS
+
+# Field yang ditampilkan sebagai dropdown pilihan (nilainya sedikit dan berulang).
+SELECT_FIELDS = {
+    'nama_toko': 'select', 'kota': 'select', 'posisi_karyawan': 'select', 'kategori_produk': 'select',
+    'member_kategori_favorit': 'select', 'member_toko_favorit': 'select',
+}
+# Field yang daftar pilihannya sama dengan field lain (favorit member selalu berupa kategori/toko yang ada).
+LIST_VALUES_SOURCE = {'member_kategori_favorit': 'kategori_produk', 'member_toko_favorit': 'nama_toko'}
+# Di atas batas ini, field dropdown diturunkan menjadi field teks (cari dengan "contains"/"starts with")
+# agar config yang dikirim ke browser tidak membawa ribuan pilihan.
+LIST_VALUES_LIMIT = 200
+TEXT_OPERATORS = ['like', 'not_like', 'starts_with', 'ends_with', 'equal', 'not_equal', 'is_empty', 'is_not_empty']
+DIMENSION_TABLES = ('toko', 'karyawan', 'produk', 'member')
+
+FINGERPRINT_QUERY = text("""
+    SELECT relname, n_tup_ins, n_tup_upd, n_tup_del
+    FROM pg_stat_user_tables
+    WHERE schemaname = current_schema() AND relname IN :tables
+    ORDER BY relname
+""").bindparams(bindparam('tables', expanding=True))
+
+
+def _field_type(expr) -> str:
+    col_type = expr.type
+    if isinstance(col_type, DateTime):
+        return 'datetime'
+    if isinstance(col_type, Date):
+        return 'date'
+    if isinstance(col_type, (Integer, BigInteger, Numeric)):
+        return 'number'
+    return 'text'
+
+
+def describe_fields(distinct_values: dict[str, list | None]) -> dict:
+    """Definisi field dari metadata kolom.
+
+    `distinct_values` memetakan field dropdown ke daftar nilainya, atau None jika
+    jumlah nilainya melebihi `LIST_VALUES_LIMIT`.
+    """
+    fields = {}
+    for name, (_, expr) in FACT_COLUMNS.items():
+        field = {'label': name, 'type': _field_type(expr)}
+        list_values = distinct_values.get(LIST_VALUES_SOURCE.get(name, name))
+        if name in SELECT_FIELDS and list_values is not None:
+            field['type'] = SELECT_FIELDS[name]
+            field['fieldSettings'] = {'listValues': list_values}
+        elif field['type'] == 'text':
+            # Kardinalitas tinggi (mis. nama_produk, nama_member): pencarian teks, bukan daftar pilihan.
+            field['operators'] = TEXT_OPERATORS + ['is_null', 'is_not_null']
+        fields[name] = field
+    return fields
+
+
+def load_distinct_values(connection, limit: int = LIST_VALUES_LIMIT) -> dict[str, list | None]:
+    """Nilai unik field dropdown dari tabel dimensinya; None jika lebih dari `limit` nilai."""
+    values = {}
+    for name in SELECT_FIELDS.keys() - LIST_VALUES_SOURCE.keys():
+        _, expr = FACT_COLUMNS[name]
+        rows = connection.execute(
+            select(expr).distinct().where(expr.isnot(None)).order_by(expr).limit(limit + 1)
+        ).scalars().all()
+        values[name] = rows if len(rows) <= limit else None
+    return values
+
+
+def build_tree_config(fields: dict, segment_options: list[tuple[int, str]] | None = None) -> dict:
+    """Mempersiapkan config untuk streamlit-condition-tree dari definisi field.
+
+    `segment_options` berisi (id, nama) segmen tersimpan yang bisa dipakai sebagai rule.
+    """
+    config = {'fields': {name: dict(field) for name, field in fields.items()}}
+    config['operators'] = {
+        'is_null': {'label': 'is null', 'cardinality': 0, 'sqlFormatFunc': JsCode("function(f) { return `${f}.isnull()`; }")},
+        'is_not_null': {'label': 'is not null', 'cardinality': 0, 'sqlFormatFunc': JsCode("function(f) { return `${f}.notnull()`; }")}
+    }
+    if segment_options is not None:
+        # Segmen tersimpan bisa dipakai sebagai rule dan digabung dengan AND/OR/NOT.
+        config['fields'][SEGMENT_FIELD] = segment_field_config(segment_options)
+    return config
+
+
+class FieldConfigCache:
+    """Cache definisi field yang dibangun ulang hanya jika sidik jari tabel dimensi berubah.
+
+    Sidik jari diperiksa paling sering sekali per `check_interval` detik.
+    """
+
+    def __init__(self, check_interval: float = 30):
+        self.check_interval = check_interval
+        self._fields = None
+        self._fingerprint = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def fields(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            if self._fields is not None and now - self._checked_at < self.check_interval:
+                return self._fields
+            with engine.connect() as connection:
+                rows = connection.execute(FINGERPRINT_QUERY, {'tables': list(DIMENSION_TABLES)})
+                fingerprint = tuple(tuple(row) for row in rows)
+                if self._fields is None or fingerprint != self._fingerprint:
+                    self._fields = describe_fields(load_distinct_values(connection))
+                    self._fingerprint = fingerprint
+            self._checked_at = now
+            return self._fields
+
+    def invalidate(self):
+        with self._lock:
+            self._fields = None